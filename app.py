@@ -3,13 +3,21 @@ from insurance.logger import logging
 from insurance.config.configuration import Configuration
 from insurance.constant import CONFIG_DIR, get_current_time_stamp
 from insurance.pipeline.pipeline import Pipeline
-from insurance.entity.insurance_predictor import InsuranceData,InsurancePredictor
+from insurance.entity.insurance_predictor import InsuranceData,InsurancePredictor,RECORD_ERROR_KEY,\
+    PREDICTION_CSV_CHUNK_SIZE, MODEL_WATCH_INTERVAL_SECONDS
+from insurance.entity.prediction_batcher import PredictionBatcher, PREDICTION_BATCH_MAX_SIZE, \
+    PREDICTION_BATCH_MAX_WAIT_MS
+from insurance.entity.serving_metrics import serving_metrics, PARSE_STAGE, RENDER_STAGE, REQUEST_LATENCY_METRIC, \
+    REQUEST_COUNT_METRIC, REQUEST_ERROR_COUNT_METRIC, MODEL_CACHE_HIT_COUNT_METRIC, MODEL_CACHE_MISS_COUNT_METRIC, \
+    PREDICTION_CACHE_HIT_COUNT_METRIC, PREDICTION_CACHE_MISS_COUNT_METRIC, PREDICTION_CACHE_HIT_RATIO_METRIC, \
+    PREDICTION_CACHE_ENTRIES_METRIC, PREDICTION_CACHE_MEMORY_METRIC
 from insurance.logger import get_log_dataframe
 
 from flask import send_file, abort, render_template
-from flask import Flask, request
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 import os, sys
 import json
+import time
 
 ROOT_DIR = os.getcwd()
 LOG_FOLDER_NAME = "logs"
@@ -22,9 +30,90 @@ MODEL_DIR = os.path.join(ROOT_DIR, SAVED_MODELS_DIR_NAME)
 
 INSURANCE_DATA_KEY = "insurance_data"
 INSURANCE_PREMIUM_EXPENSES_KEY = "insurance_expenses"
+BATCH_RECORDS_KEY = "records"
+BATCH_PREDICTIONS_KEY = "predictions"
+CSV_CHUNK_SIZE_KEY = "chunk_size"
+
+# Coalescing of concurrent /predict requests, only useful with threaded workers
+PREDICTION_BATCHING_ENABLED = os.getenv("PREDICTION_BATCHING", "false").lower() in ("1", "true", "yes")
+PREDICTION_BATCH_SIZE = int(os.getenv("PREDICTION_BATCH_SIZE", PREDICTION_BATCH_MAX_SIZE))
+PREDICTION_BATCH_WAIT_MS = float(os.getenv("PREDICTION_BATCH_WAIT_MS", PREDICTION_BATCH_MAX_WAIT_MS))
+
+# Background polling for newly pushed models in every worker, 0 disables it
+MODEL_WATCH_INTERVAL = float(os.getenv("MODEL_WATCH_INTERVAL_SECONDS", MODEL_WATCH_INTERVAL_SECONDS))
 
 app = Flask(__name__)
 
+prediction_batcher = PredictionBatcher(insurance_predictor=InsurancePredictor(model_dir=MODEL_DIR),
+                                       max_batch_size=PREDICTION_BATCH_SIZE,
+                                       max_wait_ms=PREDICTION_BATCH_WAIT_MS) if PREDICTION_BATCHING_ENABLED else None
+
+
+def preload_model():
+    """
+    Loads and warms up the current model in this process. Called by the gunicorn
+    master before forking when preload_app is on, see gunicorn.conf.py.
+    """
+    if not os.path.isdir(MODEL_DIR):
+        logging.info(f"Model directory [{MODEL_DIR}] not found, nothing to preload.")
+        return
+    try:
+        model_entry = InsurancePredictor(model_dir=MODEL_DIR).get_model_entry()
+        logging.info(f"Preloaded model version [{model_entry['model_version']}] in process [{os.getpid()}].")
+    except Exception as e:
+        # workers will load the model themselves
+        logging.exception(e)
+
+
+@app.before_request
+def start_model_watcher():
+    # the watcher thread has to live in the worker process, so it is started on the first request
+    if MODEL_WATCH_INTERVAL > 0 and os.path.isdir(MODEL_DIR):
+        InsurancePredictor(model_dir=MODEL_DIR).start_model_watcher(interval_seconds=MODEL_WATCH_INTERVAL)
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started_at = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    # rule instead of path keeps the label set bounded
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    started_at = g.get("request_started_at")
+    if started_at is not None:
+        serving_metrics.observe(REQUEST_LATENCY_METRIC, (("endpoint", endpoint),), time.perf_counter() - started_at)
+    serving_metrics.increment(REQUEST_COUNT_METRIC, (("endpoint", endpoint), ("method", request.method),
+                                                     ("status", str(response.status_code))))
+    if response.status_code >= 500:
+        serving_metrics.increment(REQUEST_ERROR_COUNT_METRIC, (("endpoint", endpoint),))
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    model_cache_info = InsurancePredictor.get_cache_info()
+    prediction_cache_info = InsurancePredictor(model_dir=MODEL_DIR).get_prediction_cache_info()
+    extra_counters = {
+        (MODEL_CACHE_HIT_COUNT_METRIC, ()): model_cache_info["hit_count"],
+        (MODEL_CACHE_MISS_COUNT_METRIC, ()): model_cache_info["miss_count"],
+        (PREDICTION_CACHE_HIT_COUNT_METRIC, ()): prediction_cache_info.get("hit_count", 0),
+        (PREDICTION_CACHE_MISS_COUNT_METRIC, ()): prediction_cache_info.get("miss_count", 0),
+        (PREDICTION_CACHE_HIT_RATIO_METRIC, ()): prediction_cache_info.get("hit_ratio", 0.0),
+        (PREDICTION_CACHE_ENTRIES_METRIC, ()): prediction_cache_info.get("size", 0),
+        (PREDICTION_CACHE_MEMORY_METRIC, ()): prediction_cache_info.get("memory_bytes", 0),
+    }
+    return Response(serving_metrics.render(extra_counters=extra_counters),
+                    mimetype="text/plain; version=0.0.4")
+
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    model_status = InsurancePredictor(model_dir=MODEL_DIR).get_model_status()
+    model_status.update({"ready": len(model_status) > 0, "pid": os.getpid()})
+    return jsonify(model_status), 200 if model_status["ready"] else 503
+
 
 @app.route('/artifact', defaults={'req_path': 'insurance'})
 @app.route('/artifact/<path:req_path>')
@@ -79,7 +168,9 @@ def view_experiment_history():
 @app.route('/train', methods=['GET', 'POST'])
 def train():
     message = ""
-    pipeline = Pipeline(config=Configuration(current_time_stamp=get_current_time_stamp()))
+    # /train?resume=true continues the latest interrupted experiment from its checkpoints
+    resume = request.args.get("resume", "false").lower() == "true"
+    pipeline = Pipeline(config=Configuration(current_time_stamp=get_current_time_stamp()), resume=resume)
     if not Pipeline.experiment.running_status:
         message = "Training started."
         pipeline.start()
@@ -100,31 +191,90 @@ def predict():
     }
 
     if request.method == 'POST':
-        age = float(request.form['age'])
-        sex = request.form['sex']
-        bmi = float(request.form['bmi'])
-        children = float(request.form['children'])
-        smoker = request.form['smoker']
-        region = request.form['region']
-        insurance_data = InsuranceData(age=age,
-                                   sex=sex,
-                                   bmi=bmi,
-                                   children=children,
-                                   smoker=smoker,
-                                   region=region
-                                   )
-
-        insurance_df = insurance_data.get_insurance_input_data_frame()
-        insurance_predictor = InsurancePredictor(model_dir=MODEL_DIR)
-        insurance_expenses = insurance_predictor.predict(X=insurance_df)[0]
+        with serving_metrics.time_stage(PARSE_STAGE):
+            age = float(request.form['age'])
+            sex = request.form['sex']
+            bmi = float(request.form['bmi'])
+            children = float(request.form['children'])
+            smoker = request.form['smoker']
+            region = request.form['region']
+            insurance_data = InsuranceData(age=age,
+                                       sex=sex,
+                                       bmi=bmi,
+                                       children=children,
+                                       smoker=smoker,
+                                       region=region
+                                       )
+
+        if prediction_batcher is not None:
+            insurance_expenses = prediction_batcher.predict(insurance_data=insurance_data)
+        else:
+            insurance_predictor = InsurancePredictor(model_dir=MODEL_DIR)
+            insurance_expenses = insurance_predictor.predict_insurance_data([insurance_data])[0]
         context = {
             INSURANCE_DATA_KEY: insurance_data.get_insurance_data_as_dict(),
             INSURANCE_PREMIUM_EXPENSES_KEY: insurance_expenses,
         }
-        return render_template('predict.html', context=context)
+        with serving_metrics.time_stage(RENDER_STAGE):
+            return render_template('predict.html', context=context)
     return render_template("predict.html", context=context)
 
 
+@app.route('/predict_batch', methods=['POST'])
+def predict_batch():
+    with serving_metrics.time_stage(PARSE_STAGE):
+        payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        payload = payload.get(BATCH_RECORDS_KEY)
+    if not isinstance(payload, list):
+        return jsonify({"error": f"Expected a json array of records or an object with [{BATCH_RECORDS_KEY}] key."}), 400
+
+    try:
+        insurance_predictor = InsurancePredictor(model_dir=MODEL_DIR)
+        predictions = insurance_predictor.predict_batch(records=payload)
+    except Exception as e:
+        logging.exception(e)
+        return jsonify({"error": str(e)}), 500
+
+    error_count = sum(1 for prediction in predictions if RECORD_ERROR_KEY in prediction)
+    with serving_metrics.time_stage(RENDER_STAGE):
+        return jsonify({
+            BATCH_PREDICTIONS_KEY: predictions,
+            "record_count": len(predictions),
+            "error_count": error_count
+        })
+
+
+@app.route('/predict_csv', methods=['POST'])
+def predict_csv():
+    """
+    Scores a csv file sent as the raw request body, e.g.
+    curl --data-binary @insurance.csv -H "Content-Type: text/csv" <host>/predict_csv
+    The body is parsed straight from the socket in chunks, so the upload is never
+    held in memory or spooled to disk as a whole.
+    """
+    chunk_size = request.args.get(CSV_CHUNK_SIZE_KEY, default=PREDICTION_CSV_CHUNK_SIZE, type=int)
+    if chunk_size is None or chunk_size <= 0:
+        return jsonify({"error": f"[{CSV_CHUNK_SIZE_KEY}] must be a positive integer."}), 400
+
+    try:
+        insurance_predictor = InsurancePredictor(model_dir=MODEL_DIR)
+        scored_csv = insurance_predictor.predict_csv(csv_file=request.stream, chunk_size=chunk_size)
+        # scoring the first chunk up front lets bad files fail with a proper status code
+        first_chunk = next(scored_csv, "")
+    except Exception as e:
+        logging.exception(e)
+        return jsonify({"error": str(e)}), 400
+
+    def generate():
+        yield first_chunk
+        yield from scored_csv
+
+    return Response(stream_with_context(generate()),
+                    mimetype="text/csv",
+                    headers={"Content-Disposition": "attachment; filename=scored_insurance.csv"})
+
+
 @app.route('/saved_models', defaults={'req_path': 'saved_models'})
 @app.route('/saved_models/<path:req_path>')
 def saved_models_dir(req_path):
@@ -0,0 +1,89 @@
+"""
+Rows per second of loading the raw insurance csv into the database: the
+former one formatted INSERT per row against DatabaseBulkLoader with several
+batch sizes. Runs on the sqlite backend, no database server is needed. Every
+run loads into a fresh database file.
+
+    python benchmarks/database_load.py --n-rows 200000 --batch-sizes 1000 10000 50000
+"""
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+from synthetic_model import get_synthetic_data_frame, get_synthetic_target
+
+from insurance.constant import SQLITE_DATABASE_BACKEND
+from insurance.entity.config_entity import DatabaseConfig
+from insurance.entity.database_loader import DatabaseBulkLoader
+
+TABLE_NAME = "dataset01"
+
+
+def get_database_config(database_file_path: str, batch_size: int) -> DatabaseConfig:
+    return DatabaseConfig(database_host=None, database_username=None, database_password=None,
+                          database_name="insurance_dataset", table_name=TABLE_NAME,
+                          database_backend=SQLITE_DATABASE_BACKEND, database_file_path=database_file_path,
+                          batch_size=batch_size)
+
+
+def measure_row_by_row(csv_file_path: str, database_file_path: str) -> dict:
+    import pandas as pd
+    database_config = get_database_config(database_file_path, batch_size=1)
+    DatabaseBulkLoader(database_config).create_tables()
+    db_connect = sqlite3.connect(database_file_path)
+    db_cursor = db_connect.cursor()
+    start = time.perf_counter()
+    insurance_dataframe = pd.read_csv(csv_file_path)
+    for row in insurance_dataframe.to_numpy():
+        query = f"INSERT INTO {TABLE_NAME}(age,sex,bmi,children,smoker,region,expenses) VALUES({int(row[0])}," \
+                f"'{str(row[1])}',{float(row[2])},{int(row[3])},'{str(row[4])}','{str(row[5])}',{float(row[6])})"
+        db_cursor.execute(query)
+    db_connect.commit()
+    load_seconds = time.perf_counter() - start
+    db_connect.close()
+    return {"loaded_rows": len(insurance_dataframe), "load_seconds": load_seconds,
+            "rows_per_second": len(insurance_dataframe) / load_seconds}
+
+
+def measure_bulk_load(csv_file_path: str, database_file_path: str, batch_size: int, chunk_size: int) -> dict:
+    database_loader = DatabaseBulkLoader(get_database_config(database_file_path, batch_size=batch_size))
+    database_loader.create_tables()
+    report = database_loader.load_file(file_path=csv_file_path, chunk_size=chunk_size)
+    rerun_report = database_loader.load_file(file_path=csv_file_path, chunk_size=chunk_size)
+    return {"loaded_rows": report.loaded_rows, "load_seconds": report.load_seconds,
+            "rows_per_second": report.rows_per_second, "rerun_skipped": rerun_report.is_skipped}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-rows", type=int, default=200000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--chunk-size", type=int, default=100000)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        insurance_data_frame = get_synthetic_data_frame(args.n_rows)
+        insurance_data_frame["expenses"] = get_synthetic_target(insurance_data_frame).round(3)
+        csv_file_path = os.path.join(temp_dir, "insurance.csv")
+        insurance_data_frame.to_csv(csv_file_path, index=False)
+
+        result = {"loader": "row_by_row", "batch_size": 1}
+        result.update(measure_row_by_row(csv_file_path, os.path.join(temp_dir, "row_by_row.sqlite3")))
+        results.append(result)
+        for batch_size in args.batch_sizes:
+            result = {"loader": "bulk", "batch_size": batch_size}
+            result.update(measure_bulk_load(csv_file_path, os.path.join(temp_dir, f"bulk_{batch_size}.sqlite3"),
+                                            batch_size=batch_size, chunk_size=args.chunk_size))
+            results.append(result)
+    for result in results:
+        result["load_seconds"] = round(result["load_seconds"], 3)
+        result["rows_per_second"] = round(result["rows_per_second"])
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Latency of RandomForestRegressor.predict against the flattened forest for
+batch sizes from 1 to 100k rows, on already transformed features.
+
+    python benchmarks/forest_inference.py --n-estimators 100 --repeat 5
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from synthetic_model import train_synthetic_model, get_synthetic_data_frame, get_synthetic_estimators
+
+from insurance.entity.flat_forest import FlatForest
+
+BATCH_SIZES = [1, 10, 100, 1000, 10000, 100000]
+
+
+def measure(predict, X: np.ndarray, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        predict(X)
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)[len(timings) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-estimators", type=int, default=100)
+    parser.add_argument("--n-rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    estimator = get_synthetic_estimators(n_estimators=args.n_estimators)["RandomForestRegressor"]
+    model = train_synthetic_model(estimator, n_rows=args.n_rows)
+    flat_forest = FlatForest.from_estimator(model.trained_model_object)
+
+    results = []
+    for batch_size in BATCH_SIZES:
+        X = model.transform(get_synthetic_data_frame(batch_size, seed=1))
+        max_abs_diff = float(np.abs(model.trained_model_object.predict(X) - flat_forest.predict(X)).max())
+        # fewer repetitions for the large batches, they take seconds
+        repeat = args.repeat if batch_size <= 10000 else 1
+        results.append({
+            "batch_size": batch_size,
+            "sklearn_ms": round(measure(model.trained_model_object.predict, X, repeat), 3),
+            "flat_forest_ms": round(measure(flat_forest.predict, X, repeat), 3),
+            "served_by_flat_forest": flat_forest.is_preferred(batch_size),
+            "max_abs_diff": max_abs_diff,
+        })
+    print(json.dumps({"n_trees": flat_forest.n_trees, "max_depth": flat_forest.max_depth, "results": results},
+                     indent=2))
+
+
+if __name__ == "__main__":
+    main()
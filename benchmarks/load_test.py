@@ -0,0 +1,235 @@
+"""
+Open loop HTTP load test of the serving app.
+
+Trains a model on synthetic data into a temporary saved_models directory,
+starts app:app under gunicorn (gunicorn.conf.py) with that directory as the
+working directory, then fires requests at fixed rates. Requests are sent on
+schedule whether or not earlier ones have finished, and latency is measured
+from the scheduled send time, so a saturated server shows up as growing tail
+latency instead of a silently lower request rate. Runs fully offline.
+
+    python benchmarks/load_test.py --workers 2 --threads 4 --rates 50 100 200 --duration 10
+
+The report is printed as JSON, redirect it to a file to compare commits.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from synthetic_model import train_synthetic_model, get_synthetic_estimators, publish_synthetic_model
+
+from insurance.constant import DATASET_DOMAIN_VALUE_KEY
+from insurance.util.util import read_yaml_file
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEMA_FILE_PATH = os.path.join(REPO_DIR, "config", "schema.yaml")
+GUNICORN_CONFIG_FILE_PATH = os.path.join(REPO_DIR, "gunicorn.conf.py")
+
+# values of categorical columns which schema.yaml does not list
+DEFAULT_DOMAIN_VALUES = {"smoker": ["yes", "no"]}
+READY_TIMEOUT_SECONDS = 120
+REQUEST_TIMEOUT_SECONDS = 30
+PAYLOAD_POOL_SIZE = 1000
+
+
+def get_domain_values(schema_file_path: str = SCHEMA_FILE_PATH) -> dict:
+    domain_values = dict(DEFAULT_DOMAIN_VALUES)
+    domain_values.update(read_yaml_file(schema_file_path)[DATASET_DOMAIN_VALUE_KEY])
+    return domain_values
+
+
+def generate_record(rng: random.Random, domain_values: dict) -> dict:
+    return {
+        "age": float(rng.randint(18, 64)),
+        "sex": rng.choice(domain_values["sex"]),
+        "bmi": round(min(max(rng.gauss(30.6, 6.1), 15.0), 54.0), 1),
+        "children": float(rng.randint(0, 5)),
+        "smoker": rng.choice(domain_values["smoker"]),
+        "region": rng.choice(domain_values["region"]),
+    }
+
+
+def generate_requests(endpoint: str, batch_size: int, seed: int) -> list:
+    """
+    return: pool of (path, body, content type) tuples the load is drawn from
+    """
+    rng = random.Random(seed)
+    domain_values = get_domain_values()
+    requests = []
+    for _ in range(PAYLOAD_POOL_SIZE):
+        if endpoint == "predict":
+            body = urllib.parse.urlencode(generate_record(rng, domain_values)).encode()
+            requests.append(("/predict", body, "application/x-www-form-urlencoded"))
+        else:
+            records = [generate_record(rng, domain_values) for _ in range(batch_size)]
+            requests.append(("/predict_batch", json.dumps(records).encode(), "application/json"))
+    return requests
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(work_dir: str, port: int, workers: int, threads: int, batching: bool) -> subprocess.Popen:
+    env = dict(os.environ,
+               PORT=str(port),
+               WEB_CONCURRENCY=str(workers),
+               GUNICORN_THREADS=str(threads),
+               PREDICTION_BATCHING="true" if batching else "false")
+    command = [sys.executable, "-m", "gunicorn", "--config", GUNICORN_CONFIG_FILE_PATH,
+               "--pythonpath", REPO_DIR, "--log-level", "warning", "app:app"]
+    server = subprocess.Popen(command, cwd=work_dir, env=env,
+                              stdout=subprocess.DEVNULL, stderr=open(os.path.join(work_dir, "gunicorn.log"), "w"))
+    deadline = time.monotonic() + READY_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise Exception(f"gunicorn exited with code [{server.returncode}], see {work_dir}/gunicorn.log")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=1) as response:
+                if response.status == 200:
+                    return server
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise Exception(f"Server not ready after {READY_TIMEOUT_SECONDS} seconds")
+
+
+def send_request(base_url: str, request: tuple, scheduled_at: float) -> tuple:
+    path, body, content_type = request
+    http_request = urllib.request.Request(base_url + path, data=body, headers={"Content-Type": content_type})
+    try:
+        with urllib.request.urlopen(http_request, timeout=REQUEST_TIMEOUT_SECONDS) as response:
+            response.read()
+            is_error = response.status != 200
+    except Exception:
+        is_error = True
+    return time.perf_counter() - scheduled_at, is_error
+
+
+def run_fixed_rate(base_url: str, requests: list, rate: float, duration: float, max_in_flight: int) -> dict:
+    n_requests = max(1, int(rate * duration))
+    futures = []
+    lock = threading.Lock()
+    dropped = 0
+    in_flight = [0]
+
+    def task(request, scheduled_at):
+        try:
+            return send_request(base_url, request, scheduled_at)
+        finally:
+            with lock:
+                in_flight[0] -= 1
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        start = time.perf_counter()
+        for index in range(n_requests):
+            scheduled_at = start + index / rate
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            with lock:
+                if in_flight[0] >= max_in_flight:
+                    # the client itself is saturated, count it instead of silently slowing down
+                    dropped += 1
+                    continue
+                in_flight[0] += 1
+            futures.append(executor.submit(task, requests[index % len(requests)], scheduled_at))
+        results = [future.result() for future in futures]
+        elapsed = time.perf_counter() - start
+
+    latencies = np.array([latency for latency, is_error in results if not is_error]) * 1000
+    error_count = sum(1 for _, is_error in results if is_error) + dropped
+    report = {
+        "target_rate": rate,
+        "sent": len(results),
+        "dropped": dropped,
+        "errors": error_count,
+        "error_rate": round(error_count / n_requests, 4),
+        "throughput": round(len(latencies) / elapsed, 2),
+    }
+    for percentile in [50, 95, 99]:
+        report[f"p{percentile}_ms"] = round(float(np.percentile(latencies, percentile)), 3) if len(latencies) else None
+    report["max_ms"] = round(float(latencies.max()), 3) if len(latencies) else None
+    return report
+
+
+def get_git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--rates", type=float, nargs="+", default=[25, 50, 100])
+    parser.add_argument("--duration", type=float, default=10, help="seconds per rate")
+    parser.add_argument("--warm-up", type=float, default=2, help="seconds of load before the first rate")
+    parser.add_argument("--endpoint", choices=["predict", "predict_batch"], default="predict")
+    parser.add_argument("--batch-size", type=int, default=16, help="records per /predict_batch request")
+    parser.add_argument("--estimator", choices=list(get_synthetic_estimators().keys()),
+                        default="RandomForestRegressor")
+    parser.add_argument("--n-estimators", type=int, default=100)
+    parser.add_argument("--no-compact", action="store_true", help="serve the dill model instead of the compact one")
+    parser.add_argument("--batching", action="store_true", help="enable PREDICTION_BATCHING in the app")
+    parser.add_argument("--max-in-flight", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep-dir", action="store_true", help="keep the temporary directory for inspection")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="insurance-load-test-")
+    server = None
+    try:
+        estimator = get_synthetic_estimators(n_estimators=args.n_estimators)[args.estimator]
+        model = train_synthetic_model(estimator, seed=args.seed)
+        publish_synthetic_model(os.path.join(work_dir, "saved_models"), model, compact=not args.no_compact)
+
+        port = get_free_port()
+        server = start_server(work_dir, port=port, workers=args.workers, threads=args.threads,
+                              batching=args.batching)
+        base_url = f"http://127.0.0.1:{port}"
+        requests = generate_requests(args.endpoint, batch_size=args.batch_size, seed=args.seed)
+
+        if args.warm_up > 0:
+            run_fixed_rate(base_url, requests, rate=min(args.rates), duration=args.warm_up,
+                           max_in_flight=args.max_in_flight)
+        results = [run_fixed_rate(base_url, requests, rate=rate, duration=args.duration,
+                                  max_in_flight=args.max_in_flight) for rate in args.rates]
+        report = {
+            "git_commit": get_git_commit(),
+            "config": {key: value for key, value in vars(args).items() if key not in ("keep_dir",)},
+            "results": results,
+        }
+        print(json.dumps(report, indent=2))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        if args.keep_dir:
+            print(f"Work directory kept at: {work_dir}", file=sys.stderr)
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Compares the dill model file with the compact export: file size, cold load
+time and resident memory (VmRSS, Linux only). Every load runs in a fresh interpreter so import
+caches and the page cache of the previous load do not leak into the numbers.
+
+    python benchmarks/model_serialization.py --n-estimators 100 --repeat 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from synthetic_model import train_synthetic_model, get_synthetic_estimators
+
+from insurance.util.util import save_object
+from insurance.entity.compact_model import export_compact_model
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# runs in a child interpreter: imports first so only the load itself is measured
+LOAD_SCRIPT = """
+import sys, time, json
+sys.path.insert(0, {repo_dir!r})
+from insurance.util.util import load_object
+from insurance.entity.compact_model import load_compact_model
+from insurance.entity.insurance_predictor import WARM_UP_INSURANCE_DATA
+import pandas as pd
+def get_rss_kb():
+    with open("/proc/self/status") as status_file:
+        return int(next(line for line in status_file if line.startswith("VmRSS:")).split()[1])
+warm_up_df = pd.DataFrame([WARM_UP_INSURANCE_DATA])
+rss_before = get_rss_kb()
+start = time.perf_counter()
+model = load_compact_model({path!r}) if {compact!r} else load_object({path!r})
+load_seconds = time.perf_counter() - start
+model.predict(warm_up_df)
+first_predict_seconds = time.perf_counter() - start - load_seconds
+rss_after = get_rss_kb()
+print(json.dumps({{"load_ms": load_seconds * 1000, "first_predict_ms": first_predict_seconds * 1000,
+                  "rss_delta_kb": rss_after - rss_before}}))
+"""
+
+
+def get_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(path, file_name)) for file_name in os.listdir(path))
+
+
+def measure_load(path: str, compact: bool, repeat: int) -> dict:
+    runs = []
+    for _ in range(repeat):
+        script = LOAD_SCRIPT.format(repo_dir=REPO_DIR, path=path, compact=compact)
+        output = subprocess.run([sys.executable, "-c", script], check=True, capture_output=True, text=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {key: round(sorted(run[key] for run in runs)[len(runs) // 2], 3) for key in runs[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-estimators", type=int, default=100)
+    parser.add_argument("--n-rows", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for estimator_name, estimator in get_synthetic_estimators(n_estimators=args.n_estimators).items():
+            model = train_synthetic_model(estimator, n_rows=args.n_rows)
+            dill_path = os.path.join(temp_dir, estimator_name, "model.pkl")
+            compact_path = os.path.join(temp_dir, estimator_name, "model_compact")
+            save_object(dill_path, model)
+            export_compact_model(model, compact_path)
+            for serialization_format, path, compact in [("dill", dill_path, False), ("compact", compact_path, True)]:
+                result = {"estimator": estimator_name, "format": serialization_format, "size_bytes": get_size(path)}
+                result.update(measure_load(path, compact=compact, repeat=args.repeat))
+                results.append(result)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Synthetic insurance data and models for the benchmarks. The preprocessing
+pipeline mirrors DataTransformation.get_data_transformer_object.
+"""
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import LinearRegression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler, OneHotEncoder
+
+from insurance.component.model_trainer import InsuranceEstimatorModel
+from insurance.constant import MODEL_MANIFEST_FILE_NAME, MODEL_MANIFEST_VERSION_KEY, MODEL_MANIFEST_MODEL_PATH_KEY, \
+    MODEL_MANIFEST_CHECKSUM_KEY, MODEL_MANIFEST_SIZE_KEY, MODEL_MANIFEST_PUSHED_AT_KEY, \
+    MODEL_MANIFEST_COMPACT_MODEL_PATH_KEY, COMPACT_MODEL_DIR_NAME
+from insurance.entity.compact_model import export_compact_model
+from insurance.entity.insurance_predictor import INSURANCE_NUMERICAL_FIELDS, INSURANCE_CATEGORICAL_FIELDS
+from insurance.util.util import save_object, write_yaml_file_atomic, get_file_checksum
+
+SEX_VALUES = ["male", "female"]
+SMOKER_VALUES = ["yes", "no"]
+REGION_VALUES = ["southeast", "southwest", "northwest", "northeast"]
+
+
+def get_synthetic_data_frame(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "age": rng.integers(18, 65, n_rows).astype(float),
+        "sex": rng.choice(SEX_VALUES, n_rows),
+        "bmi": rng.normal(30, 6, n_rows).round(1),
+        "children": rng.integers(0, 5, n_rows).astype(float),
+        "smoker": rng.choice(SMOKER_VALUES, n_rows),
+        "region": rng.choice(REGION_VALUES, n_rows),
+    })
+
+
+def get_synthetic_target(df: pd.DataFrame, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return (250 * df["age"] + 300 * df["bmi"] + 500 * df["children"] + 20000 * (df["smoker"] == "yes")
+            + rng.normal(0, 2000, len(df))).to_numpy()
+
+
+def get_preprocessing_object() -> ColumnTransformer:
+    num_pipeline = Pipeline(steps=[
+        ('imputer', SimpleImputer(strategy="median")),
+        ('scaler', StandardScaler())
+    ])
+    cat_pipeline = Pipeline(steps=[
+        ('impute', SimpleImputer(strategy="most_frequent")),
+        ('one_hot_encoder', OneHotEncoder(handle_unknown='ignore')),
+        ('scaler', StandardScaler(with_mean=False))
+    ])
+    return ColumnTransformer([
+        ('num_pipeline', num_pipeline, INSURANCE_NUMERICAL_FIELDS),
+        ('cat_pipeline', cat_pipeline, INSURANCE_CATEGORICAL_FIELDS),
+    ])
+
+
+def get_synthetic_estimators(n_estimators: int = 100) -> dict:
+    return {
+        "LinearRegression": LinearRegression(),
+        "RandomForestRegressor": RandomForestRegressor(n_estimators=n_estimators, min_samples_leaf=3,
+                                                       random_state=0),
+    }
+
+
+def train_synthetic_model(estimator, n_rows: int = 2000, seed: int = 0) -> InsuranceEstimatorModel:
+    df = get_synthetic_data_frame(n_rows=n_rows, seed=seed)
+    preprocessing_object = get_preprocessing_object()
+    transformed_feature = preprocessing_object.fit_transform(df)
+    estimator.fit(transformed_feature, get_synthetic_target(df, seed=seed))
+    return InsuranceEstimatorModel(preprocessing_object=preprocessing_object, trained_model_object=estimator)
+
+
+def publish_synthetic_model(model_dir: str, model: InsuranceEstimatorModel, compact: bool = True) -> dict:
+    """
+    Lays the model out the way ModelPusher does: <model_dir>/<version>/model.pkl,
+    optionally the compact export next to it, and the current model manifest.
+    return: written manifest
+    """
+    version = datetime.now().strftime("%Y%m%d%H%M%S")
+    model_file_path = os.path.join(model_dir, version, "model.pkl")
+    save_object(model_file_path, model)
+    model_manifest = {
+        MODEL_MANIFEST_VERSION_KEY: version,
+        MODEL_MANIFEST_MODEL_PATH_KEY: os.path.relpath(model_file_path, model_dir),
+        MODEL_MANIFEST_CHECKSUM_KEY: get_file_checksum(model_file_path),
+        MODEL_MANIFEST_SIZE_KEY: os.path.getsize(model_file_path),
+        MODEL_MANIFEST_PUSHED_AT_KEY: datetime.now().isoformat(),
+    }
+    if compact:
+        compact_model_dir = export_compact_model(model, os.path.join(model_dir, version, COMPACT_MODEL_DIR_NAME),
+                                                 estimator_file_path=model_file_path)
+        model_manifest[MODEL_MANIFEST_COMPACT_MODEL_PATH_KEY] = os.path.relpath(compact_model_dir, model_dir)
+    write_yaml_file_atomic(os.path.join(model_dir, MODEL_MANIFEST_FILE_NAME), model_manifest)
+    return model_manifest
@@ -2,11 +2,12 @@ from insurance.pipeline.pipeline import Pipeline
 from insurance.exception import InsuranceException
 from insurance.logger import logging
 from insurance.config.configuration import Configuration
-import os
+import os, sys
 def main():
     try:
         config_path = os.path.join("config","config.yaml")
-        pipeline = Pipeline(Configuration(config_file_path=config_path))
+        # python demo.py --resume continues the latest interrupted experiment
+        pipeline = Pipeline(Configuration(config_file_path=config_path), resume="--resume" in sys.argv)
         #pipeline.run_pipeline()
         pipeline.start()
         logging.info("main function execution completed.")
@@ -0,0 +1,25 @@
+# gunicorn settings for serving app:app
+# usage: gunicorn --config gunicorn.conf.py app:app
+#
+# With preload_app the master imports app.py (sklearn, pandas, ...) and loads
+# and warms up the current model once, then forks the workers. The workers
+# share the read only model memory copy-on-write instead of each one loading
+# its own copy, which keeps per worker RSS low enough to run many workers.
+import gc
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+threads = int(os.getenv("GUNICORN_THREADS", "1"))
+preload_app = os.getenv("GUNICORN_PRELOAD_APP", "true").lower() in ("1", "true", "yes")
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    from app import preload_model
+    preload_model()
+    # moves everything allocated so far out of the collector's reach, otherwise
+    # the first collection in a worker writes to (and so copies) every page holding them
+    gc.freeze()
+    server.log.info("Model preloaded in master process, forking workers.")
@@ -1,12 +1,14 @@
 from insurance.exception import InsuranceException
 from insurance.logger import logging
 from insurance.entity.artifact_entity import DataIngestionArtifact,DatabaseArtifact
-from insurance.entity.config_entity import DataIngestionConfig, DatabaseConfig
+from insurance.entity.config_entity import DataIngestionConfig, DatabaseConfig, StreamingConfig
+from insurance.entity.database_loader import DatabaseBulkLoader
+from insurance.entity.incremental_ingestion import WatermarkIngestion
+from insurance.util.util import read_csv_chunks
 
 import pandas as pd
 import numpy as np
 from six.moves import urllib
-import mysql.connector as mysql_connect
 import sys,os
 import gdown
 
@@ -14,11 +16,16 @@ from sklearn.model_selection import StratifiedShuffleSplit
 
 class DataIngestion:
 
-    def __init__(self,data_ingestion_config:DataIngestionConfig, database_config:DatabaseConfig ):
+    def __init__(self,data_ingestion_config:DataIngestionConfig, database_config:DatabaseConfig,
+                 streaming_config:StreamingConfig = None):
+        """
+        streaming_config: when enabled the raw file is loaded and split chunk by chunk
+        """
         try:
             logging.info(f"{'>>'*20}Data Ingestion log started.{'<<'*20} ")
             self.data_ingestion_config = data_ingestion_config
             self.database_config = database_config
+            self.streaming_config = streaming_config
         
         except Exception as e:
             raise InsuranceException(e,sys)
@@ -46,61 +53,103 @@ class DataIngestion:
             else:
                 urllib.request.urlretrieve(download_url, raw_data_file_path)
             logging.info(f"File :[{raw_data_file_path}] has been downloaded successfully.")
+            return raw_data_file_path
 
         except Exception as e:
             raise InsuranceException(e,sys) from e
 
     def save_data_into_database(self) -> DatabaseArtifact:
         try:
-            host = self.database_config.database_host
-            username = self.database_config.database_username
-            password = self.database_config.database_password
-            database_name = self.database_config.database_name
-            table_name = self.database_config.table_name
-
-            db_connect = mysql_connect.connect(host=host,username=username,password=password)
-            db_cursor = db_connect.cursor()
-
-            db_cursor.execute(f'CREATE DATABASE IF NOT EXISTS {database_name}')
-            db_cursor.execute(f'USE {database_name}')
-            
-            query = f"""CREATE TABLE IF NOT EXISTS {table_name}(id INT AUTO_INCREMENT PRIMARY KEY, age INT(10), 
-                        sex VARCHAR(10), bmi FLOAT(10,3), children INT(5), smoker VARCHAR(10), region VARCHAR(40), 
-                        expenses FLOAT(20,3))"""
-            db_cursor.execute(query)
+            database_loader = DatabaseBulkLoader(database_config=self.database_config)
+            database_loader.create_tables()
 
             # Locating the file which has been downloaded 
             raw_data_dir = self.data_ingestion_config.raw_data_dir
             file_name = os.listdir(raw_data_dir)[0]
             insurance_file_path = os.path.join(raw_data_dir,file_name)
             logging.info(f"insurance file path : {insurance_file_path}")
-            # Reading the file
-            insurance_dataframe = pd.read_csv(insurance_file_path)
-            count = 0
-            db_cursor.execute('show tables')
-            if table_name in db_cursor.fetchall()[0]:
-                for row in insurance_dataframe.to_numpy():
-                    query = f"INSERT INTO {table_name}(age,sex,bmi,children,smoker,region,expenses) VALUES({int(row[0])},'{str(row[1])}',{float(row[2])},{int(row[3])},'{str(row[4])}','{str(row[5])}',{float(row[6])})"
-                    db_cursor.execute(query)
-                    count = count +1
+            if self.data_ingestion_config.is_incremental:
+                # only the rows appended since the previous run, the watermark ingestion picks them up
+                database_load_report = database_loader.append_file(
+                    file_path=insurance_file_path, chunk_size=self.get_chunk_size(),
+                    source=self.data_ingestion_config.dataset_download_url)
             else:
-                logging.info(f"table: {table_name} not found in database:{database_name}")
-            logging.info(f"row affected or saved in database :{count}")
-            db_connect.commit()
-            db_connect.close()
-
-            database_artifact=DatabaseArtifact(database_host=host,
-                                                database_username=username,
-                                                database_password=password,
-                                                database_name=database_name,
-                                                table_name=table_name)
+                # Reading the file, chunk by chunk in streaming mode
+                database_load_report = database_loader.load_file(file_path=insurance_file_path,
+                                                                 chunk_size=self.get_chunk_size())
+            logging.info(f"row affected or saved in database :{database_load_report.loaded_rows}")
+
+            database_artifact=DatabaseArtifact(database_host=self.database_config.database_host,
+                                                database_username=self.database_config.database_username,
+                                                database_password=self.database_config.database_password,
+                                                database_name=self.database_config.database_name,
+                                                table_name=self.database_config.table_name,
+                                                database_backend=self.database_config.database_backend,
+                                                loaded_rows=database_load_report.loaded_rows,
+                                                rows_per_second=database_load_report.rows_per_second)
         
             logging.info(f"Data saved in database. DatabaseArtifact:{database_artifact}")
+            return database_artifact
         except Exception as e:
             raise InsuranceException(e,sys) from e
     
+    def get_chunk_size(self) -> int:
+        """
+        return: rows read at a time in streaming mode, None to read whole files
+        """
+        if self.streaming_config is not None and self.streaming_config.is_enabled:
+            return self.streaming_config.chunk_size
+        return None
+
+    def split_data_as_train_test_in_chunks(self) -> DataIngestionArtifact:
+        """
+        Out of core counterpart of split_data_as_train_test. Stratifying needs the
+        whole target column, so every row goes to the test file with probability
+        0.2 instead, from a generator seeded like the in memory split.
+        """
+        try:
+            raw_data_dir = self.data_ingestion_config.raw_data_dir
+
+            file_name = os.listdir(raw_data_dir)[0]
+
+            insurance_file_path = os.path.join(raw_data_dir,file_name)
+
+            train_file_path = os.path.join(self.data_ingestion_config.ingested_train_dir, file_name)
+            test_file_path = os.path.join(self.data_ingestion_config.ingested_test_dir, file_name)
+            os.makedirs(self.data_ingestion_config.ingested_train_dir,exist_ok=True)
+            os.makedirs(self.data_ingestion_config.ingested_test_dir, exist_ok= True)
+
+            logging.info(f"Splitting csv file: [{insurance_file_path}] into train and test "
+                         f"in chunks of [{self.streaming_config.chunk_size}] rows")
+            random_generator = np.random.default_rng(42)
+            n_train_rows, n_test_rows = 0, 0
+            with open(train_file_path, "w", newline="") as train_file, \
+                    open(test_file_path, "w", newline="") as test_file:
+                for chunk_number, insurance_data_frame in enumerate(
+                        read_csv_chunks(file_path=insurance_file_path, chunk_size=self.streaming_config.chunk_size)):
+                    is_test_row = random_generator.random(len(insurance_data_frame)) < 0.2
+                    insurance_data_frame[~is_test_row].to_csv(train_file, index=False, header=chunk_number == 0)
+                    insurance_data_frame[is_test_row].to_csv(test_file, index=False, header=chunk_number == 0)
+                    n_train_rows += int((~is_test_row).sum())
+                    n_test_rows += int(is_test_row.sum())
+            logging.info(f"Exported [{n_train_rows}] training rows to file: [{train_file_path}] and "
+                         f"[{n_test_rows}] test rows to file: [{test_file_path}]")
+
+            data_ingestion_artifact = DataIngestionArtifact(train_file_path=train_file_path,
+                                test_file_path=test_file_path,
+                                is_ingested=True,
+                                message=f"Data ingestion in chunks completed successfully."
+                                )
+            logging.info(f"Data Ingestion artifact:[{data_ingestion_artifact}]")
+            return data_ingestion_artifact
+
+        except Exception as e:
+            raise InsuranceException(e,sys) from e
+
     def split_data_as_train_test(self) -> DataIngestionArtifact:
         try:
+            if self.get_chunk_size() is not None:
+                return self.split_data_as_train_test_in_chunks()
             raw_data_dir = self.data_ingestion_config.raw_data_dir
 
             file_name = os.listdir(raw_data_dir)[0]
@@ -156,13 +205,53 @@ class DataIngestion:
         except Exception as e:
             raise InsuranceException(e,sys) from e
 
-    def initiate_data_ingestion(self)-> DataIngestionArtifact:
+    def ingest_new_database_rows(self) -> DataIngestionArtifact:
+        """
+        Incremental counterpart of split_data_as_train_test. Only the table rows
+        above the watermark of the previous run are read from the database, split
+        and appended to the train and test history, which the later stages read
+        as a whole.
+        """
+        try:
+            watermark_ingestion = WatermarkIngestion(database_config=self.database_config,
+                                                     history_dir=self.data_ingestion_config.history_dir,
+                                                     watermark_column=self.data_ingestion_config.watermark_column,
+                                                     fetch_size=self.data_ingestion_config.fetch_size)
+            partition = watermark_ingestion.ingest()
+            train_file_path = watermark_ingestion.train_file_path
+            test_file_path = watermark_ingestion.test_file_path
+            if not os.path.exists(train_file_path) or not os.path.exists(test_file_path):
+                raise Exception(f"Table [{self.database_config.table_name}] has no row to ingest.")
+
+            if partition is None:
+                message = "No new rows since the last ingestion, the history is unchanged."
+            else:
+                message = f"Incremental data ingestion of [{partition.n_rows}] new rows completed successfully."
+            data_ingestion_artifact = DataIngestionArtifact(train_file_path=train_file_path,
+                                test_file_path=test_file_path,
+                                is_ingested=True,
+                                message=message
+                                )
+            logging.info(f"Data Ingestion artifact:[{data_ingestion_artifact}]")
+            return data_ingestion_artifact
+        except Exception as e:
+            raise InsuranceException(e,sys) from e
+
+    def ingest_downloaded_data(self)-> DataIngestionArtifact:
         try:
-            self.download_insurance_data()
             self.save_data_into_database()
+            if self.data_ingestion_config.is_incremental:
+                return self.ingest_new_database_rows()
             return self.split_data_as_train_test()
         except Exception as e:
             raise InsuranceException(e,sys) from e
+
+    def initiate_data_ingestion(self)-> DataIngestionArtifact:
+        try:
+            self.download_insurance_data()
+            return self.ingest_downloaded_data()
+        except Exception as e:
+            raise InsuranceException(e,sys) from e
     
 
 
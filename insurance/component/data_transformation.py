@@ -1,10 +1,13 @@
 from insurance.exception import InsuranceException
 from insurance.logger import logging
-from insurance.entity.config_entity import DataTransformationConfig 
+from insurance.entity.config_entity import DataTransformationConfig, StreamingConfig
 from insurance.entity.artifact_entity import DataIngestionArtifact,\
     DataValidationArtifact,DataTransformationArtifact
 from insurance.constant import *
-from insurance.util.util import read_yaml_file,save_object,save_numpy_array_data,load_data
+from insurance.util.util import read_yaml_file,save_object,save_numpy_array_data,load_data,load_data_chunks
+from insurance.entity.incremental_preprocessor import IncrementalPreprocessingStatistics
+from insurance.entity.compiled_preprocessor import CompiledPreprocessor
+from insurance.entity.array_chunks import ArrayChunkWriter
 
 import sys,os
 import numpy as np
@@ -27,12 +30,17 @@ class DataTransformation:
 
     def __init__(self, data_transformation_config: DataTransformationConfig,
                  data_ingestion_artifact: DataIngestionArtifact,
-                 data_validation_artifact: DataValidationArtifact
+                 data_validation_artifact: DataValidationArtifact,
+                 streaming_config: StreamingConfig = None
                  ):
+        """
+        streaming_config: when enabled the datasets are transformed chunk by chunk
+        """
         try:
             self.data_transformation_config= data_transformation_config
             self.data_ingestion_artifact = data_ingestion_artifact
             self.data_validation_artifact = data_validation_artifact
+            self.streaming_config = streaming_config
 
         except Exception as e:
             raise InsuranceException(e,sys) from e
@@ -74,9 +82,99 @@ class DataTransformation:
             raise InsuranceException(e,sys) from e   
 
 
+    def get_incremental_preprocessing_object(self) -> CompiledPreprocessor:
+        """
+        Fits the preprocessing statistics over chunks of the training file, see
+        IncrementalPreprocessingStatistics. They are checked against the in memory
+        pipeline on the first chunk, there is no sklearn fallback out of core.
+        """
+        try:
+            schema_file_path = self.data_validation_artifact.schema_file_path
+            dataset_schema = read_yaml_file(file_path=schema_file_path)
+
+            preprocessing_statistics = IncrementalPreprocessingStatistics(
+                numerical_columns=dataset_schema[DATASET_NUMERICAL_COLUMNS_KEY],
+                categorical_columns=dataset_schema[DATASET_CATEGORICAL_COLUMNS_KEY],
+                sample_size=self.streaming_config.sample_size)
+
+            first_train_df = None
+            for train_df in load_data_chunks(file_path=self.data_ingestion_artifact.train_file_path,
+                                             schema_file_path=schema_file_path,
+                                             chunk_size=self.streaming_config.chunk_size):
+                preprocessing_statistics.partial_fit(train_df)
+                if first_train_df is None:
+                    first_train_df = train_df
+            compiled_preprocessor = preprocessing_statistics.get_compiled_preprocessor()
+            if not preprocessing_statistics.is_equivalent(preprocessing_object=self.get_data_transformer_object(),
+                                                          dataframe=first_train_df):
+                raise Exception("Preprocessing statistics fitted in chunks do not match the in memory "
+                                "preprocessing pipeline.")
+            return compiled_preprocessor
+        except Exception as e:
+            raise InsuranceException(e,sys) from e
+
+    def transform_data_in_chunks(self, preprocessing_obj: CompiledPreprocessor, file_path: str,
+                                 transformed_dir: str) -> str:
+        """
+        Transforms a csv file chunk by chunk into .npy chunks, target column last.
+        return: manifest file path of the transformed chunks
+        """
+        try:
+            schema_file_path = self.data_validation_artifact.schema_file_path
+            target_column_name = read_yaml_file(file_path=schema_file_path)[DATASET_TARGET_COLUMN_KEY]
+
+            manifest_file_path = os.path.join(transformed_dir, os.path.basename(file_path).replace(".csv",".yaml"))
+            array_chunk_writer = ArrayChunkWriter(manifest_file_path=manifest_file_path)
+            for dataframe in load_data_chunks(file_path=file_path, schema_file_path=schema_file_path,
+                                              chunk_size=self.streaming_config.chunk_size):
+                input_feature_arr = preprocessing_obj.transform(dataframe.drop(columns=[target_column_name]))
+                array_chunk_writer.write(np.c_[input_feature_arr, np.array(dataframe[target_column_name])])
+            return array_chunk_writer.close()
+        except Exception as e:
+            raise InsuranceException(e,sys) from e
+
+    def initiate_chunked_data_transformation(self) -> DataTransformationArtifact:
+        """
+        Out of core transformation: preprocessing statistics are fitted in one pass
+        over the training file, both files are transformed in a second pass. The
+        transformed file paths of the artifact are manifests of .npy chunks.
+        """
+        try:
+            logging.info(f"Fitting preprocessing statistics in chunks of [{self.streaming_config.chunk_size}] rows.")
+            preprocessing_obj = self.get_incremental_preprocessing_object()
+
+            logging.info(f"Transforming training and testing dataset in chunks.")
+            transformed_train_file_path = self.transform_data_in_chunks(
+                preprocessing_obj=preprocessing_obj,
+                file_path=self.data_ingestion_artifact.train_file_path,
+                transformed_dir=self.data_transformation_config.transformed_train_dir)
+            transformed_test_file_path = self.transform_data_in_chunks(
+                preprocessing_obj=preprocessing_obj,
+                file_path=self.data_ingestion_artifact.test_file_path,
+                transformed_dir=self.data_transformation_config.transformed_test_dir)
+
+            preprocessing_obj_file_path = self.data_transformation_config.preprocessed_object_file_path
+
+            logging.info(f"Saving preprocessing object.")
+            save_object(file_path=preprocessing_obj_file_path,obj=preprocessing_obj)
+
+            data_transformation_artifact = DataTransformationArtifact(is_transformed=True,
+            message="Data transformation in chunks successfull.",
+            transformed_train_file_path=transformed_train_file_path,
+            transformed_test_file_path=transformed_test_file_path,
+            preprocessed_object_file_path=preprocessing_obj_file_path
+            )
+            logging.info(f"Data transformationa artifact: {data_transformation_artifact}")
+            return data_transformation_artifact
+        except Exception as e:
+            raise InsuranceException(e,sys) from e
+
     def initiate_data_transformation(self)->DataTransformationArtifact:
         try:
             logging.info(f"{'>>' * 30}Data Transformation log started.{'<<' * 30}\n")
+            if self.streaming_config is not None and self.streaming_config.is_enabled:
+                return self.initiate_chunked_data_transformation()
+
             logging.info(f"Obtaining preprocessing object.")
             preprocessing_obj = self.get_data_transformer_object()
 
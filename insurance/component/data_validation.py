@@ -1,8 +1,8 @@
 from insurance.logger import logging
 from insurance.exception import InsuranceException
-from insurance.entity.config_entity import DataValidationConfig
+from insurance.entity.config_entity import DataValidationConfig, StreamingConfig
 from insurance.entity.artifact_entity import DataIngestionArtifact,DataValidationArtifact
-from insurance.util.util import read_yaml_file
+from insurance.util.util import read_yaml_file, read_csv_chunks, load_data_sample
 from insurance.constant import DATASET_COLUMNS_KEY, DATASET_DOMAIN_VALUE_KEY
 
 import os,sys
@@ -17,22 +17,56 @@ class DataValidation:
     
 
     def __init__(self, data_validation_config:DataValidationConfig,
-        data_ingestion_artifact:DataIngestionArtifact):
+        data_ingestion_artifact:DataIngestionArtifact, streaming_config:StreamingConfig = None):
+        """
+        streaming_config: when enabled the schema is checked chunk by chunk and the
+        drift report is computed on uniform samples of the datasets
+        """
         try:
             self.data_validation_config = data_validation_config
             self.data_ingestion_artifact = data_ingestion_artifact
+            self.streaming_config = streaming_config
         except Exception as e:
             raise InsuranceException(e,sys) from e
 
+    def is_streaming_enabled(self) -> bool:
+        return self.streaming_config is not None and self.streaming_config.is_enabled
 
     def get_train_and_test_df(self):
         try:
+            if self.is_streaming_enabled():
+                logging.info(f"Sampling [{self.streaming_config.sample_size}] rows of train and test data.")
+                train_df, test_df = [load_data_sample(file_path=file_path,
+                                                      chunk_size=self.streaming_config.chunk_size,
+                                                      sample_size=self.streaming_config.sample_size)
+                                     for file_path in (self.data_ingestion_artifact.train_file_path,
+                                                       self.data_ingestion_artifact.test_file_path)]
+                return train_df,test_df
             train_df = pd.read_csv(self.data_ingestion_artifact.train_file_path)
             test_df = pd.read_csv(self.data_ingestion_artifact.test_file_path)
             return train_df,test_df
         except Exception as e:
             raise InsuranceException(e,sys) from e
 
+    def get_columns_and_domain_values(self, file_path:str, domain_columns:list) -> tuple:
+        """
+        return: columns of the file and {column: observed values} of its domain columns,
+        the file is read chunk by chunk in streaming mode
+        """
+        try:
+            chunk_size = self.streaming_config.chunk_size if self.is_streaming_enabled() else None
+            columns = None
+            domain_values = {}
+            for dataframe in read_csv_chunks(file_path=file_path, chunk_size=chunk_size):
+                if columns is None:
+                    columns = list(dataframe.columns)
+                    domain_values = {column: {} for column in columns if column in domain_columns}
+                for column, values in domain_values.items():
+                    values.update(dict.fromkeys(dataframe[column].value_counts().to_dict().keys()))
+            return columns, {column: list(values) for column, values in domain_values.items()}
+        except Exception as e:
+            raise InsuranceException(e,sys) from e
+
 
     def is_train_test_file_exists(self)->bool:
         try:
@@ -68,17 +102,18 @@ class DataValidation:
             train_file_path = self.data_ingestion_artifact.train_file_path
             test_file_path = self.data_ingestion_artifact.test_file_path
 
-            train_df = pd.read_csv(train_file_path)
-            test_df = pd.read_csv(test_file_path)
-
             schema_file_path = self.data_validation_config.schema_file_path
             dataset_schema_info = read_yaml_file(file_path=schema_file_path)
 
+            domain_columns = list(dataset_schema_info[DATASET_DOMAIN_VALUE_KEY].keys())
+            train_columns, train_domain_values = self.get_columns_and_domain_values(train_file_path, domain_columns)
+            test_columns, test_domain_values = self.get_columns_and_domain_values(test_file_path, domain_columns)
+
             #validate training and testing dataset using schema file
             #1. Number of Column
             valid_number_of_columns = False
 
-            if len(train_df.columns) == len(test_df.columns):
+            if len(train_columns) == len(test_columns):
                 valid_number_of_columns = True
 
             logging.info(f"validation of number of columns in train and test  data is : {valid_number_of_columns}")    
@@ -86,8 +121,8 @@ class DataValidation:
             #2. Check column names
             valid_columns_names = False
 
-            for col1 in train_df.columns:
-                for col2 in test_df.columns:
+            for col1 in train_columns:
+                for col2 in test_columns:
                     if col1 == col2:
                         if col1 in dataset_schema_info[DATASET_COLUMNS_KEY].keys():
                             valid_columns_names = True
@@ -98,9 +133,9 @@ class DataValidation:
             # train dataset domain check 
             valid_train_domain_value = 0
 
-            for column in train_df.columns:
+            for column in train_columns:
                 if column in dataset_schema_info[DATASET_DOMAIN_VALUE_KEY].keys():
-                    category = train_df[column].value_counts().to_dict().keys()
+                    category = train_domain_values[column]
                     for cat in category:
                         if cat not in dataset_schema_info[DATASET_DOMAIN_VALUE_KEY][column]:
                             valid_train_domain_value += 1
@@ -115,9 +150,9 @@ class DataValidation:
 
             # test dataset domain check
             valid_test_domain_value = 0
-            for column in test_df.columns:
+            for column in test_columns:
                 if column in dataset_schema_info[DATASET_DOMAIN_VALUE_KEY].keys():
-                    category = test_df[column].value_counts().to_dict().keys()
+                    category = test_domain_values[column]
                     for cat in category:
                         if cat not in dataset_schema_info[DATASET_DOMAIN_VALUE_KEY][column]:
                             valid_test_domain_value += 1
@@ -188,7 +223,12 @@ class DataValidation:
             self.validate_dataset_schema()
             self.is_data_drift_found()
             logging.info("Data Drift report saved.")
+            return self.get_data_validation_artifact()
+        except Exception as e:
+            raise InsuranceException(e,sys) from e
 
+    def get_data_validation_artifact(self)->DataValidationArtifact:
+        try:
             data_validation_artifact = DataValidationArtifact(
                 schema_file_path=self.data_validation_config.schema_file_path,
                 report_file_path=self.data_validation_config.report_file_path,
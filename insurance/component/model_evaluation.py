@@ -1,12 +1,17 @@
 from insurance.logger import logging
 from insurance.exception import InsuranceException
-from insurance.entity.config_entity import ModelEvaluationConfig
+from insurance.entity.config_entity import ModelEvaluationConfig, StreamingConfig
 from insurance.entity.artifact_entity import DataIngestionArtifact,DataValidationArtifact,ModelTrainerArtifact,ModelEvaluationArtifact
 from insurance.constant import *
-from insurance.util.util import write_yaml_file, read_yaml_file, load_object,load_data
+from insurance.util.util import write_yaml_file, read_yaml_file, load_object,load_data,get_stage_fingerprint
+from insurance.util.util import load_data_chunks
+from insurance.util.util import save_numpy_array_data
 from insurance.entity.model_factory import evaluate_regression_model
+from insurance.entity.model_metrics import get_predictions, get_metrics_table_from_predictions, TRAIN_DATASET, \
+    TEST_DATASET, get_metrics_table_from_chunks
 
 import numpy as np
+import hashlib
 import os
 import sys
 
@@ -16,12 +21,17 @@ class ModelEvaluation:
     def __init__(self, model_evaluation_config: ModelEvaluationConfig,
                  data_ingestion_artifact: DataIngestionArtifact,
                  data_validation_artifact: DataValidationArtifact,
-                 model_trainer_artifact: ModelTrainerArtifact):
+                 model_trainer_artifact: ModelTrainerArtifact,
+                 streaming_config: StreamingConfig = None):
+        """
+        streaming_config: when enabled the models are scored chunk by chunk
+        """
         try:
             self.model_evaluation_config = model_evaluation_config
             self.model_trainer_artifact = model_trainer_artifact
             self.data_ingestion_artifact = data_ingestion_artifact
             self.data_validation_artifact = data_validation_artifact
+            self.streaming_config = streaming_config
         except Exception as e:
             raise InsuranceException(e, sys) from e
 
@@ -46,7 +56,123 @@ class ModelEvaluation:
         except Exception as e:
             raise InsuranceException(e, sys) from e
 
-    def update_evaluation_report(self, model_evaluation_artifact: ModelEvaluationArtifact):
+    def get_best_model_path(self) -> str:
+        try:
+            model_eval_content = read_yaml_file(file_path=self.model_evaluation_config.model_evaluation_file_path)
+            return (model_eval_content or dict())[BEST_MODEL_KEY][MODEL_PATH_KEY]
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    def is_best_model(self, model_file_path: str) -> bool:
+        """
+        True when model_file_path is already the best model, e.g. a model trainer
+        artifact restored from the stage cache on a run where nothing changed.
+        """
+        try:
+            model_evaluation_file_path = self.model_evaluation_config.model_evaluation_file_path
+            if not os.path.exists(model_evaluation_file_path):
+                return False
+            model_eval_content = read_yaml_file(file_path=model_evaluation_file_path) or dict()
+            best_model_path = (model_eval_content.get(BEST_MODEL_KEY) or dict()).get(MODEL_PATH_KEY)
+            return best_model_path is not None and \
+                os.path.abspath(best_model_path) == os.path.abspath(model_file_path)
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    def get_dataset_hash(self) -> str:
+        """
+        return: content hash of the train and test files and the schema the models are scored on
+        """
+        return get_stage_fingerprint(input_file_paths=[self.data_ingestion_artifact.train_file_path,
+                                                       self.data_ingestion_artifact.test_file_path,
+                                                       self.data_validation_artifact.schema_file_path])
+
+    def get_cached_best_model_predictions(self, dataset_hash: str) -> tuple:
+        """
+        return: name and {"train": y_pred, "test": y_pred} of the best model when its predictions
+        were cached for the same model path and dataset hash, (None, None) otherwise
+        """
+        try:
+            model_eval_file_path = self.model_evaluation_config.model_evaluation_file_path
+            if not os.path.exists(model_eval_file_path):
+                return None, None
+            model_eval_content = read_yaml_file(file_path=model_eval_file_path) or dict()
+            best_model_info = model_eval_content.get(BEST_MODEL_KEY) or dict()
+            evaluation_cache = best_model_info.get(EVALUATION_CACHE_KEY)
+            if evaluation_cache is None:
+                return None, None
+            if evaluation_cache.get(MODEL_PATH_KEY) != best_model_info.get(MODEL_PATH_KEY) or \
+                    evaluation_cache.get(DATASET_HASH_KEY) != dataset_hash:
+                logging.info("Best model or dataset changed, cached best model predictions are not used.")
+                return None, None
+            prediction_file_paths = {TRAIN_DATASET: evaluation_cache[TRAIN_PREDICTION_FILE_PATH_KEY],
+                                     TEST_DATASET: evaluation_cache[TEST_PREDICTION_FILE_PATH_KEY]}
+            if not all(os.path.exists(file_path) for file_path in prediction_file_paths.values()):
+                return None, None
+            logging.info(f"Using cached predictions of best model [{best_model_info[MODEL_PATH_KEY]}]")
+            return evaluation_cache[MODEL_NAME_KEY], {dataset: np.load(file_path)
+                                                      for dataset, file_path in prediction_file_paths.items()}
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    def save_model_predictions(self, model_path: str, model_name: str, dataset_hash: str, predictions: dict,
+                               metrics: dict) -> dict:
+        """
+        Saves the predictions of a model as .npy files next to model_evaluation.yaml.
+        return: evaluation cache entry of the model
+        """
+        try:
+            prediction_dir = os.path.join(os.path.dirname(self.model_evaluation_config.model_evaluation_file_path),
+                                          MODEL_EVALUATION_PREDICTION_DIR)
+            file_name_prefix = f"{hashlib.sha256(model_path.encode()).hexdigest()[:16]}_{dataset_hash[:16]}"
+            prediction_file_paths = {}
+            for dataset, y_pred in predictions.items():
+                prediction_file_paths[dataset] = os.path.join(prediction_dir, f"{file_name_prefix}_{dataset}.npy")
+                save_numpy_array_data(file_path=prediction_file_paths[dataset], array=np.asarray(y_pred))
+            return {
+                MODEL_PATH_KEY: model_path,
+                MODEL_NAME_KEY: model_name,
+                DATASET_HASH_KEY: dataset_hash,
+                METRICS_KEY: {key: float(value) for key, value in metrics.items()
+                              if key not in ("model_name", "index_number")},
+                TRAIN_PREDICTION_FILE_PATH_KEY: prediction_file_paths[TRAIN_DATASET],
+                TEST_PREDICTION_FILE_PATH_KEY: prediction_file_paths[TEST_DATASET],
+            }
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    @staticmethod
+    def remove_evaluation_cache(model_info: dict, new_evaluation_cache: dict = None):
+        """
+        Drops the evaluation cache of a model and its prediction files, except files
+        new_evaluation_cache points at.
+        """
+        evaluation_cache = model_info.pop(EVALUATION_CACHE_KEY, None)
+        if evaluation_cache is None:
+            return
+        new_evaluation_cache = new_evaluation_cache or dict()
+        for key in (TRAIN_PREDICTION_FILE_PATH_KEY, TEST_PREDICTION_FILE_PATH_KEY):
+            if evaluation_cache[key] != new_evaluation_cache.get(key) and os.path.exists(evaluation_cache[key]):
+                os.remove(evaluation_cache[key])
+
+    def save_best_model_evaluation_cache(self, evaluation_cache: dict):
+        try:
+            eval_file_path = self.model_evaluation_config.model_evaluation_file_path
+            model_eval_content = read_yaml_file(file_path=eval_file_path) or dict()
+            best_model_info = model_eval_content[BEST_MODEL_KEY]
+            if best_model_info.get(EVALUATION_CACHE_KEY, {}).get(DATASET_HASH_KEY) != \
+                    evaluation_cache[DATASET_HASH_KEY]:
+                ModelEvaluation.remove_evaluation_cache(best_model_info, evaluation_cache)
+            best_model_info[EVALUATION_CACHE_KEY] = evaluation_cache
+            write_yaml_file(file_path=eval_file_path, data=model_eval_content)
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    def update_evaluation_report(self, model_evaluation_artifact: ModelEvaluationArtifact,
+                                 evaluation_cache: dict = None):
+        """
+        evaluation_cache: cached predictions of the accepted model, see save_model_predictions
+        """
         try:
             eval_file_path = self.model_evaluation_config.model_evaluation_file_path
             model_eval_content = read_yaml_file(file_path=eval_file_path)
@@ -56,6 +182,8 @@ class ModelEvaluation:
             previous_best_model = None
             if BEST_MODEL_KEY in model_eval_content:
                 previous_best_model = model_eval_content[BEST_MODEL_KEY]
+                # predictions of replaced models are never read again
+                ModelEvaluation.remove_evaluation_cache(previous_best_model, evaluation_cache)
 
             logging.info(f"Previous eval result: {model_eval_content}")
             eval_result = {
@@ -63,6 +191,8 @@ class ModelEvaluation:
                     MODEL_PATH_KEY: model_evaluation_artifact.evaluated_model_path,
                 }
             }
+            if evaluation_cache is not None:
+                eval_result[BEST_MODEL_KEY][EVALUATION_CACHE_KEY] = evaluation_cache
 
             if previous_best_model is not None:
                 model_history = {self.model_evaluation_config.time_stamp: previous_best_model}
@@ -79,12 +209,69 @@ class ModelEvaluation:
         except Exception as e:
             raise InsuranceException(e, sys) from e
 
+    def iter_data_chunks(self, file_path: str):
+        """
+        return: generator of (input dataframe, target array) chunks of a dataset file
+        """
+        schema_file_path = self.data_validation_artifact.schema_file_path
+        target_column_name = read_yaml_file(file_path=schema_file_path)[DATASET_TARGET_COLUMN_KEY]
+        for dataframe in load_data_chunks(file_path=file_path, schema_file_path=schema_file_path,
+                                          chunk_size=self.streaming_config.chunk_size):
+            yield dataframe.drop(columns=[target_column_name]), np.array(dataframe[target_column_name])
+
+    def initiate_chunked_model_evaluation(self, trained_model_object) -> ModelEvaluationArtifact:
+        """
+        Out of core counterpart of initiate_model_evaluation: both models are scored
+        chunk by chunk. Predictions are not cached since they are never held in memory.
+        """
+        try:
+            trained_model_file_path = self.model_trainer_artifact.trained_model_file_path
+            model = self.get_best_model()
+            if model is None:
+                logging.info("Not found any existing model. Hence accepting trained model")
+                model_evaluation_artifact = ModelEvaluationArtifact(evaluated_model_path=trained_model_file_path,
+                                                                    is_model_accepted=True)
+                self.update_evaluation_report(model_evaluation_artifact)
+                logging.info(f"Model accepted. Model eval artifact {model_evaluation_artifact} created")
+                return model_evaluation_artifact
+
+            model_list = [model, trained_model_object]
+            metrics_table = get_metrics_table_from_chunks(
+                model_list=model_list,
+                train_chunks=self.iter_data_chunks(self.data_ingestion_artifact.train_file_path),
+                test_chunks=self.iter_data_chunks(self.data_ingestion_artifact.test_file_path))
+            metric_info_artifact = evaluate_regression_model(model_list=model_list, X_train=None, y_train=None,
+                                                             X_test=None, y_test=None,
+                                                             base_accuracy=self.model_trainer_artifact.model_accuracy,
+                                                             metrics_table=metrics_table)
+            logging.info(f"Model evaluation completed. model metric artifact: {metric_info_artifact}")
+
+            is_trained_model_accepted = metric_info_artifact is not None and metric_info_artifact.index_number == 1
+            model_evaluation_artifact = ModelEvaluationArtifact(evaluated_model_path=trained_model_file_path,
+                                                                is_model_accepted=is_trained_model_accepted)
+            if is_trained_model_accepted:
+                self.update_evaluation_report(model_evaluation_artifact)
+                logging.info(f"Model accepted. Model eval artifact {model_evaluation_artifact} created")
+            else:
+                logging.info("Trained model is no better than existing model hence not accepting trained model")
+            return model_evaluation_artifact
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
     def initiate_model_evaluation(self) -> ModelEvaluationArtifact:
         try:
             logging.info(f"{'>>' * 30}Model Evaluation log started.{'<<' * 30} ")
 
             trained_model_file_path = self.model_trainer_artifact.trained_model_file_path
+            if self.is_best_model(trained_model_file_path):
+                # comparing the model with itself would accept it on the tie and push it again
+                logging.info(f"Trained model [{trained_model_file_path}] is already the best model, "
+                             f"hence not accepting it again")
+                return ModelEvaluationArtifact(evaluated_model_path=trained_model_file_path,
+                                               is_model_accepted=False)
             trained_model_object = load_object(file_path=trained_model_file_path)
+            if self.streaming_config is not None and self.streaming_config.is_enabled:
+                return self.initiate_chunked_model_evaluation(trained_model_object=trained_model_object)
 
             train_file_path = self.data_ingestion_artifact.train_file_path
             test_file_path = self.data_ingestion_artifact.test_file_path
@@ -112,17 +299,35 @@ class ModelEvaluation:
             test_dataframe.drop(target_column_name, axis=1, inplace=True)
             logging.info(f"Dropping target column from the dataframe completed.")
 
-            model = self.get_best_model()
+            dataset_hash = self.get_dataset_hash()
+            best_model_name, best_model_predictions = self.get_cached_best_model_predictions(dataset_hash)
+            model = None
+            if best_model_predictions is None:
+                model = self.get_best_model()
 
-            if model is None:
-                logging.info("Not found any existing model. Hence accepting trained model")
-                model_evaluation_artifact = ModelEvaluationArtifact(evaluated_model_path=trained_model_file_path,
-                                                                    is_model_accepted=True)
-                self.update_evaluation_report(model_evaluation_artifact)
-                logging.info(f"Model accepted. Model eval artifact {model_evaluation_artifact} created")
-                return model_evaluation_artifact
+                if model is None:
+                    logging.info("Not found any existing model. Hence accepting trained model")
+                    model_evaluation_artifact = ModelEvaluationArtifact(evaluated_model_path=trained_model_file_path,
+                                                                        is_model_accepted=True)
+                    self.update_evaluation_report(model_evaluation_artifact)
+                    logging.info(f"Model accepted. Model eval artifact {model_evaluation_artifact} created")
+                    return model_evaluation_artifact
+
+                best_model_name = str(model)
+                best_model_predictions, trained_model_predictions = get_predictions(
+                    model_list=[model, trained_model_object], X_train=train_dataframe, X_test=test_dataframe)
+            else:
+                # only the new model has to be scored
+                trained_model_predictions, = get_predictions(model_list=[trained_model_object],
+                                                             X_train=train_dataframe, X_test=test_dataframe)
 
             model_list = [model, trained_model_object]
+            metrics_table = get_metrics_table_from_predictions(
+                model_names=[best_model_name, str(trained_model_object)],
+                predictions=[best_model_predictions, trained_model_predictions],
+                y_train=train_target_arr,
+                y_test=test_target_arr)
+            metrics = metrics_table.to_dict(orient="records")
 
             metric_info_artifact = evaluate_regression_model(model_list=model_list,
                                                                X_train=train_dataframe,
@@ -130,9 +335,18 @@ class ModelEvaluation:
                                                                X_test=test_dataframe,
                                                                y_test=test_target_arr,
                                                                base_accuracy=self.model_trainer_artifact.model_accuracy,
+                                                               metrics_table=metrics_table,
                                                                )
             logging.info(f"Model evaluation completed. model metric artifact: {metric_info_artifact}")
 
+            is_trained_model_accepted = metric_info_artifact is not None and metric_info_artifact.index_number == 1
+            if model is not None and not is_trained_model_accepted:
+                # the best model stays, its predictions are reused until it or the dataset changes
+                self.save_best_model_evaluation_cache(self.save_model_predictions(
+                    model_path=self.get_best_model_path(),
+                    model_name=best_model_name, dataset_hash=dataset_hash,
+                    predictions=best_model_predictions, metrics=metrics[0]))
+
             if metric_info_artifact is None:
                 response = ModelEvaluationArtifact(is_model_accepted=False,
                                                    evaluated_model_path=trained_model_file_path
@@ -140,10 +354,15 @@ class ModelEvaluation:
                 logging.info(response)
                 return response
 
-            if metric_info_artifact.index_number == 1:
+            if is_trained_model_accepted:
                 model_evaluation_artifact = ModelEvaluationArtifact(evaluated_model_path=trained_model_file_path,
                                                                     is_model_accepted=True)
-                self.update_evaluation_report(model_evaluation_artifact)
+                evaluation_cache = self.save_model_predictions(model_path=trained_model_file_path,
+                                                               model_name=str(trained_model_object),
+                                                               dataset_hash=dataset_hash,
+                                                               predictions=trained_model_predictions,
+                                                               metrics=metrics[1])
+                self.update_evaluation_report(model_evaluation_artifact, evaluation_cache=evaluation_cache)
                 logging.info(f"Model accepted. Model eval artifact {model_evaluation_artifact} created")
 
             else:
@@ -2,8 +2,12 @@ from insurance.logger import logging
 from insurance.exception import InsuranceException
 from insurance.entity.artifact_entity import ModelPusherArtifact, ModelEvaluationArtifact 
 from insurance.entity.config_entity import ModelPusherConfig
+from insurance.util.util import write_yaml_file_atomic, get_file_checksum, load_object
+from insurance.entity.compact_model import export_compact_model, load_compact_model, is_compact_model_equivalent
+from insurance.constant import *
 import os, sys
 import shutil
+from datetime import datetime
 
 
 class ModelPusher:
@@ -32,6 +36,10 @@ class ModelPusher:
             logging.info(
                 f"Trained model: {evaluated_model_file_path} is copied in export dir:[{export_model_file_path}]")
 
+            compact_model_dir = self.export_compact_model(export_model_file_path=export_model_file_path)
+            self.update_model_manifest(export_model_file_path=export_model_file_path,
+                                       compact_model_dir=compact_model_dir)
+
             model_pusher_artifact = ModelPusherArtifact(is_model_pusher=True,
                                                         export_model_file_path=export_model_file_path
                                                         )
@@ -40,6 +48,52 @@ class ModelPusher:
         except Exception as e:
             raise InsuranceException(e, sys) from e
 
+    def export_compact_model(self, export_model_file_path: str) -> str:
+        """
+        Writes the compact numpy format of the model next to the dill file.
+        return: compact model directory or None if the model can not be exported
+        """
+        compact_model_dir = os.path.join(os.path.dirname(export_model_file_path), COMPACT_MODEL_DIR_NAME)
+        try:
+            insurance_model = load_object(file_path=export_model_file_path)
+            export_compact_model(insurance_model=insurance_model, export_dir=compact_model_dir,
+                                 estimator_file_path=export_model_file_path)
+            compact_model = load_compact_model(export_dir=compact_model_dir)
+            if not is_compact_model_equivalent(insurance_model=insurance_model, compact_model=compact_model):
+                raise Exception("Compact model predictions do not match the trained model predictions.")
+            return compact_model_dir
+        except Exception as e:
+            # the dill file alone is still a complete export
+            logging.info(f"Compact model not exported: {e}")
+            shutil.rmtree(compact_model_dir, ignore_errors=True)
+            return None
+
+    def update_model_manifest(self, export_model_file_path: str, compact_model_dir: str = None) -> dict:
+        """
+        Points the manifest of the export directory at the newly exported model.
+        The manifest is replaced atomically and only once the model file is
+        completely written, so serving processes can resolve the current model
+        with a single small read and never see a partially exported version.
+        """
+        try:
+            manifest_file_path = self.model_pusher_config.manifest_file_path
+            model_export_root_dir = os.path.dirname(manifest_file_path)
+            model_manifest = {
+                MODEL_MANIFEST_VERSION_KEY: os.path.basename(os.path.dirname(export_model_file_path)),
+                MODEL_MANIFEST_MODEL_PATH_KEY: os.path.relpath(export_model_file_path, model_export_root_dir),
+                MODEL_MANIFEST_CHECKSUM_KEY: get_file_checksum(file_path=export_model_file_path),
+                MODEL_MANIFEST_SIZE_KEY: os.path.getsize(export_model_file_path),
+                MODEL_MANIFEST_PUSHED_AT_KEY: datetime.now().isoformat(),
+            }
+            if compact_model_dir is not None:
+                model_manifest[MODEL_MANIFEST_COMPACT_MODEL_PATH_KEY] = os.path.relpath(compact_model_dir,
+                                                                                        model_export_root_dir)
+            write_yaml_file_atomic(file_path=manifest_file_path, data=model_manifest)
+            logging.info(f"Model manifest [{manifest_file_path}] updated: {model_manifest}")
+            return model_manifest
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
     def initiate_model_pusher(self) -> ModelPusherArtifact:
         try:
             logging.info(f"{'>>' * 30}Model Pusher log started.{'<<' * 30} ")
@@ -4,10 +4,15 @@ import sys
 from insurance.logger import logging
 from typing import List
 from insurance.entity.artifact_entity import DataTransformationArtifact, ModelTrainerArtifact
-from insurance.entity.config_entity import ModelTrainerConfig
-from insurance.util.util import load_numpy_array_data,save_object,load_object
+from insurance.entity.config_entity import ModelTrainerConfig, StreamingConfig
+from insurance.util.util import save_object,load_object
 from insurance.entity.model_factory import MetricInfoArtifact, ModelFactory,GridSearchedBestModel
 from insurance.entity.model_factory import evaluate_regression_model
+from insurance.entity.model_metrics import get_metrics_table, get_metrics_table_from_chunks
+from insurance.entity.compiled_preprocessor import compile_preprocessing_object
+from insurance.entity.flat_forest import compile_forest
+from insurance.entity.shared_array import SharedArrayStore, attach_shared_array
+from insurance.entity.array_chunks import iter_array_chunks
 
 
 
@@ -20,6 +25,19 @@ class InsuranceEstimatorModel:
         """
         self.preprocessing_object = preprocessing_object
         self.trained_model_object = trained_model_object
+        self.compiled_preprocessing_object = compile_preprocessing_object(preprocessing_object)
+        self.flat_forest = compile_forest(trained_model_object)
+
+    def transform(self, X):
+        """
+        function transforms raw inputs using the compiled numpy preprocessor when
+        available and falls back on preprocessing_object otherwise
+        """
+        # models pickled before the compiled preprocessor was introduced do not have the attribute
+        compiled_preprocessing_object = getattr(self, "compiled_preprocessing_object", None)
+        if compiled_preprocessing_object is not None:
+            return compiled_preprocessing_object.transform(X)
+        return self.preprocessing_object.transform(X)
 
     def predict(self, X):
         """
@@ -27,7 +45,17 @@ class InsuranceEstimatorModel:
         which gurantees that the inputs are in the same format as the training data
         At last it perform prediction on transformed features
         """
-        transformed_feature = self.preprocessing_object.transform(X)
+        transformed_feature = self.transform(X)
+        return self.predict_transformed(transformed_feature)
+
+    def predict_transformed(self, transformed_feature):
+        """
+        function predicts already transformed features, small batches of forest
+        models are scored by the flattened forest
+        """
+        flat_forest = getattr(self, "flat_forest", None)
+        if flat_forest is not None and flat_forest.is_preferred(len(transformed_feature)):
+            return flat_forest.predict(transformed_feature)
         return self.trained_model_object.predict(transformed_feature)
 
     def __repr__(self):
@@ -41,33 +69,110 @@ class InsuranceEstimatorModel:
 
 class ModelTrainer:
 
-    def __init__(self, model_trainer_config:ModelTrainerConfig, data_transformation_artifact: DataTransformationArtifact):
+    def __init__(self, model_trainer_config:ModelTrainerConfig, data_transformation_artifact: DataTransformationArtifact,
+                 streaming_config: StreamingConfig = None):
+        """
+        streaming_config: when enabled the transformed files are chunk manifests and
+        the models of incremental_model_selection are trained chunk by chunk
+        """
         try:
             self.model_trainer_config = model_trainer_config
             self.data_transformation_artifact = data_transformation_artifact
+            self.streaming_config = streaming_config
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    @staticmethod
+    def iter_transformed_chunks(manifest_file_path: str):
+        """
+        return: generator of (input feature, target) of every transformed chunk
+        """
+        for chunk in iter_array_chunks(manifest_file_path):
+            yield chunk[:, :-1], chunk[:, -1]
+
+    def initiate_incremental_model_trainer(self) -> ModelTrainerArtifact:
+        """
+        Out of core counterpart of initiate_model_trainer: models are trained and
+        scored one transformed chunk at a time.
+        """
+        try:
+            transformed_train_file_path = self.data_transformation_artifact.transformed_train_file_path
+            transformed_test_file_path = self.data_transformation_artifact.transformed_test_file_path
+
+            model_config_file_path = self.model_trainer_config.model_config_file_path
+            logging.info(f"Initializing model factory class using above model config file: {model_config_file_path}")
+            model_factory = ModelFactory(model_config_path=model_config_file_path)
+
+            logging.info(f"Training incremental models on chunks of: [{transformed_train_file_path}]")
+            grid_searched_best_model_list:List[GridSearchedBestModel] = model_factory.train_incremental_models(
+                train_file_path=transformed_train_file_path)
+
+            model_list = [model.best_model for model in grid_searched_best_model_list]
+            logging.info(f"Evaluation all trained model on training and testing dataset both")
+            metrics_table = get_metrics_table_from_chunks(
+                model_list=model_list,
+                train_chunks=ModelTrainer.iter_transformed_chunks(transformed_train_file_path),
+                test_chunks=ModelTrainer.iter_transformed_chunks(transformed_test_file_path))
+            base_accuracy = self.model_trainer_config.base_accuracy
+            metric_info:MetricInfoArtifact = evaluate_regression_model(model_list=model_list,X_train=None,y_train=None,X_test=None,y_test=None,base_accuracy=base_accuracy,metrics_table=metrics_table)
+            if metric_info is None:
+                raise Exception(f"None of the incremental models has base accuracy: {base_accuracy}")
+
+            logging.info(f"Best found model on both training and testing dataset.{metric_info.model_object}")
+            preprocessing_obj = load_object(file_path=self.data_transformation_artifact.preprocessed_object_file_path)
+
+            trained_model_file_path=self.model_trainer_config.trained_model_file_path
+            insurance_model = InsuranceEstimatorModel(preprocessing_object=preprocessing_obj,
+                                                      trained_model_object=metric_info.model_object)
+            logging.info(f"Saving model at path: {trained_model_file_path}")
+            save_object(file_path=trained_model_file_path,obj=insurance_model)
+
+            model_trainer_artifact=  ModelTrainerArtifact(is_trained=True,message="Model Trained successfully",
+            trained_model_file_path=trained_model_file_path,
+            train_rmse=metric_info.train_rmse,
+            test_rmse=metric_info.test_rmse,
+            train_accuracy=metric_info.train_accuracy,
+            test_accuracy=metric_info.test_accuracy,
+            model_accuracy=metric_info.model_accuracy,
+            search_strategy=model_factory.get_search_strategy(),
+            search_compute=model_factory.get_search_compute_summary()
+            )
+            logging.info(f"Model Trainer Artifact: {model_trainer_artifact}")
+            return model_trainer_artifact
         except Exception as e:
             raise InsuranceException(e, sys) from e
 
     def initiate_model_trainer(self)->ModelTrainerArtifact:
+        shared_array_store = None
         try:
             logging.info(f"{'>>' * 30}Model trainer log started.{'<<' * 30} ")
+            if self.streaming_config is not None and self.streaming_config.is_enabled:
+                return self.initiate_incremental_model_trainer()
             logging.info(f"Loading transformed training dataset")
             transformed_train_file_path = self.data_transformation_artifact.transformed_train_file_path
-            train_array = load_numpy_array_data(file_path=transformed_train_file_path)
+            train_array = attach_shared_array(file_path=transformed_train_file_path)
 
             logging.info(f"Loading transformed testing dataset")
             transformed_test_file_path = self.data_transformation_artifact.transformed_test_file_path
-            test_array = load_numpy_array_data(file_path=transformed_test_file_path)
+            test_array = attach_shared_array(file_path=transformed_test_file_path)
 
             logging.info(f"Splitting training and testing input and target feature")
-            x_train,y_train,x_test,y_test = train_array[:,:-1],train_array[:,-1],test_array[:,:-1],test_array[:,-1]
-            
+            # features and target are shared once per run as contiguous memory mapped arrays,
+            # search workers attach to them instead of receiving pickled copies
+            shared_array_store = SharedArrayStore()
+            x_train = shared_array_store.share("x_train", train_array[:,:-1])
+            y_train = shared_array_store.share("y_train", train_array[:,-1])
+            x_test = shared_array_store.share("x_test", test_array[:,:-1])
+            y_test = shared_array_store.share("y_test", test_array[:,-1])
+            del train_array, test_array
+
 
             logging.info(f"Extracting model config file path")
             model_config_file_path = self.model_trainer_config.model_config_file_path
 
             logging.info(f"Initializing model factory class using above model config file: {model_config_file_path}")
-            model_factory = ModelFactory(model_config_path=model_config_file_path)
+            model_factory = ModelFactory(model_config_path=model_config_file_path,
+                                         trial_cache_file_path=self.model_trainer_config.trial_cache_file_path)
             
             
             base_accuracy = self.model_trainer_config.base_accuracy
@@ -83,7 +188,8 @@ class ModelTrainer:
             
             model_list = [model.best_model for model in grid_searched_best_model_list ]
             logging.info(f"Evaluation all trained model on training and testing dataset both")
-            metric_info:MetricInfoArtifact = evaluate_regression_model(model_list=model_list,X_train=x_train,y_train=y_train,X_test=x_test,y_test=y_test,base_accuracy=base_accuracy)
+            metrics_table = get_metrics_table(model_list=model_list,X_train=x_train,y_train=y_train,X_test=x_test,y_test=y_test)
+            metric_info:MetricInfoArtifact = evaluate_regression_model(model_list=model_list,X_train=x_train,y_train=y_train,X_test=x_test,y_test=y_test,base_accuracy=base_accuracy,metrics_table=metrics_table)
 
             logging.info(f"Best found model on both training and testing dataset.{metric_info.model_object}")
             
@@ -103,14 +209,18 @@ class ModelTrainer:
             test_rmse=metric_info.test_rmse,
             train_accuracy=metric_info.train_accuracy,
             test_accuracy=metric_info.test_accuracy,
-            model_accuracy=metric_info.model_accuracy
-            
+            model_accuracy=metric_info.model_accuracy,
+            search_strategy=model_factory.get_search_strategy(),
+            search_compute=model_factory.get_search_compute_summary()
             )
 
             logging.info(f"Model Trainer Artifact: {model_trainer_artifact}")
             return model_trainer_artifact
         except Exception as e:
             raise InsuranceException(e, sys) from e
+        finally:
+            if shared_array_store is not None:
+                shared_array_store.cleanup()
 
     def __del__(self):
         logging.info(f"{'>>' * 30}Model trainer log completed.{'<<' * 30} ")
@@ -1,5 +1,5 @@
 from insurance.entity.config_entity import DatabaseConfig,DataIngestionConfig, DataTransformationConfig,DataValidationConfig,   \
-ModelTrainerConfig,ModelEvaluationConfig,ModelPusherConfig,TrainingPipelineConfig
+ModelTrainerConfig,ModelEvaluationConfig,ModelPusherConfig,TrainingPipelineConfig,StreamingConfig
 from insurance.util.util import read_yaml_file
 from insurance.logger import logging
 import sys,os
@@ -28,16 +28,26 @@ class Configuration:
             password = self.config_info[DATABASE_CONFIG_KEY][DB_PASSWORD_KEY]
             database_name = self.config_info[DATABASE_CONFIG_KEY][DB_NAME]
             table_name = self.config_info[DATABASE_CONFIG_KEY][TABLE_NAME]
-
-            db_connect = mysql_connect.connect(host=host, username=username, password=password)
-            logging.info(f"Database Server connection is working fine : host:{host}, username:{username}")
-            db_connect.close()
+            database_backend = self.config_info[DATABASE_CONFIG_KEY].get(DB_BACKEND_KEY, MYSQL_DATABASE_BACKEND)
+            batch_size = int(self.config_info[DATABASE_CONFIG_KEY].get(DB_BATCH_SIZE_KEY, DATABASE_DEFAULT_BATCH_SIZE))
+
+            database_file_path = None
+            if database_backend == SQLITE_DATABASE_BACKEND:
+                database_file_path = os.path.join(self.training_pipeline_config.artifact_dir, DATABASE_DIR_NAME,
+                                                  f"{database_name}{SQLITE_DATABASE_FILE_EXTENSION}")
+            else:
+                db_connect = mysql_connect.connect(host=host, username=username, password=password)
+                logging.info(f"Database Server connection is working fine : host:{host}, username:{username}")
+                db_connect.close()
 
             database_config=DatabaseConfig(database_host=host,
                                             database_username=username,
                                             database_password=password,
                                             database_name=database_name,
-                                            table_name=table_name
+                                            table_name=table_name,
+                                            database_backend=database_backend,
+                                            database_file_path=database_file_path,
+                                            batch_size=batch_size
                                             )
             logging.info(f"Database Config : {database_config}")
             return database_config
@@ -74,11 +84,19 @@ class Configuration:
                 data_ingestion_info[DATA_INGESTION_TEST_DIR_KEY]
             )
 
+            # shared by every run, the history grows with each incremental ingestion
+            history_dir = os.path.join(artifact_dir, INGESTION_HISTORY_DIR_NAME)
+
             data_ingestion_config=DataIngestionConfig(
                 dataset_download_url=dataset_download_url,  
                 raw_data_dir=raw_data_dir, 
                 ingested_train_dir=ingested_train_dir, 
                 ingested_test_dir=ingested_test_dir,
+                is_incremental=data_ingestion_info.get(DATA_INGESTION_INCREMENTAL_KEY, False),
+                watermark_column=data_ingestion_info.get(DATA_INGESTION_WATERMARK_COLUMN_KEY,
+                                                         DATA_INGESTION_DEFAULT_WATERMARK_COLUMN),
+                fetch_size=data_ingestion_info.get(DATA_INGESTION_FETCH_SIZE_KEY, DATA_INGESTION_DEFAULT_FETCH_SIZE),
+                history_dir=history_dir,
             )
             logging.info(f"Data Ingestion config: {data_ingestion_config}")
             return data_ingestion_config
@@ -186,10 +204,14 @@ class Configuration:
 
             base_accuracy = model_trainer_config_info[MODEL_TRAINER_BASE_ACCURACY_KEY]
 
+            # shared by all runs, cv results are reused across experiments
+            trial_cache_file_path = os.path.join(artifact_dir, TRIAL_CACHE_DIR_NAME, TRIAL_CACHE_FILE_NAME)
+
             model_trainer_config = ModelTrainerConfig(
                 trained_model_file_path=trained_model_file_path,
                 base_accuracy=base_accuracy,
-                model_config_file_path=model_config_file_path
+                model_config_file_path=model_config_file_path,
+                trial_cache_file_path=trial_cache_file_path
             )
             logging.info(f"Model trainer config: {model_trainer_config}")
             return model_trainer_config
@@ -220,14 +242,44 @@ class Configuration:
             model_pusher_config_info = self.config_info[MODEL_PUSHER_CONFIG_KEY]
             export_dir_path = os.path.join(ROOT_DIR, model_pusher_config_info[MODEL_PUSHER_MODEL_EXPORT_DIR_KEY],
                                            time_stamp)
+            manifest_file_path = os.path.join(ROOT_DIR, model_pusher_config_info[MODEL_PUSHER_MODEL_EXPORT_DIR_KEY],
+                                              model_pusher_config_info[MODEL_PUSHER_MANIFEST_FILE_NAME_KEY])
 
-            model_pusher_config = ModelPusherConfig(export_dir_path=export_dir_path)
+            model_pusher_config = ModelPusherConfig(export_dir_path=export_dir_path,
+                                                    manifest_file_path=manifest_file_path)
             logging.info(f"Model pusher config {model_pusher_config}")
             return model_pusher_config
 
         except Exception as e:
             raise InsuranceException(e,sys) from e
 
+    def get_streaming_config(self) -> StreamingConfig:
+        try:
+            streaming_config_info = self.config_info.get(STREAMING_CONFIG_KEY) or dict()
+            streaming_config = StreamingConfig(
+                is_enabled=bool(streaming_config_info.get(STREAMING_ENABLED_KEY, False)),
+                chunk_size=int(streaming_config_info.get(STREAMING_CHUNK_SIZE_KEY, STREAMING_DEFAULT_CHUNK_SIZE)),
+                sample_size=int(streaming_config_info.get(STREAMING_SAMPLE_SIZE_KEY, STREAMING_DEFAULT_SAMPLE_SIZE))
+            )
+            logging.info(f"Streaming config: {streaming_config}")
+            return streaming_config
+        except Exception as e:
+            raise InsuranceException(e,sys) from e
+
+    def get_stage_config_info(self, config_key: str) -> dict:
+        """
+        return: config section of a stage, including the streaming config when
+        streaming is enabled since it changes the stage output
+        """
+        try:
+            stage_config_info = self.config_info[config_key]
+            streaming_config_info = self.config_info.get(STREAMING_CONFIG_KEY) or dict()
+            if streaming_config_info.get(STREAMING_ENABLED_KEY, False):
+                stage_config_info = {**stage_config_info, STREAMING_CONFIG_KEY: streaming_config_info}
+            return stage_config_info
+        except Exception as e:
+            raise InsuranceException(e,sys) from e
+
     def get_training_pipeline_config(self) ->TrainingPipelineConfig:
         try:
             training_pipeline_config = self.config_info[TRAINING_PIPELINE_CONFIG_KEY]
@@ -236,7 +288,14 @@ class Configuration:
             training_pipeline_config[TRAINING_PIPELINE_ARTIFACT_DIR_KEY]
             )
 
-            training_pipeline_config = TrainingPipelineConfig(artifact_dir=artifact_dir)
+            stage_cache_dir = os.path.join(artifact_dir, STAGE_CACHE_DIR_NAME)
+            is_stage_cache_enabled = bool(training_pipeline_config.get(TRAINING_PIPELINE_STAGE_CACHE_KEY, False))
+            checkpoint_dir = os.path.join(artifact_dir, CHECKPOINT_DIR_NAME)
+
+            training_pipeline_config = TrainingPipelineConfig(artifact_dir=artifact_dir,
+                                                              stage_cache_dir=stage_cache_dir,
+                                                              is_stage_cache_enabled=is_stage_cache_enabled,
+                                                              checkpoint_dir=checkpoint_dir)
             logging.info(f"Training pipleine config: {training_pipeline_config}")
             return training_pipeline_config
         except Exception as e:
@@ -20,12 +20,35 @@ DB_USERNAME_KEY = "db_username"
 DB_PASSWORD_KEY = "db_password"
 DB_NAME = "db_name"
 TABLE_NAME = "table_name"
+DB_BACKEND_KEY = "db_backend"
+DB_BATCH_SIZE_KEY = "db_batch_size"
+MYSQL_DATABASE_BACKEND = "mysql"
+SQLITE_DATABASE_BACKEND = "sqlite"
+DATABASE_DEFAULT_BATCH_SIZE = 10000
+DATABASE_DIR_NAME = "database"
+SQLITE_DATABASE_FILE_EXTENSION = ".sqlite3"
 
 
 # Training pipeline related variable
 TRAINING_PIPELINE_CONFIG_KEY = "training_pipeline_config"
 TRAINING_PIPELINE_ARTIFACT_DIR_KEY = "artifact_dir"
 TRAINING_PIPELINE_NAME_KEY = "pipeline_name"
+TRAINING_PIPELINE_STAGE_CACHE_KEY = "stage_cache"
+STAGE_CACHE_DIR_NAME = "stage_cache"
+CHECKPOINT_DIR_NAME = "checkpoint"
+CHECKPOINT_COMPLETED_FILE_NAME = "completed"
+
+# Streaming related variables, datasets larger than memory are processed in chunks
+STREAMING_CONFIG_KEY = "streaming_config"
+STREAMING_ENABLED_KEY = "enabled"
+STREAMING_CHUNK_SIZE_KEY = "chunk_size"
+STREAMING_SAMPLE_SIZE_KEY = "sample_size"
+STREAMING_DEFAULT_CHUNK_SIZE = 100000
+STREAMING_DEFAULT_SAMPLE_SIZE = 100000
+
+# Stage cache related variables
+STAGE_CACHE_ARTIFACT_TYPE_KEY = "artifact_type"
+STAGE_CACHE_ARTIFACT_KEY = "artifact"
 
 # Data Ingestion related variable
 
@@ -36,6 +59,16 @@ DATA_INGESTION_RAW_DATA_DIR_KEY = "raw_data_dir"
 DATA_INGESTION_INGESTED_DIR_NAME_KEY = "ingested_dir"
 DATA_INGESTION_TRAIN_DIR_KEY = "ingested_train_dir"
 DATA_INGESTION_TEST_DIR_KEY = "ingested_test_dir"
+DATA_INGESTION_INCREMENTAL_KEY = "incremental_ingestion"
+DATA_INGESTION_WATERMARK_COLUMN_KEY = "watermark_column"
+DATA_INGESTION_FETCH_SIZE_KEY = "fetch_size"
+DATA_INGESTION_DEFAULT_WATERMARK_COLUMN = "id"
+DATA_INGESTION_DEFAULT_FETCH_SIZE = 10000
+INGESTION_HISTORY_DIR_NAME = "ingestion_history"
+INGESTION_WATERMARK_FILE_NAME = "watermark.yaml"
+INGESTION_PARTITION_DIR_NAME = "partitions"
+INGESTION_HISTORY_TRAIN_DIR_NAME = "train"
+INGESTION_HISTORY_TEST_DIR_NAME = "test"
 
 
 # Data Validation related variables
@@ -72,6 +105,8 @@ MODEL_TRAINER_TRAINED_MODEL_FILE_NAME_KEY = "model_file_name"
 MODEL_TRAINER_BASE_ACCURACY_KEY = "base_accuracy"
 MODEL_TRAINER_MODEL_CONFIG_DIR_KEY = "model_config_dir"
 MODEL_TRAINER_MODEL_CONFIG_FILE_NAME_KEY = "model_config_file_name"
+TRIAL_CACHE_DIR_NAME = "trial_cache"
+TRIAL_CACHE_FILE_NAME = "trials.yaml"
 
 
 # Model Evaluation related variables
@@ -79,14 +114,37 @@ MODEL_EVALUATION_CONFIG_KEY = "model_evaluation_config"
 MODEL_EVALUATION_FILE_NAME_KEY = "model_evaluation_file_name"
 MODEL_EVALUATION_ARTIFACT_DIR = "model_evaluation"
 
+# Model evaluation cache keys, predictions of the best model kept in model_evaluation.yaml
+MODEL_NAME_KEY = "model_name"
+EVALUATION_CACHE_KEY = "evaluation_cache"
+DATASET_HASH_KEY = "dataset_hash"
+METRICS_KEY = "metrics"
+TRAIN_PREDICTION_FILE_PATH_KEY = "train_prediction_file_path"
+TEST_PREDICTION_FILE_PATH_KEY = "test_prediction_file_path"
+MODEL_EVALUATION_PREDICTION_DIR = "predictions"
+
 
 # Model Pusher config key
 MODEL_PUSHER_CONFIG_KEY = "model_pusher_config"
 MODEL_PUSHER_MODEL_EXPORT_DIR_KEY = "model_export_dir"
+MODEL_PUSHER_MANIFEST_FILE_NAME_KEY = "manifest_file_name"
+
+# Model manifest keys, the manifest points at the model currently served
+MODEL_MANIFEST_FILE_NAME = "current.yaml"
+MODEL_MANIFEST_VERSION_KEY = "version"
+MODEL_MANIFEST_MODEL_PATH_KEY = "model_path"
+MODEL_MANIFEST_CHECKSUM_KEY = "checksum"
+MODEL_MANIFEST_SIZE_KEY = "size"
+MODEL_MANIFEST_PUSHED_AT_KEY = "pushed_at"
+MODEL_MANIFEST_COMPACT_MODEL_PATH_KEY = "compact_model_path"
+COMPACT_MODEL_DIR_NAME = "model_compact"
 
 BEST_MODEL_KEY = "best_model"
 HISTORY_KEY = "history"
 MODEL_PATH_KEY = "model_path"
 
+PIPELINE_DAG_ARTIFACT_DIR = "pipeline_dag"
+PIPELINE_DAG_REPORT_FILE_NAME = "dag_report.yaml"
+
 EXPERIMENT_DIR_NAME="experiment"
 EXPERIMENT_FILE_NAME="experiment.csv"
\ No newline at end of file
@@ -0,0 +1,107 @@
+from insurance.exception import InsuranceException
+from insurance.logger import logging
+from insurance.util.util import read_yaml_file, write_yaml_file_atomic
+
+import os
+import sys
+import shutil
+import hashlib
+import numpy as np
+
+ARRAY_CHUNK_FILE_NAME_FORMAT = "part-{:05d}.npy"
+ARRAY_CHUNKS_KEY = "chunks"
+ARRAY_CHUNK_FILE_NAME_KEY = "file_name"
+ARRAY_CHUNK_N_ROWS_KEY = "n_rows"
+ARRAY_CHUNK_CHECKSUM_KEY = "checksum"
+ARRAY_N_ROWS_KEY = "n_rows"
+ARRAY_N_COLUMNS_KEY = "n_columns"
+
+
+def get_array_chunk_dir(manifest_file_path: str) -> str:
+    """
+    return: directory holding the chunks of a manifest, <dir>/<name>.yaml keeps them in <dir>/<name>/
+    """
+    return os.path.splitext(manifest_file_path)[0]
+
+
+class ArrayChunkWriter:
+    """
+    Writes an array too large for memory as a sequence of .npy chunks.
+
+    Chunks are saved as they come in a directory next to a yaml manifest which
+    lists every chunk with its number of rows and a checksum of its content.
+    The manifest is written last by close, a manifest therefore only describes
+    complete chunks, and it changes whenever a chunk does, so its file checksum
+    identifies the whole array for the stage cache.
+    """
+
+    def __init__(self, manifest_file_path: str):
+        try:
+            self.manifest_file_path = manifest_file_path
+            self.chunk_dir = get_array_chunk_dir(manifest_file_path)
+            # chunks of an earlier run with the same path are never mixed in
+            shutil.rmtree(self.chunk_dir, ignore_errors=True)
+            os.makedirs(self.chunk_dir, exist_ok=True)
+            self.chunks = []
+            self.n_columns = None
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    def write(self, array: np.ndarray):
+        try:
+            array = np.ascontiguousarray(array)
+            if self.n_columns is None:
+                self.n_columns = int(array.shape[1])
+            elif array.shape[1] != self.n_columns:
+                raise Exception(f"Chunk has [{array.shape[1]}] columns, expected [{self.n_columns}].")
+            file_name = ARRAY_CHUNK_FILE_NAME_FORMAT.format(len(self.chunks))
+            np.save(os.path.join(self.chunk_dir, file_name), array)
+            self.chunks.append({
+                ARRAY_CHUNK_FILE_NAME_KEY: file_name,
+                ARRAY_CHUNK_N_ROWS_KEY: int(array.shape[0]),
+                ARRAY_CHUNK_CHECKSUM_KEY: hashlib.sha256(array.data).hexdigest(),
+            })
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    def close(self) -> str:
+        """
+        return: manifest file path
+        """
+        try:
+            manifest = {
+                ARRAY_N_ROWS_KEY: sum(chunk[ARRAY_CHUNK_N_ROWS_KEY] for chunk in self.chunks),
+                ARRAY_N_COLUMNS_KEY: self.n_columns,
+                ARRAY_CHUNKS_KEY: self.chunks,
+            }
+            write_yaml_file_atomic(file_path=self.manifest_file_path, data=manifest)
+            logging.info(f"[{len(self.chunks)}] chunks of [{manifest[ARRAY_N_ROWS_KEY]}] rows saved, "
+                         f"manifest: [{self.manifest_file_path}]")
+            return self.manifest_file_path
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+
+def get_array_chunk_file_paths(manifest_file_path: str) -> list:
+    try:
+        manifest = read_yaml_file(file_path=manifest_file_path)
+        chunk_dir = get_array_chunk_dir(manifest_file_path)
+        return [os.path.join(chunk_dir, chunk[ARRAY_CHUNK_FILE_NAME_KEY]) for chunk in manifest[ARRAY_CHUNKS_KEY]]
+    except Exception as e:
+        raise InsuranceException(e, sys) from e
+
+
+def iter_array_chunks(manifest_file_path: str, chunk_order: list = None):
+    """
+    Yields the chunks of a manifest as read only memory mapped arrays, one chunk
+    is paged in at a time.
+    chunk_order: optional chunk indexes to visit, in the manifest order otherwise
+    """
+    try:
+        chunk_file_paths = get_array_chunk_file_paths(manifest_file_path)
+        if chunk_order is None:
+            chunk_order = range(len(chunk_file_paths))
+        for chunk_index in chunk_order:
+            yield np.load(chunk_file_paths[chunk_index], mmap_mode="r")
+    except Exception as e:
+        raise InsuranceException(e, sys) from e
@@ -4,7 +4,10 @@ DatabaseArtifact = namedtuple("DatabaseArtifact",["database_host",
                                                     "database_username",
                                                     "database_password",
                                                     "database_name",
-                                                    "table_name"])
+                                                    "table_name",
+                                                    "database_backend",
+                                                    "loaded_rows",
+                                                    "rows_per_second"])
 
 DataIngestionArtifact = namedtuple("DataIngestionArtifact",[ "train_file_path", 
                                                             "test_file_path", 
@@ -26,7 +29,7 @@ DataTransformationArtifact = namedtuple("DataTransformationArtifact",["is_transf
 
 ModelTrainerArtifact = namedtuple("ModelTrainerArtifact", ["is_trained", "message", "trained_model_file_path",
                                                            "train_rmse", "test_rmse", "train_accuracy", "test_accuracy",
-                                                           "model_accuracy"])
+                                                           "model_accuracy", "search_strategy", "search_compute"])
 
 ModelEvaluationArtifact = namedtuple("ModelEvaluationArtifact", ["is_model_accepted", "evaluated_model_path"])
 
@@ -0,0 +1,241 @@
+from insurance.exception import InsuranceException
+from insurance.logger import logging
+from insurance.entity.compiled_preprocessor import CompiledPreprocessor
+from insurance.entity.flat_forest import FlatForest, FLAT_FOREST_STEP_ARRAY_NAMES
+from insurance.util.util import read_yaml_file, write_yaml_file, load_object
+
+import os
+import sys
+import shutil
+import numpy as np
+
+COMPACT_MODEL_FORMAT_VERSION = 1
+COMPACT_MODEL_MANIFEST_FILE_NAME = "manifest.yaml"
+
+FORMAT_VERSION_KEY = "format_version"
+ESTIMATOR_TYPE_KEY = "estimator_type"
+ESTIMATOR_NAME_KEY = "estimator_name"
+SKLEARN_VERSION_KEY = "sklearn_version"
+NUMERICAL_COLUMNS_KEY = "numerical_columns"
+CATEGORICAL_COLUMNS_KEY = "categorical_columns"
+CATEGORICAL_FILL_KEY = "categorical_fill"
+CATEGORIES_KEY = "categories"
+INTERCEPT_KEY = "intercept"
+N_TREES_KEY = "n_trees"
+MAX_DEPTH_KEY = "max_depth"
+ESTIMATOR_FILE_PATH_KEY = "estimator_file_path"
+
+LINEAR_ESTIMATOR_TYPE = "linear"
+FOREST_ESTIMATOR_TYPE = "forest"
+FOREST_ARRAY_NAMES = ["feature", "threshold", "children_left", "children_right", "value", "tree_roots"]
+
+
+def get_python_value(value):
+    # numpy scalars are not yaml serializable
+    return value.item() if hasattr(value, "item") else value
+
+
+class CompactInsuranceModel:
+    """
+    sklearn free counterpart of InsuranceEstimatorModel, built from the arrays
+    written by export_compact_model. Arrays are memory mapped so loading only
+    reads the small manifest, pages are faulted in on first use.
+
+    Forest batches too large for the flattened forest, see FlatForest.is_preferred,
+    are scored by the sklearn estimator of the dill file the model was exported
+    from, loaded on the first such batch.
+    """
+
+    def __init__(self, compiled_preprocessing_object: CompiledPreprocessor, estimator_type: str,
+                 estimator_name: str, estimator_arrays: dict, intercept: float = 0.0, max_depth: int = None,
+                 estimator_file_path: str = None):
+        """
+        estimator_arrays: coef of linear models, node and optionally step arrays of forests
+        estimator_file_path: dill file of the InsuranceEstimatorModel, None scores every batch of
+        a forest with the flattened forest
+        """
+        self.compiled_preprocessing_object = compiled_preprocessing_object
+        self.estimator_type = estimator_type
+        self.estimator_name = estimator_name
+        self.estimator_arrays = estimator_arrays
+        self.intercept = intercept
+        self.estimator_file_path = estimator_file_path
+        self.trained_model_object = None
+        self.flat_forest = None
+        if estimator_type == FOREST_ESTIMATOR_TYPE:
+            step_arrays = {array_name: estimator_arrays[array_name] for array_name in FLAT_FOREST_STEP_ARRAY_NAMES
+                           if array_name in estimator_arrays}
+            self.flat_forest = FlatForest(**{array_name: estimator_arrays[array_name]
+                                             for array_name in FOREST_ARRAY_NAMES},
+                                          step_arrays=step_arrays if len(step_arrays) > 0 else None,
+                                          max_depth=max_depth)
+
+    def transform(self, X) -> np.ndarray:
+        return self.compiled_preprocessing_object.transform(X)
+
+    def get_trained_model_object(self):
+        if self.trained_model_object is None:
+            logging.info(f"Loading the estimator of large batches from: [{self.estimator_file_path}]")
+            self.trained_model_object = load_object(file_path=self.estimator_file_path).trained_model_object
+        return self.trained_model_object
+
+    def predict_transformed(self, transformed_feature: np.ndarray) -> np.ndarray:
+        if self.estimator_type == LINEAR_ESTIMATOR_TYPE:
+            return transformed_feature @ self.estimator_arrays["coef"] + self.intercept
+        if self.flat_forest.is_preferred(len(transformed_feature)) or self.estimator_file_path is None:
+            return self.flat_forest.predict(transformed_feature)
+        return self.get_trained_model_object().predict(transformed_feature)
+
+    def predict(self, X) -> np.ndarray:
+        return self.predict_transformed(self.transform(X))
+
+    def __repr__(self):
+        return f"Compact{self.estimator_name}()"
+
+    def __str__(self):
+        return f"Compact{self.estimator_name}()"
+
+
+def get_estimator_arrays(trained_model_object):
+    """
+    return: estimator type, estimator arrays and intercept of a supported fitted estimator
+    """
+    if hasattr(trained_model_object, "coef_") and hasattr(trained_model_object, "intercept_"):
+        coef = np.asarray(trained_model_object.coef_, dtype=np.float64)
+        if coef.ndim != 1:
+            raise Exception("Only single output linear models can be exported.")
+        intercept = float(np.ravel(trained_model_object.intercept_)[0])
+        return LINEAR_ESTIMATOR_TYPE, {"coef": coef}, intercept
+
+    flat_forest = FlatForest.from_estimator(trained_model_object)
+    # step arrays are written too, loading maps them instead of building them again
+    return FOREST_ESTIMATOR_TYPE, {**flat_forest.get_arrays(), **flat_forest.get_step_arrays()}, 0.0
+
+
+def export_compact_model(insurance_model, export_dir: str, estimator_file_path: str = None) -> str:
+    """
+    Writes the fitted InsuranceEstimatorModel as a manifest plus raw numpy arrays.
+    insurance_model: InsuranceEstimatorModel with a compiled preprocessing object
+    export_dir: directory to create
+    estimator_file_path: dill file of insurance_model, large forest batches are scored by its estimator
+    return: export_dir
+    """
+    try:
+        compiled_preprocessing_object = getattr(insurance_model, "compiled_preprocessing_object", None)
+        if compiled_preprocessing_object is None:
+            raise Exception("Model has no compiled preprocessing object and can not be exported.")
+        trained_model_object = insurance_model.trained_model_object
+        estimator_type, estimator_arrays, intercept = get_estimator_arrays(trained_model_object)
+
+        if os.path.exists(export_dir):
+            shutil.rmtree(export_dir)
+        os.makedirs(export_dir, exist_ok=True)
+
+        arrays = {
+            "numerical_fill": compiled_preprocessing_object.numerical_fill,
+            "numerical_mean": compiled_preprocessing_object.numerical_mean,
+            "numerical_scale": compiled_preprocessing_object.numerical_scale,
+        }
+        for index, table in enumerate(compiled_preprocessing_object.categorical_tables):
+            arrays[f"categorical_table_{index}"] = table
+        arrays.update(estimator_arrays)
+        for array_name, array in arrays.items():
+            np.save(os.path.join(export_dir, f"{array_name}.npy"), np.ascontiguousarray(array))
+
+        try:
+            import sklearn
+            sklearn_version = sklearn.__version__
+        except ImportError:
+            sklearn_version = None
+
+        categories = [[get_python_value(category) for category, _ in sorted(lookup.items(), key=lambda item: item[1])]
+                      for lookup in compiled_preprocessing_object.categorical_lookups]
+        manifest = {
+            FORMAT_VERSION_KEY: COMPACT_MODEL_FORMAT_VERSION,
+            ESTIMATOR_TYPE_KEY: estimator_type,
+            ESTIMATOR_NAME_KEY: type(trained_model_object).__name__,
+            SKLEARN_VERSION_KEY: sklearn_version,
+            NUMERICAL_COLUMNS_KEY: list(compiled_preprocessing_object.numerical_columns),
+            CATEGORICAL_COLUMNS_KEY: list(compiled_preprocessing_object.categorical_columns),
+            CATEGORICAL_FILL_KEY: [get_python_value(value) for value in compiled_preprocessing_object.categorical_fill],
+            CATEGORIES_KEY: categories,
+            INTERCEPT_KEY: intercept,
+            N_TREES_KEY: int(len(estimator_arrays["tree_roots"])) if estimator_type == FOREST_ESTIMATOR_TYPE else 0,
+        }
+        if estimator_type == FOREST_ESTIMATOR_TYPE:
+            manifest[MAX_DEPTH_KEY] = FlatForest.get_max_depth(estimator_arrays["step_left"],
+                                                               estimator_arrays["step_right"],
+                                                               estimator_arrays["tree_roots"])
+        if estimator_file_path is not None:
+            # relative, the export directory can be moved together with the dill file
+            manifest[ESTIMATOR_FILE_PATH_KEY] = os.path.relpath(estimator_file_path, export_dir)
+        # manifest last: a directory without manifest is an incomplete export
+        write_yaml_file(file_path=os.path.join(export_dir, COMPACT_MODEL_MANIFEST_FILE_NAME), data=manifest)
+        logging.info(f"Compact model exported at: [{export_dir}]")
+        return export_dir
+    except Exception as e:
+        raise InsuranceException(e, sys) from e
+
+
+def is_compact_model_dir(model_path: str) -> bool:
+    return os.path.isfile(os.path.join(model_path, COMPACT_MODEL_MANIFEST_FILE_NAME))
+
+
+def load_compact_model(export_dir: str, mmap_mode: str = "r") -> CompactInsuranceModel:
+    """
+    export_dir: directory written by export_compact_model
+    mmap_mode: passed on to np.load, None reads the arrays into memory
+    """
+    try:
+        manifest = read_yaml_file(file_path=os.path.join(export_dir, COMPACT_MODEL_MANIFEST_FILE_NAME))
+        if manifest[FORMAT_VERSION_KEY] != COMPACT_MODEL_FORMAT_VERSION:
+            raise Exception(f"Unsupported compact model format version: [{manifest[FORMAT_VERSION_KEY]}]")
+
+        def load_array(array_name: str) -> np.ndarray:
+            return np.load(os.path.join(export_dir, f"{array_name}.npy"), mmap_mode=mmap_mode)
+
+        categorical_tables = [load_array(f"categorical_table_{index}")
+                              for index in range(len(manifest[CATEGORICAL_COLUMNS_KEY]))]
+        categorical_lookups = [{category: index for index, category in enumerate(categories)}
+                               for categories in manifest[CATEGORIES_KEY]]
+        compiled_preprocessing_object = CompiledPreprocessor(
+            numerical_columns=manifest[NUMERICAL_COLUMNS_KEY],
+            numerical_fill=load_array("numerical_fill"),
+            numerical_mean=load_array("numerical_mean"),
+            numerical_scale=load_array("numerical_scale"),
+            categorical_columns=manifest[CATEGORICAL_COLUMNS_KEY],
+            categorical_fill=manifest[CATEGORICAL_FILL_KEY],
+            categorical_lookups=categorical_lookups,
+            categorical_tables=categorical_tables)
+
+        if manifest[ESTIMATOR_TYPE_KEY] == LINEAR_ESTIMATOR_TYPE:
+            estimator_arrays = {"coef": load_array("coef")}
+        else:
+            # exports without max_depth predate the step arrays, FlatForest builds them
+            array_names = FOREST_ARRAY_NAMES + (FLAT_FOREST_STEP_ARRAY_NAMES if MAX_DEPTH_KEY in manifest else [])
+            estimator_arrays = {array_name: load_array(array_name) for array_name in array_names}
+        estimator_file_path = None
+        if manifest.get(ESTIMATOR_FILE_PATH_KEY) is not None:
+            estimator_file_path = os.path.normpath(os.path.join(export_dir, manifest[ESTIMATOR_FILE_PATH_KEY]))
+        return CompactInsuranceModel(compiled_preprocessing_object=compiled_preprocessing_object,
+                                     estimator_type=manifest[ESTIMATOR_TYPE_KEY],
+                                     estimator_name=manifest[ESTIMATOR_NAME_KEY],
+                                     estimator_arrays=estimator_arrays,
+                                     intercept=manifest[INTERCEPT_KEY],
+                                     max_depth=manifest.get(MAX_DEPTH_KEY),
+                                     estimator_file_path=estimator_file_path)
+    except Exception as e:
+        raise InsuranceException(e, sys) from e
+
+
+def is_compact_model_equivalent(insurance_model, compact_model: CompactInsuranceModel,
+                                rtol: float = 1e-7, atol: float = 1e-6) -> bool:
+    """
+    Compares predictions of the original and the compact model on the probe
+    dataframe of the compiled preprocessor.
+    """
+    try:
+        probe_df = insurance_model.compiled_preprocessing_object.get_probe_data_frame()
+        return np.allclose(insurance_model.predict(probe_df), compact_model.predict(probe_df), rtol=rtol, atol=atol)
+    except Exception as e:
+        raise InsuranceException(e, sys) from e
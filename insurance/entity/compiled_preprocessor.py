@@ -0,0 +1,238 @@
+from insurance.exception import InsuranceException
+from insurance.logger import logging
+
+import sys
+import numpy as np
+import pandas as pd
+
+from sklearn.compose import ColumnTransformer
+from sklearn.pipeline import Pipeline
+from sklearn.impute import SimpleImputer
+from sklearn.preprocessing import StandardScaler, OneHotEncoder
+
+UNKNOWN_CATEGORY_PROBE_VALUE = "__unknown_category__"
+
+
+class CompiledPreprocessor:
+    """
+    Flat numpy evaluator for the ColumnTransformer built in
+    DataTransformation.get_data_transformer_object.
+
+    numerical columns: missing values are replaced by the imputer statistic and
+    the column is standardized with the precomputed mean and scale.
+    categorical columns: every domain value maps straight to its scaled one hot
+    block through a lookup table. Unknown values map to a block of zeros the same
+    way OneHotEncoder(handle_unknown='ignore') does.
+    """
+
+    def __init__(self, numerical_columns: list, numerical_fill: np.ndarray, numerical_mean: np.ndarray,
+                 numerical_scale: np.ndarray, categorical_columns: list, categorical_fill: list,
+                 categorical_lookups: list, categorical_tables: list):
+        self.numerical_columns = list(numerical_columns)
+        self.numerical_fill = numerical_fill
+        self.numerical_mean = numerical_mean
+        self.numerical_scale = numerical_scale
+        self.categorical_columns = list(categorical_columns)
+        self.categorical_fill = list(categorical_fill)
+        self.categorical_lookups = categorical_lookups
+        self.categorical_tables = categorical_tables
+        self.n_features = len(self.numerical_columns) + sum(table.shape[1] for table in categorical_tables)
+
+    @staticmethod
+    def get_column_values(X, column: str) -> list:
+        values = X[column]
+        if hasattr(values, "tolist"):
+            return values.tolist()
+        return list(values)
+
+    @staticmethod
+    def is_missing(value) -> bool:
+        return value is None or value is pd.NA or (isinstance(value, float) and value != value)
+
+    def transform(self, X) -> np.ndarray:
+        """
+        X: pandas dataframe or dict of column name -> list of values
+        return: dense transformed feature array, same layout as the fitted ColumnTransformer
+        """
+        try:
+            n_rows = len(X[self.numerical_columns[0]] if len(self.numerical_columns) > 0
+                         else X[self.categorical_columns[0]])
+            transformed_feature = np.empty((n_rows, self.n_features), dtype=np.float64)
+
+            n_numerical = len(self.numerical_columns)
+            if n_numerical > 0:
+                # column by column access avoids pandas' block consolidation for small frames
+                numerical_feature = np.array([np.asarray(X[column], dtype=np.float64)
+                                              for column in self.numerical_columns]).T
+                missing_mask = np.isnan(numerical_feature)
+                if missing_mask.any():
+                    numerical_feature = np.where(missing_mask, self.numerical_fill, numerical_feature)
+                np.subtract(numerical_feature, self.numerical_mean, out=transformed_feature[:, :n_numerical])
+                np.divide(transformed_feature[:, :n_numerical], self.numerical_scale,
+                          out=transformed_feature[:, :n_numerical])
+
+            start = n_numerical
+            for column, fill_value, lookup, table in zip(self.categorical_columns, self.categorical_fill,
+                                                         self.categorical_lookups, self.categorical_tables):
+                unknown_index = table.shape[0] - 1
+                fill_index = lookup.get(fill_value, unknown_index)
+                indexes = [fill_index if CompiledPreprocessor.is_missing(value) else lookup.get(value, unknown_index)
+                           for value in CompiledPreprocessor.get_column_values(X, column)]
+                end = start + table.shape[1]
+                transformed_feature[:, start:end] = table[indexes]
+                start = end
+            return transformed_feature
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    @staticmethod
+    def compile_numerical_pipeline(pipeline: Pipeline, n_columns: int):
+        fill = np.full(n_columns, np.nan)
+        mean = np.zeros(n_columns)
+        scale = np.ones(n_columns)
+        for _, step in pipeline.steps:
+            if isinstance(step, SimpleImputer) and np.isnan(step.missing_values) \
+                    and not getattr(step, "add_indicator", False):
+                fill = np.asarray(step.statistics_, dtype=np.float64)
+            elif isinstance(step, StandardScaler):
+                mean = np.asarray(step.mean_, dtype=np.float64) if step.mean_ is not None and step.with_mean \
+                    else np.zeros(n_columns)
+                scale = np.asarray(step.scale_, dtype=np.float64) if step.scale_ is not None else np.ones(n_columns)
+            else:
+                raise Exception(f"Step [{step}] of numerical pipeline can not be compiled.")
+        return fill, mean, scale
+
+    @staticmethod
+    def compile_categorical_pipeline(pipeline: Pipeline, columns: list):
+        fill = [None] * len(columns)
+        encoder = None
+        scale = None
+        for _, step in pipeline.steps:
+            if isinstance(step, SimpleImputer) and encoder is None and not getattr(step, "add_indicator", False):
+                fill = list(step.statistics_)
+            elif isinstance(step, OneHotEncoder) and encoder is None:
+                if step.drop is not None or step.handle_unknown != "ignore":
+                    raise Exception(f"Only OneHotEncoder(handle_unknown='ignore') without drop can be compiled.")
+                if getattr(step, "max_categories", None) is not None or getattr(step, "min_frequency", None) is not None:
+                    raise Exception(f"OneHotEncoder with infrequent categories can not be compiled.")
+                encoder = step
+            elif isinstance(step, StandardScaler) and encoder is not None and not step.with_mean:
+                scale = np.asarray(step.scale_, dtype=np.float64) if step.scale_ is not None else None
+            else:
+                raise Exception(f"Step [{step}] of categorical pipeline can not be compiled.")
+        if encoder is None:
+            raise Exception("Categorical pipeline without OneHotEncoder can not be compiled.")
+
+        lookups = []
+        tables = []
+        start = 0
+        for categories in encoder.categories_:
+            n_categories = len(categories)
+            block_scale = np.ones(n_categories) if scale is None else scale[start:start + n_categories]
+            # one extra row of zeros for values unseen during fit
+            table = np.zeros((n_categories + 1, n_categories), dtype=np.float64)
+            table[np.arange(n_categories), np.arange(n_categories)] = 1.0 / block_scale
+            lookups.append({category: index for index, category in enumerate(categories.tolist())})
+            tables.append(table)
+            start += n_categories
+        return fill, lookups, tables
+
+    @staticmethod
+    def compile(preprocessing_object: ColumnTransformer) -> "CompiledPreprocessor":
+        """
+        Compiles a fitted ColumnTransformer made of one numerical and one categorical pipeline.
+        Raises an exception if the transformer has any other structure.
+        """
+        try:
+            if not isinstance(preprocessing_object, ColumnTransformer):
+                raise Exception(f"Expected fitted ColumnTransformer, got: [{type(preprocessing_object).__name__}]")
+
+            numerical_columns, categorical_columns = [], []
+            numerical_fill, numerical_mean, numerical_scale = np.empty(0), np.empty(0), np.empty(0)
+            categorical_fill, categorical_lookups, categorical_tables = [], [], []
+
+            for name, transformer, columns in preprocessing_object.transformers_:
+                if name == "remainder":
+                    if transformer != "drop" and len(columns) > 0:
+                        raise Exception("ColumnTransformer with passthrough remainder can not be compiled.")
+                    continue
+                if not isinstance(transformer, Pipeline):
+                    raise Exception(f"Transformer [{name}] is not a sklearn Pipeline.")
+                if len(numerical_columns) == 0 and len(categorical_columns) == 0 and \
+                        not any(isinstance(step, OneHotEncoder) for _, step in transformer.steps):
+                    numerical_columns = list(columns)
+                    numerical_fill, numerical_mean, numerical_scale = \
+                        CompiledPreprocessor.compile_numerical_pipeline(transformer, len(columns))
+                elif len(categorical_columns) == 0:
+                    categorical_columns = list(columns)
+                    categorical_fill, categorical_lookups, categorical_tables = \
+                        CompiledPreprocessor.compile_categorical_pipeline(transformer, columns)
+                else:
+                    raise Exception(f"Unexpected transformer [{name}] in ColumnTransformer.")
+
+            return CompiledPreprocessor(numerical_columns=numerical_columns,
+                                        numerical_fill=numerical_fill,
+                                        numerical_mean=numerical_mean,
+                                        numerical_scale=numerical_scale,
+                                        categorical_columns=categorical_columns,
+                                        categorical_fill=categorical_fill,
+                                        categorical_lookups=categorical_lookups,
+                                        categorical_tables=categorical_tables)
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    def get_probe_data_frame(self) -> pd.DataFrame:
+        """
+        Builds a dataframe that touches every lookup entry, unknown and missing
+        categories and missing numerical values.
+        """
+        categorical_values = [list(lookup.keys()) + [UNKNOWN_CATEGORY_PROBE_VALUE, None]
+                              for lookup in self.categorical_lookups]
+        n_rows = max([len(values) for values in categorical_values] + [3])
+        probe_data = {}
+        for index, column in enumerate(self.numerical_columns):
+            fill_value = self.numerical_fill[index]
+            base_value = 0.0 if np.isnan(fill_value) else fill_value
+            probe_data[column] = [np.nan if row % 3 == 2 else base_value + row for row in range(n_rows)]
+        for column, values in zip(self.categorical_columns, categorical_values):
+            probe_data[column] = [values[row % len(values)] for row in range(n_rows)]
+        return pd.DataFrame(probe_data)
+
+    def is_equivalent(self, preprocessing_object: ColumnTransformer, X: pd.DataFrame = None,
+                      rtol: float = 1e-7, atol: float = 1e-9) -> bool:
+        """
+        Checks the compiled output against sklearn's output.
+        X: optional dataframe to compare on, a probe dataframe is used when not given
+        """
+        try:
+            X = self.get_probe_data_frame() if X is None else X
+            expected_feature = preprocessing_object.transform(X)
+            if hasattr(expected_feature, "toarray"):
+                expected_feature = expected_feature.toarray()
+            compiled_feature = self.transform(X)
+            return expected_feature.shape == compiled_feature.shape and \
+                np.allclose(expected_feature, compiled_feature, rtol=rtol, atol=atol)
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+
+def compile_preprocessing_object(preprocessing_object) -> CompiledPreprocessor:
+    """
+    Returns CompiledPreprocessor for the given fitted preprocessing object or None
+    if it can not be compiled or its output does not match sklearn's output.
+    A CompiledPreprocessor, as fitted over chunks in streaming mode, is returned as is,
+    its statistics were checked against sklearn when fitted, see
+    IncrementalPreprocessingStatistics.is_equivalent.
+    """
+    if isinstance(preprocessing_object, CompiledPreprocessor):
+        return preprocessing_object
+    try:
+        compiled_preprocessor = CompiledPreprocessor.compile(preprocessing_object)
+        if not compiled_preprocessor.is_equivalent(preprocessing_object):
+            logging.info("Compiled preprocessor output does not match sklearn output, it will not be used.")
+            return None
+        logging.info("Preprocessing object compiled successfully.")
+        return compiled_preprocessor
+    except Exception as e:
+        logging.info(f"Preprocessing object can not be compiled: {e}")
+        return None
@@ -4,12 +4,19 @@ DatabaseConfig = namedtuple("DatabaseConfig",["database_host",
                                                 "database_username",
                                                 "database_password",
                                                 "database_name",
-                                                "table_name"])
+                                                "table_name",
+                                                "database_backend",
+                                                "database_file_path",
+                                                "batch_size"])
 
 DataIngestionConfig=namedtuple("DataIngestionConfig",["dataset_download_url",
                                                         "raw_data_dir",
                                                         "ingested_train_dir",
-                                                        "ingested_test_dir"])
+                                                        "ingested_test_dir",
+                                                        "is_incremental",
+                                                        "watermark_column",
+                                                        "fetch_size",
+                                                        "history_dir"])
 
 
 DataValidationConfig = namedtuple("DataValidationConfig", ["schema_file_path","report_file_path","report_page_file_path"])
@@ -19,11 +26,15 @@ DataTransformationConfig = namedtuple("DataTransformationConfig", ["transformed_
                                                                    "preprocessed_object_file_path"])
 
 
-ModelTrainerConfig = namedtuple("ModelTrainerConfig", ["trained_model_file_path","base_accuracy","model_config_file_path"])
+ModelTrainerConfig = namedtuple("ModelTrainerConfig", ["trained_model_file_path","base_accuracy","model_config_file_path",
+                                                       "trial_cache_file_path"])
 
 ModelEvaluationConfig = namedtuple("ModelEvaluationConfig", ["model_evaluation_file_path","time_stamp"])
 
 
-ModelPusherConfig = namedtuple("ModelPusherConfig", ["export_dir_path"])
+ModelPusherConfig = namedtuple("ModelPusherConfig", ["export_dir_path", "manifest_file_path"])
 
-TrainingPipelineConfig = namedtuple("TrainingPipelineConfig", ["artifact_dir"])
\ No newline at end of file
+TrainingPipelineConfig = namedtuple("TrainingPipelineConfig", ["artifact_dir", "stage_cache_dir", "is_stage_cache_enabled",
+                                                               "checkpoint_dir"])
+
+StreamingConfig = namedtuple("StreamingConfig", ["is_enabled", "chunk_size", "sample_size"])
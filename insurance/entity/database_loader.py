@@ -0,0 +1,277 @@
+from insurance.exception import InsuranceException
+from insurance.logger import logging
+from insurance.entity.config_entity import DatabaseConfig
+from insurance.util.util import get_file_checksum, read_csv_chunks
+from insurance.constant import MYSQL_DATABASE_BACKEND, SQLITE_DATABASE_BACKEND, DATABASE_DEFAULT_BATCH_SIZE
+
+import io
+import os
+import sys
+import time
+import sqlite3
+import hashlib
+import itertools
+from collections import namedtuple
+from datetime import datetime
+
+import pandas as pd
+
+INSURANCE_TABLE_COLUMNS = ["age", "sex", "bmi", "children", "smoker", "region", "expenses"]
+LOAD_LOG_TABLE_SUFFIX = "_load_log"
+LOAD_OFFSET_TABLE_SUFFIX = "_load_offset"
+APPEND_LOAD_CHUNK_SIZE = 100000
+
+DatabaseLoadReport = namedtuple("DatabaseLoadReport", ["file_path", "file_checksum", "is_skipped", "loaded_rows",
+                                                       "load_seconds", "rows_per_second"])
+
+
+def get_database_connection(database_config: DatabaseConfig, use_database: bool = True):
+    """
+    Opens a DB-API connection for the configured backend.
+    use_database: switch a MySQL connection to database_name, the database has to exist
+    """
+    try:
+        if database_config.database_backend == SQLITE_DATABASE_BACKEND:
+            os.makedirs(os.path.dirname(database_config.database_file_path), exist_ok=True)
+            return sqlite3.connect(database_config.database_file_path)
+        if database_config.database_backend == MYSQL_DATABASE_BACKEND:
+            import mysql.connector as mysql_connect
+            db_connect = mysql_connect.connect(host=database_config.database_host,
+                                               username=database_config.database_username,
+                                               password=database_config.database_password)
+            if use_database:
+                db_connect.database = database_config.database_name
+            return db_connect
+        raise Exception(f"Unsupported database backend: [{database_config.database_backend}]")
+    except Exception as e:
+        raise InsuranceException(e, sys) from e
+
+
+class DatabaseBulkLoader:
+    """
+    Loads the raw insurance csv into the database table in parameterized batches.
+
+    Rows are read chunk by chunk and written with executemany in batches of
+    batch_size inside one transaction per file, so a failed load leaves nothing
+    behind. MySQL Connector turns executemany of an INSERT into multi row
+    INSERT statements, its native bulk path, sqlite3 reuses one prepared statement.
+    Every loaded file is recorded by checksum in a load log table and is
+    skipped when it is loaded again, the table is not filled twice by reruns.
+    Files which only grow between runs are loaded with append_file instead,
+    which records how far each file was loaded and inserts only the rows past it.
+    """
+
+    def __init__(self, database_config: DatabaseConfig):
+        try:
+            self.database_config = database_config
+            self.table_name = database_config.table_name
+            self.load_log_table_name = f"{database_config.table_name}{LOAD_LOG_TABLE_SUFFIX}"
+            self.load_offset_table_name = f"{database_config.table_name}{LOAD_OFFSET_TABLE_SUFFIX}"
+            self.batch_size = database_config.batch_size or DATABASE_DEFAULT_BATCH_SIZE
+            self.placeholder = "?" if database_config.database_backend == SQLITE_DATABASE_BACKEND else "%s"
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    def get_create_table_queries(self) -> list:
+        if self.database_config.database_backend == SQLITE_DATABASE_BACKEND:
+            return [
+                f"""CREATE TABLE IF NOT EXISTS {self.table_name}(id INTEGER PRIMARY KEY AUTOINCREMENT, age INTEGER,
+                    sex TEXT, bmi REAL, children INTEGER, smoker TEXT, region TEXT, expenses REAL)""",
+                f"""CREATE TABLE IF NOT EXISTS {self.load_log_table_name}(file_checksum TEXT PRIMARY KEY,
+                    file_name TEXT, loaded_rows INTEGER, loaded_at TEXT)""",
+                f"""CREATE TABLE IF NOT EXISTS {self.load_offset_table_name}(load_key TEXT PRIMARY KEY,
+                    source TEXT, file_name TEXT, loaded_bytes INTEGER, prefix_checksum TEXT, loaded_rows INTEGER,
+                    loaded_at TEXT)""",
+            ]
+        return [
+            f"""CREATE TABLE IF NOT EXISTS {self.table_name}(id INT AUTO_INCREMENT PRIMARY KEY, age INT(10),
+                sex VARCHAR(10), bmi FLOAT(10,3), children INT(5), smoker VARCHAR(10), region VARCHAR(40),
+                expenses FLOAT(20,3))""",
+            f"""CREATE TABLE IF NOT EXISTS {self.load_log_table_name}(file_checksum CHAR(64) PRIMARY KEY,
+                file_name VARCHAR(255), loaded_rows INT, loaded_at VARCHAR(32))""",
+            f"""CREATE TABLE IF NOT EXISTS {self.load_offset_table_name}(load_key CHAR(64) PRIMARY KEY,
+                source TEXT, file_name VARCHAR(255), loaded_bytes BIGINT, prefix_checksum CHAR(64),
+                loaded_rows BIGINT, loaded_at VARCHAR(32))""",
+        ]
+
+    def create_tables(self):
+        try:
+            if self.database_config.database_backend == MYSQL_DATABASE_BACKEND:
+                db_connect = get_database_connection(self.database_config, use_database=False)
+                db_cursor = db_connect.cursor()
+                db_cursor.execute(f"CREATE DATABASE IF NOT EXISTS {self.database_config.database_name}")
+                db_connect.close()
+            db_connect = get_database_connection(self.database_config)
+            try:
+                db_cursor = db_connect.cursor()
+                for query in self.get_create_table_queries():
+                    db_cursor.execute(query)
+                db_connect.commit()
+            finally:
+                db_connect.close()
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    def is_file_loaded(self, db_cursor, file_checksum: str) -> bool:
+        db_cursor.execute(f"SELECT loaded_rows FROM {self.load_log_table_name} WHERE file_checksum = "
+                          f"{self.placeholder}", (file_checksum,))
+        return db_cursor.fetchone() is not None
+
+    @staticmethod
+    def get_rows(dataframe) -> list:
+        """
+        return: rows of the insurance columns as python values, missing values as None
+        """
+        dataframe = dataframe[INSURANCE_TABLE_COLUMNS].astype(object)
+        dataframe = dataframe.where(dataframe.notna(), None)
+        return list(dataframe.itertuples(index=False, name=None))
+
+    def load_file(self, file_path: str, chunk_size: int = None) -> DatabaseLoadReport:
+        """
+        file_path: csv file with the insurance columns
+        chunk_size: rows read from the file at a time, the whole file when None
+        """
+        try:
+            file_checksum = get_file_checksum(file_path)
+            insert_query = f"INSERT INTO {self.table_name}({','.join(INSURANCE_TABLE_COLUMNS)}) " \
+                           f"VALUES({','.join([self.placeholder] * len(INSURANCE_TABLE_COLUMNS))})"
+            db_connect = get_database_connection(self.database_config)
+            try:
+                db_cursor = db_connect.cursor()
+                if self.is_file_loaded(db_cursor, file_checksum):
+                    logging.info(f"File [{file_path}] was already loaded into [{self.table_name}], skipping it.")
+                    return DatabaseLoadReport(file_path=file_path, file_checksum=file_checksum, is_skipped=True,
+                                              loaded_rows=0, load_seconds=0.0, rows_per_second=0.0)
+
+                start = time.perf_counter()
+                loaded_rows = 0
+                for dataframe in read_csv_chunks(file_path=file_path, chunk_size=chunk_size):
+                    rows = DatabaseBulkLoader.get_rows(dataframe)
+                    for batch_start in range(0, len(rows), self.batch_size):
+                        db_cursor.executemany(insert_query, rows[batch_start:batch_start + self.batch_size])
+                    loaded_rows += len(rows)
+                db_cursor.execute(f"INSERT INTO {self.load_log_table_name}(file_checksum, file_name, loaded_rows, "
+                                  f"loaded_at) VALUES({','.join([self.placeholder] * 4)})",
+                                  (file_checksum, os.path.basename(file_path), loaded_rows,
+                                   datetime.now().isoformat(timespec="seconds")))
+                db_connect.commit()
+                load_seconds = time.perf_counter() - start
+            except Exception:
+                db_connect.rollback()
+                raise
+            finally:
+                db_connect.close()
+
+            rows_per_second = loaded_rows / load_seconds if load_seconds > 0 else 0.0
+            logging.info(f"Loaded [{loaded_rows}] rows into [{self.table_name}] in [{load_seconds:.3f}] seconds, "
+                         f"[{rows_per_second:.0f}] rows per second, batch size [{self.batch_size}].")
+            return DatabaseLoadReport(file_path=file_path, file_checksum=file_checksum, is_skipped=False,
+                                      loaded_rows=loaded_rows, load_seconds=load_seconds,
+                                      rows_per_second=rows_per_second)
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    @staticmethod
+    def get_load_key(file_path: str, source: str = None) -> str:
+        """
+        return: key of the load offset of file_path, files of the same name from different sources
+        have their own offsets
+        """
+        return hashlib.sha256(f"{source or ''}\n{os.path.basename(file_path)}".encode()).hexdigest()
+
+    def get_load_offset(self, db_cursor, file_path: str, source: str = None) -> tuple:
+        """
+        return: bytes of file_path already loaded, their running sha256 and the rows
+        loaded from them. A file loaded whole by load_file counts as loaded to its end.
+        """
+        db_cursor.execute(f"SELECT loaded_bytes, prefix_checksum, loaded_rows FROM {self.load_offset_table_name} "
+                          f"WHERE load_key = {self.placeholder}", (DatabaseBulkLoader.get_load_key(file_path, source),))
+        load_offset = db_cursor.fetchone()
+        loaded_bytes, prefix_checksum, loaded_rows = load_offset if load_offset is not None else (0, None, 0)
+        prefix_hash = hashlib.sha256()
+        with open(file_path, "rb") as insurance_file:
+            for block in iter(lambda: insurance_file.read(min(1 << 20, loaded_bytes - insurance_file.tell())), b""):
+                prefix_hash.update(block)
+        if load_offset is not None:
+            if prefix_hash.hexdigest() != prefix_checksum:
+                raise Exception(f"File [{file_path}] was rewritten after [{loaded_bytes}] bytes of it were loaded "
+                                f"into [{self.table_name}], only appended rows can be loaded incrementally.")
+        elif self.is_file_loaded(db_cursor, get_file_checksum(file_path)):
+            with open(file_path, "rb") as insurance_file:
+                for block in iter(lambda: insurance_file.read(1 << 20), b""):
+                    prefix_hash.update(block)
+            loaded_bytes = os.path.getsize(file_path)
+        return loaded_bytes, prefix_hash, loaded_rows
+
+    def append_file(self, file_path: str, chunk_size: int = None, source: str = None) -> DatabaseLoadReport:
+        """
+        Loads only the rows appended to file_path since the previous append_file of
+        a file of the same name and source. The loaded prefix is verified by checksum,
+        a file rewritten rather than appended to is refused.
+        file_path: csv file with the insurance columns
+        chunk_size: rows inserted from the file at a time
+        source: where file_path comes from, e.g. its download url
+        """
+        try:
+            chunk_size = chunk_size or APPEND_LOAD_CHUNK_SIZE
+            insert_query = f"INSERT INTO {self.table_name}({','.join(INSURANCE_TABLE_COLUMNS)}) " \
+                           f"VALUES({','.join([self.placeholder] * len(INSURANCE_TABLE_COLUMNS))})"
+            db_connect = get_database_connection(self.database_config)
+            try:
+                db_cursor = db_connect.cursor()
+                loaded_bytes, prefix_hash, total_rows = self.get_load_offset(db_cursor, file_path, source)
+                file_size = os.path.getsize(file_path)
+                start = time.perf_counter()
+                loaded_rows = 0
+                with open(file_path, "rb") as insurance_file:
+                    header = insurance_file.readline()
+                    if loaded_bytes == 0 and not header.endswith(b"\n"):
+                        # the header itself is still being written
+                        file_size = 0
+                    elif loaded_bytes == 0:
+                        prefix_hash.update(header)
+                        loaded_bytes = len(header)
+                    insurance_file.seek(loaded_bytes)
+                    # rows written after file_size was taken, and a last row without its newline
+                    # which may still be being written, are left for the next run
+                    while loaded_bytes < file_size:
+                        lines = []
+                        for line in itertools.islice(insurance_file, chunk_size):
+                            if loaded_bytes + len(line) > file_size or not line.endswith(b"\n"):
+                                file_size = loaded_bytes
+                                break
+                            prefix_hash.update(line)
+                            loaded_bytes += len(line)
+                            lines.append(line)
+                        if len(lines) == 0:
+                            break
+                        rows = DatabaseBulkLoader.get_rows(pd.read_csv(io.BytesIO(header + b"".join(lines))))
+                        for batch_start in range(0, len(rows), self.batch_size):
+                            db_cursor.executemany(insert_query, rows[batch_start:batch_start + self.batch_size])
+                        loaded_rows += len(rows)
+
+                load_key = DatabaseBulkLoader.get_load_key(file_path, source)
+                db_cursor.execute(f"DELETE FROM {self.load_offset_table_name} WHERE load_key = {self.placeholder}",
+                                  (load_key,))
+                db_cursor.execute(f"INSERT INTO {self.load_offset_table_name}(load_key, source, file_name, "
+                                  f"loaded_bytes, prefix_checksum, loaded_rows, loaded_at) "
+                                  f"VALUES({','.join([self.placeholder] * 7)})",
+                                  (load_key, source, os.path.basename(file_path), loaded_bytes,
+                                   prefix_hash.hexdigest(),
+                                   total_rows + loaded_rows, datetime.now().isoformat(timespec="seconds")))
+                db_connect.commit()
+                load_seconds = time.perf_counter() - start
+            except Exception:
+                db_connect.rollback()
+                raise
+            finally:
+                db_connect.close()
+
+            rows_per_second = loaded_rows / load_seconds if load_seconds > 0 else 0.0
+            logging.info(f"Appended [{loaded_rows}] new rows of [{file_path}] to [{self.table_name}] in "
+                         f"[{load_seconds:.3f}] seconds, [{loaded_bytes}] bytes of the file are loaded.")
+            return DatabaseLoadReport(file_path=file_path, file_checksum=prefix_hash.hexdigest(),
+                                      is_skipped=loaded_rows == 0, loaded_rows=loaded_rows,
+                                      load_seconds=load_seconds, rows_per_second=rows_per_second)
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
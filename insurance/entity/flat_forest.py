@@ -0,0 +1,225 @@
+from insurance.exception import InsuranceException
+from insurance.logger import logging
+
+import sys
+import numpy as np
+
+TREE_LEAF = -1
+FOREST_ESTIMATOR_NAMES = ["DecisionTreeRegressor", "ExtraTreeRegressor", "RandomForestRegressor",
+                          "ExtraTreesRegressor"]
+FLAT_FOREST_MAX_PAIRS = 1 << 20
+# above this many (row, tree) pairs sklearn's compiled traversal is faster than numpy level stepping
+FLAT_FOREST_MAX_BATCH_PAIRS = 32768
+FLAT_FOREST_PROBE_ROWS = 512
+FLAT_FOREST_STEP_ARRAY_NAMES = ["step_feature", "step_left", "step_right"]
+
+
+class FlatForest:
+    """
+    Fitted regression forest flattened into contiguous node arrays.
+
+    The trees are concatenated, child indexes are absolute and tree_roots holds
+    the root node of every tree. Scoring walks all (row, tree) pairs one level
+    at a time with vectorized gathers instead of traversing tree by tree.
+    Leaves point at themselves during traversal so finished pairs simply stay
+    put while the deeper ones keep stepping.
+    """
+
+    def __init__(self, feature: np.ndarray, threshold: np.ndarray, children_left: np.ndarray,
+                 children_right: np.ndarray, value: np.ndarray, tree_roots: np.ndarray,
+                 step_arrays: dict = None, max_depth: int = None):
+        """
+        step_arrays: traversal arrays of get_step_arrays with their max_depth, used as they are so
+        memory mapped arrays stay read-only views, built from the node arrays when not given
+        """
+        self.feature = feature
+        self.threshold = threshold
+        self.children_left = children_left
+        self.children_right = children_right
+        self.value = value
+        self.tree_roots = tree_roots
+        self.n_trees = len(tree_roots)
+        if step_arrays is None or max_depth is None:
+            self.build_step_arrays()
+        else:
+            self.step_feature = step_arrays["step_feature"]
+            self.step_left = step_arrays["step_left"]
+            self.step_right = step_arrays["step_right"]
+            self.max_depth = max_depth
+
+    def build_step_arrays(self):
+        is_leaf = self.get_is_leaf()
+        node_index = np.arange(len(self.children_left), dtype=np.int64)
+        self.step_feature = np.where(is_leaf, 0, self.feature).astype(np.int64)
+        self.step_left = np.where(is_leaf, node_index, self.children_left).astype(np.int64)
+        self.step_right = np.where(is_leaf, node_index, self.children_right).astype(np.int64)
+        self.max_depth = FlatForest.get_max_depth(self.step_left, self.step_right, self.tree_roots)
+
+    def get_is_leaf(self) -> np.ndarray:
+        return np.asarray(self.children_left) == TREE_LEAF
+
+    def __getstate__(self):
+        # traversal arrays are derived, rebuilding them is cheaper than pickling them
+        return {key: value for key, value in self.__dict__.items() if key not in FLAT_FOREST_STEP_ARRAY_NAMES}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.build_step_arrays()
+
+    @staticmethod
+    def get_max_depth(step_left: np.ndarray, step_right: np.ndarray, tree_roots: np.ndarray) -> int:
+        depth = 0
+        nodes = np.asarray(tree_roots, dtype=np.int64)
+        while True:
+            children = np.concatenate([step_left[nodes], step_right[nodes]])
+            nodes = np.unique(children[children != np.concatenate([nodes, nodes])])
+            if len(nodes) == 0:
+                return depth
+            depth += 1
+
+    def is_preferred(self, n_rows: int) -> bool:
+        return n_rows * self.n_trees <= FLAT_FOREST_MAX_BATCH_PAIRS
+
+    def get_preferred_batch_rows(self) -> int:
+        return max(1, FLAT_FOREST_MAX_BATCH_PAIRS // self.n_trees)
+
+    def get_arrays(self) -> dict:
+        return {
+            "feature": self.feature,
+            "threshold": self.threshold,
+            "children_left": self.children_left,
+            "children_right": self.children_right,
+            "value": self.value,
+            "tree_roots": self.tree_roots,
+        }
+
+    def get_step_arrays(self) -> dict:
+        return {array_name: getattr(self, array_name) for array_name in FLAT_FOREST_STEP_ARRAY_NAMES}
+
+    def predict_chunk(self, X: np.ndarray) -> np.ndarray:
+        n_rows, n_features = X.shape
+        flat_feature = X.ravel()
+        row_offset = np.repeat(np.arange(n_rows, dtype=np.int64) * n_features, self.n_trees)
+        node = np.tile(self.tree_roots, n_rows)
+        for _ in range(self.max_depth):
+            go_left = flat_feature[row_offset + self.step_feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.step_left[node], self.step_right[node])
+        return self.value[node].reshape(n_rows, self.n_trees).mean(axis=1)
+
+    def predict(self, X) -> np.ndarray:
+        """
+        X: transformed feature array
+        return: mean of the leaf values reached in every tree, same as sklearn's predict
+        """
+        try:
+            # sklearn compares float32 features against float64 thresholds
+            X = np.ascontiguousarray(X, dtype=np.float32)
+            chunk_rows = max(1, FLAT_FOREST_MAX_PAIRS // self.n_trees)
+            if X.shape[0] <= chunk_rows:
+                return self.predict_chunk(X)
+            return np.concatenate([self.predict_chunk(X[start:start + chunk_rows])
+                                   for start in range(0, X.shape[0], chunk_rows)])
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    def predict_in_preferred_batches(self, X) -> np.ndarray:
+        """
+        Scores X in slices of get_preferred_batch_rows rows, for callers without the
+        sklearn estimator to hand large batches to.
+        """
+        try:
+            batch_rows = self.get_preferred_batch_rows()
+            if len(X) <= batch_rows:
+                return self.predict(X)
+            return np.concatenate([self.predict(X[start:start + batch_rows])
+                                   for start in range(0, len(X), batch_rows)])
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    @staticmethod
+    def from_estimator(trained_model_object) -> "FlatForest":
+        """
+        Flattens a fitted single output DecisionTreeRegressor, RandomForestRegressor
+        or ExtraTreesRegressor. Raises an exception for any other estimator.
+        """
+        try:
+            estimator_name = type(trained_model_object).__name__
+            if estimator_name not in FOREST_ESTIMATOR_NAMES:
+                raise Exception(f"Estimator [{estimator_name}] can not be flattened.")
+            if hasattr(trained_model_object, "tree_"):
+                trees = [trained_model_object.tree_]
+            else:
+                trees = [estimator.tree_ for estimator in trained_model_object.estimators_]
+
+            feature, threshold, children_left, children_right, value, tree_roots = [], [], [], [], [], []
+            offset = 0
+            for tree in trees:
+                if tree.n_outputs != 1:
+                    raise Exception("Only single output trees can be flattened.")
+                tree_roots.append(offset)
+                feature.append(tree.feature.astype(np.int64))
+                threshold.append(tree.threshold.astype(np.float64))
+                children_left.append(np.where(tree.children_left == TREE_LEAF, TREE_LEAF, tree.children_left + offset))
+                children_right.append(np.where(tree.children_right == TREE_LEAF, TREE_LEAF,
+                                               tree.children_right + offset))
+                value.append(tree.value[:, 0, 0].astype(np.float64))
+                offset += tree.node_count
+
+            return FlatForest(feature=np.concatenate(feature),
+                              threshold=np.concatenate(threshold),
+                              children_left=np.concatenate(children_left).astype(np.int64),
+                              children_right=np.concatenate(children_right).astype(np.int64),
+                              value=np.concatenate(value),
+                              tree_roots=np.asarray(tree_roots, dtype=np.int64))
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    def get_probe_array(self, n_features: int, n_rows: int = FLAT_FOREST_PROBE_ROWS, seed: int = 0) -> np.ndarray:
+        """
+        Random rows mixed with values sitting exactly on and right next to the
+        split thresholds, so both sides of every comparison get exercised.
+        """
+        rng = np.random.default_rng(seed)
+        probe = rng.normal(size=(n_rows, n_features))
+        split_node = ~self.get_is_leaf()
+        for feature_index in range(n_features):
+            thresholds = self.threshold[split_node & (self.feature == feature_index)]
+            if len(thresholds) == 0:
+                continue
+            thresholds = rng.choice(thresholds, size=n_rows).astype(np.float32)
+            direction = rng.choice([-np.inf, np.inf], size=n_rows).astype(np.float32)
+            boundary_values = np.where(rng.random(n_rows) < 0.5, thresholds, np.nextafter(thresholds, direction))
+            probe[:, feature_index] = np.where(rng.random(n_rows) < 0.8, boundary_values, probe[:, feature_index])
+        return probe
+
+    def is_equivalent(self, trained_model_object, X: np.ndarray = None, rtol: float = 1e-7,
+                      atol: float = 1e-6) -> bool:
+        """
+        Checks the flattened forest predictions against sklearn's predictions.
+        X: optional transformed feature array, a probe array is used when not given
+        """
+        try:
+            if X is None:
+                X = self.get_probe_array(n_features=trained_model_object.n_features_in_)
+            return np.allclose(trained_model_object.predict(X), self.predict(X), rtol=rtol, atol=atol)
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+
+def compile_forest(trained_model_object) -> FlatForest:
+    """
+    Returns FlatForest for a supported fitted forest or None if the estimator is
+    not a forest, can not be flattened or its output does not match sklearn.
+    """
+    if type(trained_model_object).__name__ not in FOREST_ESTIMATOR_NAMES:
+        return None
+    try:
+        flat_forest = FlatForest.from_estimator(trained_model_object)
+        if not flat_forest.is_equivalent(trained_model_object):
+            logging.info("Flattened forest predictions do not match sklearn predictions, it will not be used.")
+            return None
+        logging.info(f"Forest flattened successfully: [{flat_forest.n_trees}] trees, depth [{flat_forest.max_depth}].")
+        return flat_forest
+    except Exception as e:
+        logging.info(f"Forest can not be flattened: {e}")
+        return None
@@ -0,0 +1,183 @@
+from insurance.exception import InsuranceException
+from insurance.logger import logging
+from insurance.entity.config_entity import DatabaseConfig
+from insurance.entity.database_loader import get_database_connection, INSURANCE_TABLE_COLUMNS
+from insurance.util.util import read_yaml_file, write_yaml_file_atomic
+from insurance.constant import SQLITE_DATABASE_BACKEND, INGESTION_WATERMARK_FILE_NAME, \
+    INGESTION_PARTITION_DIR_NAME, INGESTION_HISTORY_TRAIN_DIR_NAME, INGESTION_HISTORY_TEST_DIR_NAME
+
+import os
+import sys
+import hashlib
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+WATERMARK_COLUMN_KEY = "watermark_column"
+HIGH_WATER_MARK_KEY = "high_water_mark"
+HISTORY_FILE_SIZES_KEY = "history_file_sizes"
+PARTITIONS_KEY = "partitions"
+PARTITION_FILE_NAME_KEY = "file_name"
+PARTITION_FIRST_VALUE_KEY = "first_value"
+PARTITION_LAST_VALUE_KEY = "last_value"
+PARTITION_N_ROWS_KEY = "n_rows"
+PARTITION_N_TRAIN_ROWS_KEY = "n_train_rows"
+PARTITION_N_TEST_ROWS_KEY = "n_test_rows"
+PARTITION_INGESTED_AT_KEY = "ingested_at"
+INCREMENTAL_INGESTION_TEST_SIZE = 0.2
+
+IngestionPartition = namedtuple("IngestionPartition", ["file_path", "first_value", "last_value", "n_rows",
+                                                       "n_train_rows", "n_test_rows"])
+
+
+def get_python_value(value):
+    return value.item() if hasattr(value, "item") else value
+
+
+class WatermarkIngestion:
+    """
+    Incremental ingestion of the database table above a high-water mark.
+
+    Only rows whose watermark column (the id AUTO_INCREMENT column by default,
+    or any column that only grows such as an insert time) is above the mark of
+    the previous run are fetched, fetch_size rows at a time through a streaming
+    cursor. They are written as a new partition csv and split into train and
+    test rows which are appended to the retained history files, so a run costs
+    time in proportion to the new rows. Rows updated in place are not picked up
+    again, the table is treated as append only.
+
+    The watermark file is written last. It records the history file sizes of
+    the last completed run, and a run interrupted before updating it is undone
+    by truncating the history files back to those sizes.
+    """
+
+    def __init__(self, database_config: DatabaseConfig, history_dir: str, watermark_column: str = "id",
+                 fetch_size: int = 10000):
+        try:
+            self.database_config = database_config
+            self.history_dir = history_dir
+            self.watermark_column = watermark_column
+            self.fetch_size = fetch_size
+            self.watermark_file_path = os.path.join(history_dir, INGESTION_WATERMARK_FILE_NAME)
+            self.partition_dir = os.path.join(history_dir, INGESTION_PARTITION_DIR_NAME)
+            file_name = f"{database_config.table_name}.csv"
+            self.train_file_path = os.path.join(history_dir, INGESTION_HISTORY_TRAIN_DIR_NAME, file_name)
+            self.test_file_path = os.path.join(history_dir, INGESTION_HISTORY_TEST_DIR_NAME, file_name)
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    def get_watermark(self) -> dict:
+        if not os.path.exists(self.watermark_file_path):
+            return {WATERMARK_COLUMN_KEY: self.watermark_column, HIGH_WATER_MARK_KEY: None,
+                    HISTORY_FILE_SIZES_KEY: {}, PARTITIONS_KEY: []}
+        watermark = read_yaml_file(file_path=self.watermark_file_path)
+        if watermark[WATERMARK_COLUMN_KEY] != self.watermark_column:
+            raise Exception(f"History in [{self.history_dir}] was ingested by [{watermark[WATERMARK_COLUMN_KEY]}], "
+                            f"not by [{self.watermark_column}].")
+        return watermark
+
+    def restore_history(self, watermark: dict):
+        """
+        Drops rows appended to the history files by a run which did not complete.
+        """
+        history_file_sizes = watermark[HISTORY_FILE_SIZES_KEY]
+        for file_path in (self.train_file_path, self.test_file_path):
+            file_size = history_file_sizes.get(os.path.basename(os.path.dirname(file_path)), 0)
+            if os.path.exists(file_path) and os.path.getsize(file_path) > file_size:
+                logging.info(f"Truncating [{file_path}] to [{file_size}] bytes of the last completed ingestion.")
+                with open(file_path, "r+b") as history_file:
+                    history_file.truncate(file_size)
+
+    def get_new_row_query(self, high_water_mark) -> tuple:
+        placeholder = "?" if self.database_config.database_backend == SQLITE_DATABASE_BACKEND else "%s"
+        columns = ",".join([self.watermark_column] + INSURANCE_TABLE_COLUMNS)
+        query = f"SELECT {columns} FROM {self.database_config.table_name}"
+        if high_water_mark is None:
+            return f"{query} ORDER BY {self.watermark_column}", ()
+        return f"{query} WHERE {self.watermark_column} > {placeholder} ORDER BY {self.watermark_column}", \
+            (high_water_mark,)
+
+    @staticmethod
+    def append_csv(dataframe: pd.DataFrame, file_path: str):
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        is_new_file = not os.path.exists(file_path) or os.path.getsize(file_path) == 0
+        dataframe.to_csv(file_path, mode="a", header=is_new_file, index=False)
+
+    def ingest(self) -> IngestionPartition:
+        """
+        return: partition of the new rows, None when the table has no new row
+        """
+        try:
+            watermark = self.get_watermark()
+            self.restore_history(watermark)
+            high_water_mark = watermark[HIGH_WATER_MARK_KEY]
+            logging.info(f"Fetching rows of [{self.database_config.table_name}] with [{self.watermark_column}] "
+                         f"above [{high_water_mark}]")
+
+            time_stamp = datetime.now().strftime('%Y-%m-%d-%H-%M-%S')
+            partition_file_path = os.path.join(self.partition_dir,
+                                               f"partition-{len(watermark[PARTITIONS_KEY]):05d}.csv")
+            if os.path.exists(partition_file_path):
+                # left behind by an interrupted run
+                os.remove(partition_file_path)
+            first_value, last_value = None, None
+            n_rows, n_train_rows, n_test_rows = 0, 0, 0
+            query, query_params = self.get_new_row_query(high_water_mark)
+
+            db_connect = get_database_connection(self.database_config)
+            try:
+                # mysql connector cursors are unbuffered by default, rows stream from the server as fetched
+                db_cursor = db_connect.cursor()
+                db_cursor.execute(query, query_params)
+                random_generator = None
+                while True:
+                    rows = db_cursor.fetchmany(self.fetch_size)
+                    if len(rows) == 0:
+                        break
+                    dataframe = pd.DataFrame(rows, columns=[self.watermark_column] + INSURANCE_TABLE_COLUMNS)
+                    if first_value is None:
+                        first_value = get_python_value(dataframe[self.watermark_column].iloc[0])
+                        # seeded by the partition start, a rerun after an interruption splits identically
+                        random_generator = np.random.default_rng(
+                            int(hashlib.sha256(str(first_value).encode()).hexdigest()[:8], 16))
+                    last_value = get_python_value(dataframe[self.watermark_column].iloc[-1])
+
+                    dataframe = dataframe[INSURANCE_TABLE_COLUMNS]
+                    is_test_row = random_generator.random(len(dataframe)) < INCREMENTAL_INGESTION_TEST_SIZE
+                    WatermarkIngestion.append_csv(dataframe, partition_file_path)
+                    WatermarkIngestion.append_csv(dataframe[~is_test_row], self.train_file_path)
+                    WatermarkIngestion.append_csv(dataframe[is_test_row], self.test_file_path)
+                    n_rows += len(dataframe)
+                    n_test_rows += int(is_test_row.sum())
+                    n_train_rows += int((~is_test_row).sum())
+            finally:
+                db_connect.close()
+
+            if n_rows == 0:
+                logging.info("No new rows since the last ingestion.")
+                return None
+
+            watermark[HIGH_WATER_MARK_KEY] = last_value
+            watermark[HISTORY_FILE_SIZES_KEY] = {
+                os.path.basename(os.path.dirname(file_path)): os.path.getsize(file_path)
+                for file_path in (self.train_file_path, self.test_file_path) if os.path.exists(file_path)}
+            watermark[PARTITIONS_KEY].append({
+                PARTITION_FILE_NAME_KEY: os.path.basename(partition_file_path),
+                PARTITION_FIRST_VALUE_KEY: first_value,
+                PARTITION_LAST_VALUE_KEY: last_value,
+                PARTITION_N_ROWS_KEY: n_rows,
+                PARTITION_N_TRAIN_ROWS_KEY: n_train_rows,
+                PARTITION_N_TEST_ROWS_KEY: n_test_rows,
+                PARTITION_INGESTED_AT_KEY: time_stamp,
+            })
+            write_yaml_file_atomic(file_path=self.watermark_file_path, data=watermark)
+
+            partition = IngestionPartition(file_path=partition_file_path, first_value=first_value,
+                                           last_value=last_value, n_rows=n_rows, n_train_rows=n_train_rows,
+                                           n_test_rows=n_test_rows)
+            logging.info(f"Ingested partition: {partition}, new high-water mark: [{last_value}]")
+            return partition
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
@@ -0,0 +1,191 @@
+from insurance.exception import InsuranceException
+from insurance.logger import logging
+from insurance.entity.compiled_preprocessor import CompiledPreprocessor
+
+import sys
+import numpy as np
+import pandas as pd
+
+from sklearn.base import clone
+from sklearn.compose import ColumnTransformer
+
+INCREMENTAL_PREPROCESSOR_SAMPLE_SIZE = 100000
+
+
+def merge_moments(n_a: np.ndarray, mean_a: np.ndarray, m2_a: np.ndarray,
+                  n_b: np.ndarray, mean_b: np.ndarray, m2_b: np.ndarray) -> tuple:
+    """
+    Merges counts, means and sums of squared deviations of two parts of a
+    dataset (Chan et al.), column wise.
+    return: n, mean, m2 of the union
+    """
+    n = n_a + n_b
+    safe_n = np.maximum(n, 1)
+    delta = mean_b - mean_a
+    mean = mean_a + delta * n_b / safe_n
+    m2 = m2_a + m2_b + delta ** 2 * n_a * n_b / safe_n
+    return n, mean, m2
+
+
+class IncrementalPreprocessingStatistics:
+    """
+    Fits the statistics of the ColumnTransformer of
+    DataTransformation.get_data_transformer_object over chunks of a dataset
+    larger than memory and compiles them into a CompiledPreprocessor.
+
+    numerical columns: count, mean and sum of squared deviations of the observed
+    values are merged chunk by chunk, the median used by the imputer comes from
+    a uniform sample of sample_size observed values per column and is exact as
+    long as a column has no more observed values than that.
+    categorical columns: exact category and missing value counts.
+    Imputed values are accounted for when the scaler statistics are derived,
+    the same way the in memory pipeline scales after imputing.
+    """
+
+    def __init__(self, numerical_columns: list, categorical_columns: list,
+                 sample_size: int = INCREMENTAL_PREPROCESSOR_SAMPLE_SIZE, random_state: int = 42):
+        self.numerical_columns = list(numerical_columns)
+        self.categorical_columns = list(categorical_columns)
+        self.sample_size = sample_size
+        self.random_generator = np.random.default_rng(random_state)
+        n_numerical = len(self.numerical_columns)
+        self.n_rows = 0
+        self.numerical_count = np.zeros(n_numerical)
+        self.numerical_mean = np.zeros(n_numerical)
+        self.numerical_m2 = np.zeros(n_numerical)
+        self.numerical_samples = [np.empty(0) for _ in self.numerical_columns]
+        self.numerical_sample_keys = [np.empty(0) for _ in self.numerical_columns]
+        self.category_counts = [dict() for _ in self.categorical_columns]
+        self.categorical_missing_count = np.zeros(len(self.categorical_columns), dtype=np.int64)
+
+    def update_numerical_sample(self, column_index: int, values: np.ndarray):
+        # keeps the values with the smallest random keys, a uniform sample without replacement
+        sample = np.concatenate([self.numerical_samples[column_index], values])
+        sample_keys = np.concatenate([self.numerical_sample_keys[column_index],
+                                      self.random_generator.random(len(values))])
+        if len(sample) > self.sample_size:
+            kept_indexes = np.argpartition(sample_keys, self.sample_size)[:self.sample_size]
+            sample, sample_keys = sample[kept_indexes], sample_keys[kept_indexes]
+        self.numerical_samples[column_index] = sample
+        self.numerical_sample_keys[column_index] = sample_keys
+
+    def partial_fit(self, dataframe: pd.DataFrame) -> "IncrementalPreprocessingStatistics":
+        try:
+            self.n_rows += len(dataframe)
+            if len(self.numerical_columns) > 0:
+                values = dataframe[self.numerical_columns].to_numpy(dtype=np.float64)
+                observed_mask = ~np.isnan(values)
+                chunk_count = observed_mask.sum(axis=0).astype(np.float64)
+                chunk_mean = np.where(observed_mask, values, 0.0).sum(axis=0) / np.maximum(chunk_count, 1)
+                chunk_m2 = np.where(observed_mask, values - chunk_mean, 0.0)
+                chunk_m2 = (chunk_m2 * chunk_m2).sum(axis=0)
+                self.numerical_count, self.numerical_mean, self.numerical_m2 = merge_moments(
+                    self.numerical_count, self.numerical_mean, self.numerical_m2, chunk_count, chunk_mean, chunk_m2)
+                for column_index in range(len(self.numerical_columns)):
+                    self.update_numerical_sample(column_index, values[observed_mask[:, column_index], column_index])
+
+            for column_index, column in enumerate(self.categorical_columns):
+                column_values = dataframe[column]
+                self.categorical_missing_count[column_index] += int(column_values.isna().sum())
+                category_counts = self.category_counts[column_index]
+                for category, count in column_values.value_counts(dropna=True).items():
+                    category_counts[category] = category_counts.get(category, 0) + int(count)
+            return self
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    @staticmethod
+    def get_scale(variance: np.ndarray) -> np.ndarray:
+        # StandardScaler leaves constant columns unscaled
+        scale = np.sqrt(variance)
+        scale[scale < 10 * np.finfo(np.float64).eps] = 1.0
+        return scale
+
+    def get_numerical_statistics(self) -> tuple:
+        """
+        return: imputer fill values, mean and scale of the imputed columns
+        """
+        empty_columns = [column for column, count in zip(self.numerical_columns, self.numerical_count) if count == 0]
+        if len(empty_columns) > 0:
+            raise Exception(f"Numerical columns {empty_columns} have no observed value.")
+        fill = np.array([np.median(sample) for sample in self.numerical_samples], dtype=np.float64)
+        # missing values are replaced by the median before the scaler sees them
+        n_missing = self.n_rows - self.numerical_count
+        _, mean, m2 = merge_moments(self.numerical_count, self.numerical_mean, self.numerical_m2,
+                                    n_missing, fill, np.zeros(len(fill)))
+        return fill, mean, IncrementalPreprocessingStatistics.get_scale(m2 / self.n_rows)
+
+    def get_categorical_statistics(self) -> tuple:
+        """
+        return: imputer fill values, category lookups and scaled one hot tables
+        """
+        fill, lookups, tables = [], [], []
+        for column, category_counts, n_missing in zip(self.categorical_columns, self.category_counts,
+                                                      self.categorical_missing_count):
+            if len(category_counts) == 0:
+                raise Exception(f"Categorical column [{column}] has no observed value.")
+            categories = sorted(category_counts)
+            # most frequent category, max keeps the first, i.e. smallest, one on ties like SimpleImputer
+            fill_value = max(categories, key=category_counts.get)
+            counts = np.array([category_counts[category] + (n_missing if category == fill_value else 0)
+                               for category in categories], dtype=np.float64)
+            frequency = counts / self.n_rows
+            scale = IncrementalPreprocessingStatistics.get_scale(frequency * (1.0 - frequency))
+            n_categories = len(categories)
+            # one extra row of zeros for values unseen during fit
+            table = np.zeros((n_categories + 1, n_categories), dtype=np.float64)
+            table[np.arange(n_categories), np.arange(n_categories)] = 1.0 / scale
+            fill.append(fill_value)
+            lookups.append({category: index for index, category in enumerate(categories)})
+            tables.append(table)
+        return fill, lookups, tables
+
+    def get_compiled_preprocessor(self) -> CompiledPreprocessor:
+        try:
+            if self.n_rows == 0:
+                raise Exception("Preprocessing statistics were not fitted on any row.")
+            numerical_fill, numerical_mean, numerical_scale = self.get_numerical_statistics()
+            categorical_fill, categorical_lookups, categorical_tables = self.get_categorical_statistics()
+            logging.info(f"Preprocessing statistics fitted on [{self.n_rows}] rows, "
+                         f"medians from samples of {[len(sample) for sample in self.numerical_samples]} values.")
+            return CompiledPreprocessor(numerical_columns=self.numerical_columns,
+                                        numerical_fill=numerical_fill,
+                                        numerical_mean=numerical_mean,
+                                        numerical_scale=numerical_scale,
+                                        categorical_columns=self.categorical_columns,
+                                        categorical_fill=categorical_fill,
+                                        categorical_lookups=categorical_lookups,
+                                        categorical_tables=categorical_tables)
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    def is_equivalent(self, preprocessing_object: ColumnTransformer, dataframe: pd.DataFrame,
+                      rtol: float = 1e-7, atol: float = 1e-9) -> bool:
+        """
+        Checks the statistics against sklearn: statistics of the same columns fitted over two
+        halves of dataframe, so chunks get merged, are compared with preprocessing_object fitted
+        on the whole of it. At most sample_size rows of dataframe are used, the medians are exact.
+        preprocessing_object: unfitted ColumnTransformer of DataTransformation.get_data_transformer_object
+        dataframe: rows to fit both on, e.g. the first chunk of the dataset
+        """
+        try:
+            dataframe = dataframe.iloc[:self.sample_size]
+            empty_columns = [column for column in self.numerical_columns + self.categorical_columns
+                             if dataframe[column].isna().all()]
+            if len(dataframe) < 2 or len(empty_columns) > 0:
+                logging.info(f"Preprocessing statistics not checked, columns {empty_columns} of the "
+                             f"[{len(dataframe)}] rows have no observed value.")
+                return True
+            preprocessing_statistics = IncrementalPreprocessingStatistics(
+                numerical_columns=self.numerical_columns, categorical_columns=self.categorical_columns,
+                sample_size=self.sample_size)
+            half = len(dataframe) // 2
+            preprocessing_statistics.partial_fit(dataframe.iloc[:half]).partial_fit(dataframe.iloc[half:])
+            compiled_feature = preprocessing_statistics.get_compiled_preprocessor().transform(dataframe)
+            expected_feature = clone(preprocessing_object).fit_transform(dataframe)
+            if hasattr(expected_feature, "toarray"):
+                expected_feature = expected_feature.toarray()
+            return expected_feature.shape == compiled_feature.shape and \
+                np.allclose(expected_feature, compiled_feature, rtol=rtol, atol=atol)
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
@@ -0,0 +1,59 @@
+from insurance.exception import InsuranceException
+from insurance.logger import logging
+from insurance.entity.array_chunks import get_array_chunk_file_paths, iter_array_chunks
+
+import sys
+import time
+import numpy as np
+from sklearn.base import clone
+
+INCREMENTAL_TRAINING_N_EPOCHS = 5
+
+
+class IncrementalTrainer:
+    """
+    Trains partial_fit estimators on a dataset stored as .npy chunks, see
+    ArrayChunkWriter, with one chunk in memory at a time.
+
+    Every epoch visits the chunks in a new random order and shuffles the rows
+    of each chunk. All models are updated from a chunk while it is loaded, so
+    an epoch reads the dataset once whatever the number of models.
+    """
+
+    def __init__(self, n_epochs: int = INCREMENTAL_TRAINING_N_EPOCHS, random_state: int = 42):
+        self.n_epochs = n_epochs
+        self.random_state = random_state
+
+    def fit(self, models: list, manifest_file_path: str) -> tuple:
+        """
+        models: unfitted estimators implementing partial_fit, they are cloned
+        manifest_file_path: manifest of the training chunks, target in the last column
+        return: fitted models and {"n_fits", "fit_time"} of every model in models order
+        """
+        try:
+            for model in models:
+                if not hasattr(model, "partial_fit"):
+                    raise Exception(f"{type(model).__name__} does not implement partial_fit.")
+            fitted_models = [clone(model) for model in models]
+            fit_times = [0.0] * len(models)
+            n_chunks = len(get_array_chunk_file_paths(manifest_file_path))
+            random_generator = np.random.default_rng(self.random_state)
+
+            for epoch in range(self.n_epochs):
+                chunk_order = random_generator.permutation(n_chunks)
+                for chunk in iter_array_chunks(manifest_file_path, chunk_order=chunk_order):
+                    row_order = random_generator.permutation(len(chunk))
+                    chunk = chunk[row_order]
+                    input_feature, output_feature = chunk[:, :-1], chunk[:, -1]
+                    for model_index, model in enumerate(fitted_models):
+                        start = time.perf_counter()
+                        model.partial_fit(input_feature, output_feature)
+                        fit_times[model_index] += time.perf_counter() - start
+                logging.info(f"Incremental training epoch [{epoch + 1}/{self.n_epochs}] over [{n_chunks}] "
+                             f"chunks completed.")
+
+            training_compute = [{"n_fits": self.n_epochs * n_chunks, "fit_time": float(fit_time)}
+                                for fit_time in fit_times]
+            return fitted_models, training_compute
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
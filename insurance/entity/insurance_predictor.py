@@ -1,11 +1,36 @@
 import os
 import sys
+import time
+import queue
+import threading
+from collections import OrderedDict
+from datetime import datetime
 
 from insurance.exception import InsuranceException
-from insurance.util.util import load_object
+from insurance.logger import logging
+from insurance.util.util import load_object, read_yaml_file
+from insurance.constant import MODEL_MANIFEST_FILE_NAME, MODEL_MANIFEST_MODEL_PATH_KEY, \
+    MODEL_MANIFEST_COMPACT_MODEL_PATH_KEY, COMPACT_MODEL_DIR_NAME
+from insurance.entity.compact_model import load_compact_model, is_compact_model_dir
+from insurance.entity.serving_metrics import serving_metrics, FRAME_STAGE, TRANSFORM_STAGE, PREDICT_STAGE, \
+    MODEL_LOAD_COUNT_METRIC
 
+import numpy as np
 import pandas as pd
 
+INSURANCE_NUMERICAL_FIELDS = ["age", "bmi", "children"]
+INSURANCE_CATEGORICAL_FIELDS = ["sex", "smoker", "region"]
+INSURANCE_EXPENSES_KEY = "insurance_expenses"
+RECORD_INDEX_KEY = "index"
+RECORD_ERROR_KEY = "error"
+PREDICTION_CSV_CHUNK_SIZE = 10000
+PREDICTION_CSV_PREFETCH_CHUNKS = 2
+PREDICTION_CACHE_MAX_SIZE = 100000
+PREDICTION_CACHE_TTL_SECONDS = 3600
+MODEL_WATCH_INTERVAL_SECONDS = 5.0
+WARM_UP_INSURANCE_DATA = {"age": 30.0, "sex": "male", "bmi": 25.0, "children": 0.0,
+                          "smoker": "no", "region": "southeast"}
+
 
 class InsuranceData:
 
@@ -51,30 +76,596 @@ class InsuranceData:
         except Exception as e:
             raise InsuranceException(e, sys)
 
+    @staticmethod
+    def from_dict(record: dict) -> "InsuranceData":
+        """
+        Builds InsuranceData from a raw request record.
+        Raises ValueError with a short message if the record is not usable,
+        so that callers can report it back per record.
+        """
+        if not isinstance(record, dict):
+            raise ValueError("record must be a json object")
+        missing_fields = [field for field in INSURANCE_NUMERICAL_FIELDS + INSURANCE_CATEGORICAL_FIELDS
+                          if record.get(field) in (None, "")]
+        if len(missing_fields) > 0:
+            raise ValueError(f"missing fields: {missing_fields}")
+
+        input_data = {}
+        for field in INSURANCE_NUMERICAL_FIELDS:
+            try:
+                value = float(record[field])
+            except (TypeError, ValueError):
+                raise ValueError(f"field [{field}] must be a number, got: [{record[field]}]")
+            if not np.isfinite(value):
+                raise ValueError(f"field [{field}] must be a finite number, got: [{record[field]}]")
+            input_data[field] = value
+        for field in INSURANCE_CATEGORICAL_FIELDS:
+            input_data[field] = str(record[field]).strip()
+        return InsuranceData(**input_data)
+
+    @staticmethod
+    def get_insurance_batch_data_frame(insurance_data_list: list) -> pd.DataFrame:
+        """
+        Builds one dataframe for a list of InsuranceData so that the whole batch
+        goes through preprocessing and prediction in a single call.
+        """
+        try:
+            batch_data = {field: [getattr(insurance_data, field) for insurance_data in insurance_data_list]
+                          for field in ["age", "sex", "bmi", "children", "smoker", "region"]}
+            return pd.DataFrame(batch_data)
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+
+class InsuranceModelCache:
+    """
+    Process wide cache of the latest exported model.
+    The model is unpickled once per worker and served from memory until the
+    model manifest is replaced by ModelPusher. Without a manifest the
+    modification time of the model export directory is watched instead, i.e.
+    a reload happens when a new model version folder shows up in saved_models.
+
+    With a watcher started, new versions are loaded and warmed up by a
+    background thread and swapped in with a single reference assignment, so
+    requests neither check for new versions nor wait on a model load.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cached_models = {}
+        self.watcher_pids = {}
+        self.hit_count = 0
+        self.miss_count = 0
+
+    @staticmethod
+    def get_model_dir_stamp(model_dir: str, manifest_file_path: str = None) -> tuple:
+        """
+        Cheap change detector: a single stat call on the manifest, which is
+        replaced (new inode) on every push, or on the export directory.
+        """
+        if manifest_file_path is not None:
+            try:
+                manifest_stat = os.stat(manifest_file_path)
+                return manifest_stat.st_ino, manifest_stat.st_mtime_ns, manifest_stat.st_size
+            except FileNotFoundError:
+                pass
+        return (os.stat(model_dir).st_mtime_ns,)
+
+    @staticmethod
+    def get_model_version(model_path: str) -> str:
+        return os.path.basename(os.path.dirname(model_path))
+
+    @staticmethod
+    def load_model(model_path: str):
+        """
+        model_path: dill file or compact model directory
+        """
+        if is_compact_model_dir(model_path):
+            return load_compact_model(export_dir=model_path)
+        return load_object(file_path=model_path)
+
+    @staticmethod
+    def warm_up_model(model):
+        """
+        Runs one prediction so that lazily initialized state is built before
+        the model serves its first request.
+        """
+        warm_up_df = InsuranceData(**WARM_UP_INSURANCE_DATA).get_insurance_input_data_frame()
+        model.predict(warm_up_df)
+
+    @staticmethod
+    def load_model_entry(model_path: str, stamp: tuple) -> dict:
+        logging.info(f"Loading model: [{model_path}]")
+        model = InsuranceModelCache.load_model(model_path=model_path)
+        InsuranceModelCache.warm_up_model(model)
+        serving_metrics.increment(MODEL_LOAD_COUNT_METRIC)
+        return {"stamp": stamp,
+                "model_path": model_path,
+                "model_version": InsuranceModelCache.get_model_version(model_path),
+                "model": model,
+                "loaded_at": datetime.now()}
+
+    def is_watched(self, model_dir: str) -> bool:
+        return self.watcher_pids.get(model_dir) == os.getpid()
+
+    def get_model_entry(self, model_dir: str, get_latest_model_path, manifest_file_path: str = None) -> dict:
+        """
+        model_dir: directory which holds all exported model versions
+        get_latest_model_path: callable returning path of latest model file
+        manifest_file_path: model manifest to watch for new versions
+        return: dict with the latest model object, its path and version.
+        A new dict is created on every reload so the fields are always consistent.
+        """
+        try:
+            cached_model = self.cached_models.get(model_dir)
+            if cached_model is not None and self.is_watched(model_dir):
+                # the watcher thread takes care of new versions
+                self.record_lookup(is_hit=True)
+                return cached_model
+
+            stamp = InsuranceModelCache.get_model_dir_stamp(model_dir, manifest_file_path)
+            if cached_model is not None and cached_model["stamp"] == stamp:
+                self.record_lookup(is_hit=True)
+                return cached_model
+
+            with self.lock:
+                # another thread may have reloaded the model while we were waiting
+                cached_model = self.cached_models.get(model_dir)
+                if cached_model is not None and cached_model["stamp"] == stamp:
+                    self.hit_count += 1
+                    return cached_model
+
+                try:
+                    model_path = get_latest_model_path()
+                except Exception as e:
+                    if cached_model is None:
+                        raise e
+                    # new version folder is still being written, keep serving current model
+                    logging.info(f"Latest model in [{model_dir}] is not ready yet, serving cached model: {e}")
+                    self.hit_count += 1
+                    return cached_model
+
+                if cached_model is not None and cached_model["model_path"] == model_path:
+                    self.hit_count += 1
+                    cached_model = dict(cached_model, stamp=stamp)
+                else:
+                    self.miss_count += 1
+                    cached_model = InsuranceModelCache.load_model_entry(model_path=model_path, stamp=stamp)
+                self.cached_models[model_dir] = cached_model
+                return cached_model
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    def get_model(self, model_dir: str, get_latest_model_path, manifest_file_path: str = None):
+        """
+        return: latest model object, see get_model_entry
+        """
+        return self.get_model_entry(model_dir=model_dir,
+                                    get_latest_model_path=get_latest_model_path,
+                                    manifest_file_path=manifest_file_path)["model"]
+
+    def refresh(self, model_dir: str, get_latest_model_path, manifest_file_path: str = None) -> bool:
+        """
+        Loads and warms up a new model version outside the lock and swaps it in.
+        return: True if a new model version has been swapped in
+        """
+        stamp = InsuranceModelCache.get_model_dir_stamp(model_dir, manifest_file_path)
+        cached_model = self.cached_models.get(model_dir)
+        if cached_model is not None and cached_model["stamp"] == stamp:
+            return False
+
+        model_path = get_latest_model_path()
+        if cached_model is not None and cached_model["model_path"] == model_path:
+            self.cached_models[model_dir] = dict(cached_model, stamp=stamp)
+            return False
+
+        new_model = InsuranceModelCache.load_model_entry(model_path=model_path, stamp=stamp)
+        with self.lock:
+            self.miss_count += 1
+            self.cached_models[model_dir] = new_model
+        logging.info(f"Model version [{new_model['model_version']}] is now served by process [{os.getpid()}].")
+        return True
+
+    def watch(self, model_dir: str, get_latest_model_path, manifest_file_path: str, interval_seconds: float):
+        while True:
+            try:
+                self.refresh(model_dir=model_dir,
+                             get_latest_model_path=get_latest_model_path,
+                             manifest_file_path=manifest_file_path)
+            except Exception as e:
+                # keep serving the current model, the next poll tries again
+                logging.info(f"Model refresh of [{model_dir}] failed: {e}")
+            time.sleep(interval_seconds)
+
+    def start_watcher(self, model_dir: str, get_latest_model_path, manifest_file_path: str = None,
+                      interval_seconds: float = MODEL_WATCH_INTERVAL_SECONDS):
+        """
+        Starts the background thread polling for new model versions. Threads do
+        not survive fork, so it has to be called in every web worker process;
+        calling it again in the same process does nothing.
+        """
+        if self.is_watched(model_dir):
+            return
+        with self.lock:
+            if self.is_watched(model_dir):
+                return
+            self.watcher_pids[model_dir] = os.getpid()
+        watcher = threading.Thread(target=self.watch,
+                                   args=(model_dir, get_latest_model_path, manifest_file_path, interval_seconds),
+                                   name="model-watcher",
+                                   daemon=True)
+        watcher.start()
+        logging.info(f"Model watcher started for [{model_dir}] in process [{os.getpid()}].")
+
+    def record_lookup(self, is_hit: bool):
+        with self.lock:
+            if is_hit:
+                self.hit_count += 1
+            else:
+                self.miss_count += 1
+
+    def clear(self):
+        with self.lock:
+            self.cached_models = {}
+
+    def get_cache_info(self) -> dict:
+        with self.lock:
+            return {
+                "hit_count": self.hit_count,
+                "miss_count": self.miss_count,
+                "models": {model_dir: {"model_path": cached_model["model_path"],
+                                       "model_version": cached_model["model_version"],
+                                       "loaded_at": str(cached_model["loaded_at"]),
+                                       "is_watched": self.is_watched(model_dir)}
+                           for model_dir, cached_model in self.cached_models.items()}
+            }
+
+
+insurance_model_cache = InsuranceModelCache()
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache of predicted expenses with a time to live.
+    Keys are the normalized input fields, and every entry belongs to the model
+    version that produced it: as soon as a lookup comes with another model
+    version, i.e. a new model was pushed, the whole cache is dropped.
+    """
+
+    def __init__(self, max_size: int = PREDICTION_CACHE_MAX_SIZE, ttl_seconds: float = PREDICTION_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.model_version = None
+        self.memory_bytes = 0
+        self.hit_count = 0
+        self.miss_count = 0
+
+    @staticmethod
+    def get_key(insurance_data: InsuranceData) -> tuple:
+        return (float(insurance_data.age),
+                str(insurance_data.sex).strip(),
+                float(insurance_data.bmi),
+                float(insurance_data.children),
+                str(insurance_data.smoker).strip(),
+                str(insurance_data.region).strip())
+
+    @staticmethod
+    def get_entry_size(key: tuple, value: float) -> int:
+        return sys.getsizeof(key) + sum(sys.getsizeof(field) for field in key) + sys.getsizeof(value)
+
+    def sync_model_version(self, model_version: str):
+        # caller must hold the lock
+        if self.model_version != model_version:
+            if len(self.entries) > 0:
+                logging.info(f"Model version changed from [{self.model_version}] to [{model_version}], "
+                             f"dropping [{len(self.entries)}] cached predictions.")
+            self.entries = OrderedDict()
+            self.memory_bytes = 0
+            self.model_version = model_version
+
+    def get(self, key: tuple, model_version: str):
+        """
+        return: cached prediction or None
+        """
+        with self.lock:
+            self.sync_model_version(model_version)
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time.monotonic():
+                    self.entries.move_to_end(key)
+                    self.hit_count += 1
+                    return value
+                del self.entries[key]
+                self.memory_bytes -= PredictionCache.get_entry_size(key, value)
+            self.miss_count += 1
+            return None
+
+    def put(self, key: tuple, value: float, model_version: str):
+        with self.lock:
+            self.sync_model_version(model_version)
+            if key in self.entries:
+                self.memory_bytes -= PredictionCache.get_entry_size(key, self.entries[key][0])
+            self.entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self.entries.move_to_end(key)
+            self.memory_bytes += PredictionCache.get_entry_size(key, value)
+            while len(self.entries) > self.max_size:
+                evicted_key, (evicted_value, _) = self.entries.popitem(last=False)
+                self.memory_bytes -= PredictionCache.get_entry_size(evicted_key, evicted_value)
+
+    def clear(self):
+        with self.lock:
+            self.entries = OrderedDict()
+            self.memory_bytes = 0
+
+    def get_cache_info(self) -> dict:
+        with self.lock:
+            lookup_count = self.hit_count + self.miss_count
+            return {
+                "hit_count": self.hit_count,
+                "miss_count": self.miss_count,
+                "hit_ratio": self.hit_count / lookup_count if lookup_count > 0 else 0.0,
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "model_version": self.model_version,
+                # the entry tuples and OrderedDict links are left out, so this is a lower bound
+                "memory_bytes": self.memory_bytes + sys.getsizeof(self.entries)
+            }
+
+
+insurance_prediction_cache = PredictionCache()
+
 
 class InsurancePredictor:
 
-    def __init__(self, model_dir: str):
+    def __init__(self, model_dir: str, prediction_cache: PredictionCache = insurance_prediction_cache,
+                 manifest_file_name: str = MODEL_MANIFEST_FILE_NAME):
+        """
+        model_dir: directory which holds all exported model versions
+        prediction_cache: cache for predict_insurance_data, None disables caching
+        manifest_file_name: name of the manifest written by ModelPusher in model_dir
+        """
         try:
             self.model_dir = model_dir
+            self.prediction_cache = prediction_cache
+            self.manifest_file_path = os.path.join(model_dir, manifest_file_name)
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    def read_model_manifest(self) -> dict:
+        """
+        return: content of the model manifest or None if no model was pushed with a manifest yet
+        """
+        try:
+            if not os.path.exists(self.manifest_file_path):
+                return None
+            return read_yaml_file(file_path=self.manifest_file_path)
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    def find_latest_model_path(self) -> str:
+        """
+        Fallback for export directories without manifest: scans the version folders.
+        Entries which are not version folders are ignored and a compact model is
+        preferred over the dill file.
+        """
+        try:
+            versions = [int(folder_name) for folder_name in os.listdir(self.model_dir)
+                        if folder_name.isdigit() and os.path.isdir(os.path.join(self.model_dir, folder_name))]
+            if len(versions) == 0:
+                raise Exception(f"No exported model found in: [{self.model_dir}]")
+            latest_model_dir = os.path.join(self.model_dir, f"{max(versions)}")
+            compact_model_dir = os.path.join(latest_model_dir, COMPACT_MODEL_DIR_NAME)
+            if is_compact_model_dir(compact_model_dir):
+                return compact_model_dir
+            file_names = sorted(file_name for file_name in os.listdir(latest_model_dir)
+                                if os.path.isfile(os.path.join(latest_model_dir, file_name)))
+            model_file_names = [file_name for file_name in file_names if file_name.endswith(".pkl")]
+            file_name = (model_file_names or file_names)[0]
+            return os.path.join(latest_model_dir, file_name)
         except Exception as e:
             raise InsuranceException(e, sys) from e
 
     def get_latest_model_path(self):
         try:
-            folder_name = list(map(int, os.listdir(self.model_dir)))
-            latest_model_dir = os.path.join(self.model_dir, f"{max(folder_name)}")
-            file_name = os.listdir(latest_model_dir)[0]
-            latest_model_path = os.path.join(latest_model_dir, file_name)
-            return latest_model_path
+            model_manifest = self.read_model_manifest()
+            if model_manifest is not None:
+                compact_model_path = model_manifest.get(MODEL_MANIFEST_COMPACT_MODEL_PATH_KEY)
+                if compact_model_path is not None:
+                    return os.path.join(self.model_dir, compact_model_path)
+                return os.path.join(self.model_dir, model_manifest[MODEL_MANIFEST_MODEL_PATH_KEY])
+            return self.find_latest_model_path()
         except Exception as e:
             raise InsuranceException(e, sys) from e
 
+    def get_model_entry(self) -> dict:
+        try:
+            return insurance_model_cache.get_model_entry(model_dir=self.model_dir,
+                                                         get_latest_model_path=self.get_latest_model_path,
+                                                         manifest_file_path=self.manifest_file_path)
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    def get_model(self):
+        return self.get_model_entry()["model"]
+
+    def start_model_watcher(self, interval_seconds: float = MODEL_WATCH_INTERVAL_SECONDS):
+        """
+        Loads new model versions in the background of this process, see InsuranceModelCache.
+        """
+        try:
+            insurance_model_cache.start_watcher(model_dir=self.model_dir,
+                                                get_latest_model_path=self.get_latest_model_path,
+                                                manifest_file_path=self.manifest_file_path,
+                                                interval_seconds=interval_seconds)
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    def get_model_status(self) -> dict:
+        """
+        return: version of the model served by this process, empty dict while no model is loaded
+        """
+        cached_model = insurance_model_cache.cached_models.get(self.model_dir)
+        if cached_model is None:
+            return {}
+        return {"model_version": cached_model["model_version"],
+                "model_path": cached_model["model_path"],
+                "loaded_at": str(cached_model["loaded_at"]),
+                "is_watched": insurance_model_cache.is_watched(self.model_dir)}
+
+    @staticmethod
+    def get_cache_info() -> dict:
+        return insurance_model_cache.get_cache_info()
+
+    def get_prediction_cache_info(self) -> dict:
+        return self.prediction_cache.get_cache_info() if self.prediction_cache is not None else {}
+
+    @staticmethod
+    def predict_data_frame(model, X) -> np.ndarray:
+        """
+        Runs transform and predict as two timed stages.
+        """
+        with serving_metrics.time_stage(TRANSFORM_STAGE):
+            transformed_feature = model.transform(X)
+        with serving_metrics.time_stage(PREDICT_STAGE):
+            return model.predict_transformed(transformed_feature)
+
     def predict(self, X):
         try:
-            model_path = self.get_latest_model_path()
-            model = load_object(file_path=model_path)
-            expenses_prediction = model.predict(X)
+            model = self.get_model()
+            expenses_prediction = InsurancePredictor.predict_data_frame(model, X)
             return expenses_prediction
         except Exception as e:
-            raise InsuranceException(e, sys) from e
\ No newline at end of file
+            raise InsuranceException(e, sys) from e
+
+    def predict_insurance_data(self, insurance_data_list: list) -> np.ndarray:
+        """
+        insurance_data_list: list of InsuranceData
+        return: predicted expenses, one per record.
+        Records found in the prediction cache skip transform and predict, the
+        remaining ones are scored together in a single call.
+        """
+        try:
+            model_entry = self.get_model_entry()
+            if self.prediction_cache is None:
+                with serving_metrics.time_stage(FRAME_STAGE):
+                    insurance_df = InsuranceData.get_insurance_batch_data_frame(insurance_data_list)
+                return np.asarray(InsurancePredictor.predict_data_frame(model_entry["model"], insurance_df),
+                                  dtype=np.float64)
+
+            model_version = model_entry["model_version"]
+            expenses_prediction = np.empty(len(insurance_data_list), dtype=np.float64)
+            keys = [PredictionCache.get_key(insurance_data) for insurance_data in insurance_data_list]
+            missed_indexes = []
+            for index, key in enumerate(keys):
+                value = self.prediction_cache.get(key, model_version)
+                if value is None:
+                    missed_indexes.append(index)
+                else:
+                    expenses_prediction[index] = value
+
+            if len(missed_indexes) > 0:
+                with serving_metrics.time_stage(FRAME_STAGE):
+                    insurance_df = InsuranceData.get_insurance_batch_data_frame(
+                        [insurance_data_list[index] for index in missed_indexes])
+                missed_prediction = InsurancePredictor.predict_data_frame(model_entry["model"], insurance_df)
+                for index, expenses in zip(missed_indexes, missed_prediction):
+                    expenses_prediction[index] = expenses
+                    self.prediction_cache.put(keys[index], float(expenses), model_version)
+            return expenses_prediction
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    def predict_batch(self, records: list) -> list:
+        """
+        records: list of raw input records (dict)
+        return: list with one dict per record holding either the predicted
+        insurance expenses or the reason why the record was rejected.
+        All valid records are scored with a single transform and predict call.
+        """
+        try:
+            results = []
+            valid_indexes = []
+            insurance_data_list = []
+            for index, record in enumerate(records):
+                try:
+                    insurance_data_list.append(InsuranceData.from_dict(record))
+                    valid_indexes.append(index)
+                    results.append({RECORD_INDEX_KEY: index})
+                except ValueError as e:
+                    results.append({RECORD_INDEX_KEY: index, RECORD_ERROR_KEY: str(e)})
+
+            if len(insurance_data_list) > 0:
+                expenses_prediction = self.predict_insurance_data(insurance_data_list)
+                for index, expenses in zip(valid_indexes, expenses_prediction):
+                    results[index][INSURANCE_EXPENSES_KEY] = float(expenses)
+            return results
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    @staticmethod
+    def read_csv_chunks(csv_file, chunk_size: int, chunk_queue: queue.Queue, stop_event: threading.Event):
+        """
+        Producer for predict_csv: parses the csv file chunk by chunk and hands
+        the chunks over through a bounded queue. Parsing pauses while the queue
+        is full, which keeps memory flat whatever the size of the file.
+        """
+        try:
+            for chunk_df in pd.read_csv(csv_file, chunksize=chunk_size):
+                while not stop_event.is_set():
+                    try:
+                        chunk_queue.put(chunk_df, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop_event.is_set():
+                    return
+            chunk_queue.put(None)
+        except Exception as e:
+            chunk_queue.put(e)
+
+    def predict_csv(self, csv_file, chunk_size: int = PREDICTION_CSV_CHUNK_SIZE):
+        """
+        csv_file: file object of a csv holding the insurance input columns
+        chunk_size: number of rows scored at once
+        return: generator of scored csv text, the first item carries the header.
+        The next chunk is parsed in a background thread while the current one is
+        being scored, so at most PREDICTION_CSV_PREFETCH_CHUNKS + 1 chunks are
+        held in memory at any time.
+        """
+        model = self.get_model()
+        chunk_queue = queue.Queue(maxsize=PREDICTION_CSV_PREFETCH_CHUNKS)
+        stop_event = threading.Event()
+        reader = threading.Thread(target=InsurancePredictor.read_csv_chunks,
+                                  args=(csv_file, chunk_size, chunk_queue, stop_event),
+                                  name="csv-chunk-reader",
+                                  daemon=True)
+        reader.start()
+        try:
+            is_header = True
+            row_count = 0
+            while True:
+                chunk_df = chunk_queue.get()
+                if chunk_df is None:
+                    break
+                if isinstance(chunk_df, Exception):
+                    raise chunk_df
+
+                missing_fields = [field for field in INSURANCE_NUMERICAL_FIELDS + INSURANCE_CATEGORICAL_FIELDS
+                                  if field not in chunk_df.columns]
+                if len(missing_fields) > 0:
+                    raise ValueError(f"csv file is missing columns: {missing_fields}")
+                for field in INSURANCE_NUMERICAL_FIELDS:
+                    chunk_df[field] = pd.to_numeric(chunk_df[field], errors="coerce")
+
+                chunk_df[INSURANCE_EXPENSES_KEY] = InsurancePredictor.predict_data_frame(model, chunk_df)
+                row_count += len(chunk_df)
+                yield chunk_df.to_csv(index=False, header=is_header)
+                is_header = False
+            logging.info(f"Scored [{row_count}] rows from csv file.")
+        finally:
+            # stops the reader thread as well when the client goes away mid stream
+            stop_event.set()
\ No newline at end of file
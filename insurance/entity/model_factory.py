@@ -1,7 +1,7 @@
-from cmath import log
 import importlib
 from pyexpat import model
 import numpy as np
+import scipy.stats
 import yaml
 from insurance.exception import InsuranceException
 import os
@@ -10,13 +10,40 @@ import sys
 from collections import namedtuple
 from typing import List
 from insurance.logger import logging
-from sklearn.metrics import r2_score,mean_squared_error
+import pandas as pd
+from insurance.entity.model_metrics import get_metrics_table
+from sklearn.base import clone
+from sklearn.model_selection import ParameterGrid
+from insurance.entity.parallel_search import ParallelModelSearch
+from insurance.entity.trial_cache import TrialCache, TRIAL_CACHE_MAX_ENTRIES
+from insurance.entity.incremental_trainer import IncrementalTrainer, INCREMENTAL_TRAINING_N_EPOCHS
 GRID_SEARCH_KEY = 'grid_search'
 MODULE_KEY = 'module'
 CLASS_KEY = 'class'
 PARAM_KEY = 'params'
 MODEL_SELECTION_KEY = 'model_selection'
 SEARCH_PARAM_GRID_KEY = "search_param_grid"
+SEARCH_PARAMS_KEY = "search_params"
+PARALLEL_SEARCH_KEY = "parallel_search"
+PARALLEL_SEARCH_ENABLED_KEY = "enabled"
+PARALLEL_SEARCH_N_JOBS_KEY = "n_jobs"
+PARALLEL_SEARCH_CLASS_NAMES = ["GridSearchCV"]
+RANDOMIZED_SEARCH_CLASS_NAMES = ["RandomizedSearchCV", "HalvingRandomSearchCV"]
+HALVING_SEARCH_CLASS_NAMES = ["HalvingGridSearchCV", "HalvingRandomSearchCV"]
+HALVING_SEARCH_ENABLE_MODULE = "sklearn.experimental.enable_halving_search_cv"
+HALVING_SEARCH_RESOURCE_KEY = "resource"
+HALVING_SEARCH_RESOURCE_PARAM_KEYS = ["resource", "max_resources", "min_resources"]
+HALVING_SEARCH_DEFAULT_RESOURCE = "n_samples"
+SEARCH_DISTRIBUTION_KEY = "distribution"
+TRIAL_CACHE_KEY = "trial_cache"
+TRIAL_CACHE_ENABLED_KEY = "enabled"
+TRIAL_CACHE_MAX_ENTRIES_KEY = "max_entries"
+TRIAL_CACHE_CLASS_NAMES = ["GridSearchCV"]
+INCREMENTAL_MODEL_SELECTION_KEY = "incremental_model_selection"
+INCREMENTAL_TRAINING_KEY = "incremental_training"
+INCREMENTAL_TRAINING_N_EPOCHS_KEY = "n_epochs"
+INCREMENTAL_TRAINING_RANDOM_STATE_KEY = "random_state"
+INCREMENTAL_TRAINING_STRATEGY = "partial_fit"
 
 InitializedModelDetail = namedtuple("InitializedModelDetail",
                                     ["model_serial_number", "model", "param_grid_search", "model_name"])
@@ -44,7 +71,7 @@ def evaluate_classification_model(model_list: list, X_train:np.ndarray, y_train:
     pass
 
 
-def evaluate_regression_model(model_list: list, X_train:np.ndarray, y_train:np.ndarray, X_test:np.ndarray, y_test:np.ndarray, base_accuracy:float=0.6) -> MetricInfoArtifact:
+def evaluate_regression_model(model_list: list, X_train:np.ndarray, y_train:np.ndarray, X_test:np.ndarray, y_test:np.ndarray, base_accuracy:float=0.6, metrics_table:pd.DataFrame=None) -> MetricInfoArtifact:
     """
     Description:
     This function compare multiple regression model return best model
@@ -54,6 +81,9 @@ def evaluate_regression_model(model_list: list, X_train:np.ndarray, y_train:np.n
     y_train: Training dataset target feature
     X_test: Testing dataset input feature
     y_test: Testing dataset input feature
+    metrics_table: optional table from get_metrics_table for model_list, the
+    models are only scored when it is not given. With a table, entries of
+    model_list may be None for models scored from cached predictions
     return
     It retured a named tuple
     
@@ -62,29 +92,19 @@ def evaluate_regression_model(model_list: list, X_train:np.ndarray, y_train:np.n
                                  "test_accuracy", "model_accuracy", "index_number"])
     """
     try:
-        
-    
-        index_number = 0
-        metric_info_artifact = None
-        for model in model_list:
-            model_name = str(model)  #getting model name based on model object
-            logging.info(f"{'>>'*30}Started evaluating model: [{type(model).__name__}] {'<<'*30}")
-            
-            #Getting prediction for training and testing dataset
-            print
-            y_train_pred = model.predict(X_train)
-            y_test_pred = model.predict(X_test)
-
-            #Calculating r squared score on training and testing dataset
-            train_acc = r2_score(y_train, y_train_pred)
-            test_acc = r2_score(y_test, y_test_pred)
-            
-            #Calculating mean squared error on training and testing dataset
-            train_rmse = np.sqrt(mean_squared_error(y_train, y_train_pred))
-            test_rmse = np.sqrt(mean_squared_error(y_test, y_test_pred))
+        if metrics_table is None:
+            metrics_table = get_metrics_table(model_list=model_list, X_train=X_train, y_train=y_train,
+                                              X_test=X_test, y_test=y_test)
 
-            # Calculating harmonic mean of train_accuracy and test_accuracy
-            model_accuracy = (2 * (train_acc * test_acc)) / (train_acc + test_acc)
+        metric_info_artifact = None
+        for metrics in metrics_table.itertuples(index=False):
+            index_number = metrics.index_number
+            model = model_list[index_number]
+            logging.info(f"{'>>'*30}Started evaluating model: [{metrics.model_name}] {'<<'*30}")
+
+            train_acc = metrics.train_r2
+            test_acc = metrics.test_r2
+            model_accuracy = metrics.model_accuracy
             diff_test_train_acc = abs(test_acc - train_acc)
             
             #logging all important metric
@@ -94,25 +114,26 @@ def evaluate_regression_model(model_list: list, X_train:np.ndarray, y_train:np.n
 
             logging.info(f"{'>>'*30} Loss {'<<'*30}")
             logging.info(f"Diff test train accuracy: [{diff_test_train_acc}].") 
-            logging.info(f"Train root mean squared error: [{train_rmse}].")
-            logging.info(f"Test root mean squared error: [{test_rmse}].")
+            logging.info(f"Train root mean squared error: [{metrics.train_rmse}].")
+            logging.info(f"Test root mean squared error: [{metrics.test_rmse}].")
+            logging.info(f"Train / test mean absolute error: [{metrics.train_mae}] / [{metrics.test_mae}].")
+            logging.info(f"Train / test mean absolute percentage error: [{metrics.train_mape}] / [{metrics.test_mape}].")
 
 
             #if model accuracy is greater than base accuracy and train and test score is within certain thershold
             #we will accept that model as accepted model
             if model_accuracy >= base_accuracy and diff_test_train_acc < 0.05:
                 base_accuracy = model_accuracy
-                metric_info_artifact = MetricInfoArtifact(model_name=model_name,
+                metric_info_artifact = MetricInfoArtifact(model_name=metrics.model_name,
                                                         model_object=model,
-                                                        train_rmse=train_rmse,
-                                                        test_rmse=test_rmse,
+                                                        train_rmse=metrics.train_rmse,
+                                                        test_rmse=metrics.test_rmse,
                                                         train_accuracy=train_acc,
                                                         test_accuracy=test_acc,
                                                         model_accuracy=model_accuracy,
                                                         index_number=index_number)
 
                 logging.info(f"Acceptable model found {metric_info_artifact}. ")
-            index_number += 1
         if metric_info_artifact is None:
             logging.info(f"No model found with higher accuracy than base accuracy")
         return metric_info_artifact
@@ -132,6 +153,14 @@ def get_sample_model_config_yaml_file(export_dir: str):
                 }
 
             },
+            PARALLEL_SEARCH_KEY: {
+                PARALLEL_SEARCH_ENABLED_KEY: False,
+                PARALLEL_SEARCH_N_JOBS_KEY: -1
+            },
+            TRIAL_CACHE_KEY: {
+                TRIAL_CACHE_ENABLED_KEY: False,
+                TRIAL_CACHE_MAX_ENTRIES_KEY: TRIAL_CACHE_MAX_ENTRIES
+            },
             MODEL_SELECTION_KEY: {
                 "module_0": {
                     MODULE_KEY: "module_of_model",
@@ -157,7 +186,11 @@ def get_sample_model_config_yaml_file(export_dir: str):
 
 
 class ModelFactory:
-    def __init__(self, model_config_path: str = None,):
+    def __init__(self, model_config_path: str = None, trial_cache_file_path: str = None):
+        """
+        trial_cache_file_path: file keeping cross validation results across runs,
+        used when trial_cache is enabled in model.yaml for exhaustive grid searches
+        """
         try:
             self.config: dict = ModelFactory.read_params(model_config_path)
 
@@ -167,8 +200,23 @@ class ModelFactory:
 
             self.models_initialization_config: dict = dict(self.config[MODEL_SELECTION_KEY])
 
+            parallel_search_config: dict = dict(self.config.get(PARALLEL_SEARCH_KEY) or {})
+            self.is_parallel_search_enabled: bool = bool(parallel_search_config.get(PARALLEL_SEARCH_ENABLED_KEY, False))
+            self.parallel_search_n_jobs: int = int(parallel_search_config.get(PARALLEL_SEARCH_N_JOBS_KEY, -1))
+
             self.initialized_model_list = None
             self.grid_searched_best_model_list = None
+            self.search_candidate_timings = None
+            self.search_compute_info = {}
+            self.is_incremental_training = False
+
+            trial_cache_config: dict = dict(self.config.get(TRIAL_CACHE_KEY) or {})
+            self.trial_cache = None
+            if trial_cache_file_path is not None and bool(trial_cache_config.get(TRIAL_CACHE_ENABLED_KEY, False)) \
+                    and self.grid_search_class_name in TRIAL_CACHE_CLASS_NAMES:
+                self.trial_cache = TrialCache(
+                    cache_file_path=trial_cache_file_path,
+                    max_entries=int(trial_cache_config.get(TRIAL_CACHE_MAX_ENTRIES_KEY, TRIAL_CACHE_MAX_ENTRIES)))
 
         except Exception as e:
             raise InsuranceException(e, sys) from e
@@ -198,6 +246,9 @@ class ModelFactory:
     @staticmethod
     def class_for_name(module_name:str, class_name:str):
         try:
+            # halving searches are experimental and have to be enabled before they can be imported
+            if class_name in HALVING_SEARCH_CLASS_NAMES:
+                importlib.import_module(HALVING_SEARCH_ENABLE_MODULE)
             # load the module, will raise ImportError if module cannot be loaded
             module = importlib.import_module(module_name)
             # get the class, will raise AttributeError if class cannot be found
@@ -207,6 +258,152 @@ class ModelFactory:
         except Exception as e:
             raise InsuranceException(e, sys) from e
 
+    @staticmethod
+    def get_param_distributions(param_grid_search: dict) -> dict:
+        """
+        Converts the search_param_grid of a randomized search: a list of values is
+        sampled uniformly, a mapping names a scipy.stats distribution and its arguments
+        e.g. {distribution: randint, low: 2, high: 20} becomes scipy.stats.randint(low=2, high=20)
+        """
+        try:
+            param_distributions = {}
+            for param_name, param_values in param_grid_search.items():
+                if isinstance(param_values, dict):
+                    distribution_args = dict(param_values)
+                    distribution_name = distribution_args.pop(SEARCH_DISTRIBUTION_KEY)
+                    param_distributions[param_name] = getattr(scipy.stats, distribution_name)(**distribution_args)
+                else:
+                    param_distributions[param_name] = param_values
+            return param_distributions
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    def get_search_property_data(self, initialized_model: InitializedModelDetail) -> dict:
+        """
+        return: params of the grid_search class for initialized_model, the params of grid_search
+        in model.yaml updated with the search_params of the model. A halving search whose
+        resource is not a parameter of the estimator, e.g. n_estimators of LinearRegression,
+        falls back to n_samples for that model.
+        """
+        try:
+            model_initialization_config = self.models_initialization_config.get(
+                initialized_model.model_serial_number) or {}
+            search_property_data = dict(self.grid_search_property_data)
+            search_property_data.update(model_initialization_config.get(SEARCH_PARAMS_KEY) or {})
+
+            resource = search_property_data.get(HALVING_SEARCH_RESOURCE_KEY, HALVING_SEARCH_DEFAULT_RESOURCE)
+            if self.grid_search_class_name in HALVING_SEARCH_CLASS_NAMES and \
+                    resource != HALVING_SEARCH_DEFAULT_RESOURCE and \
+                    resource not in initialized_model.model.get_params():
+                logging.info(f"{initialized_model.model_name} has no [{resource}] parameter, "
+                             f"searching it with resource [{HALVING_SEARCH_DEFAULT_RESOURCE}] instead.")
+                for param_key in HALVING_SEARCH_RESOURCE_PARAM_KEYS:
+                    search_property_data.pop(param_key, None)
+            return search_property_data
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    @staticmethod
+    def get_search_compute(search_cv) -> dict:
+        """
+        return: candidates evaluated, cross validation fits and seconds spent fitting
+        by a fitted search, halving searches add the resource used at every iteration
+        """
+        n_splits = int(search_cv.n_splits_)
+        mean_fit_time = np.asarray(search_cv.cv_results_["mean_fit_time"])
+        search_compute = {
+            "n_candidates": int(len(mean_fit_time)),
+            "n_fits": int(len(mean_fit_time) * n_splits),
+            "fit_time": float(np.sum(mean_fit_time) * n_splits),
+        }
+        if hasattr(search_cv, "n_resources_"):
+            search_compute["resource"] = str(search_cv.resource)
+            search_compute["n_resources"] = [int(n_resources) for n_resources in search_cv.n_resources_]
+            search_compute["n_candidates_per_iteration"] = [int(n_candidates)
+                                                            for n_candidates in search_cv.n_candidates_]
+        return search_compute
+
+    def get_search_compute_summary(self) -> dict:
+        """
+        return: compute spent by the searches of all models and per model
+        """
+        return {
+            "n_candidates": sum(info["n_candidates"] for info in self.search_compute_info.values()),
+            "n_fits": sum(info["n_fits"] for info in self.search_compute_info.values()),
+            "fit_time": float(sum(info["fit_time"] for info in self.search_compute_info.values())),
+            "models": dict(self.search_compute_info),
+        }
+
+    def get_search_strategy(self) -> str:
+        if self.is_incremental_training:
+            return INCREMENTAL_TRAINING_STRATEGY
+        if self.is_parallel_search_enabled and self.grid_search_class_name in PARALLEL_SEARCH_CLASS_NAMES:
+            return f"{self.grid_search_class_name} (parallel)"
+        return self.grid_search_class_name
+
+    def execute_cached_grid_search_operation(self, initialized_model: InitializedModelDetail, input_feature,
+                                             output_feature) -> GridSearchedBestModel:
+        """
+        Exhaustive grid search fitting only the candidates missing from the trial
+        cache. The missing candidates are searched as a list of single point grids,
+        the best candidate over cached and new trials is refitted on the whole data.
+        """
+        try:
+            search_property_data = self.get_search_property_data(initialized_model)
+            cv = search_property_data.get("cv", 5)
+            scoring = search_property_data.get("scoring")
+            data_hash = TrialCache.get_data_hash(input_feature, output_feature)
+            candidates = list(ParameterGrid(initialized_model.param_grid_search))
+            trial_keys = [TrialCache.get_trial_key(initialized_model.model, params, cv, scoring, data_hash)
+                          for params in candidates]
+            trials = [self.trial_cache.get(trial_key) for trial_key in trial_keys]
+            missing_indexes = [index for index, trial in enumerate(trials) if trial is None]
+            logging.info(f"[{len(candidates) - len(missing_indexes)}] of [{len(candidates)}] candidates of "
+                         f"{initialized_model.model_name} found in the trial cache.")
+
+            search_compute = {"n_candidates": len(candidates), "n_fits": 0, "fit_time": 0.0,
+                              "n_cached_candidates": len(candidates) - len(missing_indexes)}
+            if len(missing_indexes) > 0:
+                grid_search_cv_ref = ModelFactory.class_for_name(module_name=self.grid_search_cv_module,
+                                                                 class_name=self.grid_search_class_name)
+                param_grid = [{name: [value] for name, value in candidates[index].items()}
+                              for index in missing_indexes]
+                grid_search_cv = grid_search_cv_ref(estimator=initialized_model.model, param_grid=param_grid)
+                grid_search_cv = ModelFactory.update_property_of_class(grid_search_cv, search_property_data)
+                # the best candidate may be a cached one, it is refitted below
+                grid_search_cv.refit = False
+                grid_search_cv.fit(input_feature, output_feature)
+
+                cv_results = grid_search_cv.cv_results_
+                for position, index in enumerate(missing_indexes):
+                    if cv_results["params"][position] != candidates[index]:
+                        raise Exception(f"Unexpected order of grid search results: {cv_results['params']}")
+                    trial = {key: cv_results[key][position] for key in
+                             ["mean_test_score", "std_test_score", "mean_fit_time", "mean_score_time"]}
+                    self.trial_cache.put(trial_keys[index], trial)
+                    trials[index] = trial
+                fit_search_compute = ModelFactory.get_search_compute(grid_search_cv)
+                search_compute["n_fits"] = fit_search_compute["n_fits"]
+                search_compute["fit_time"] = fit_search_compute["fit_time"]
+            self.trial_cache.save()
+
+            scores = np.array([trial["mean_test_score"] for trial in trials], dtype=np.float64)
+            if np.all(np.isnan(scores)):
+                raise Exception(f"Every candidate of {initialized_model.model_name} failed to fit.")
+            best_index = int(np.nanargmax(scores))
+            best_model = clone(initialized_model.model).set_params(**candidates[best_index])
+            best_model.fit(input_feature, output_feature)
+
+            self.search_compute_info[initialized_model.model_serial_number] = search_compute
+            logging.info(f"Search compute of {initialized_model.model_name}: {search_compute}")
+            return GridSearchedBestModel(model_serial_number=initialized_model.model_serial_number,
+                                         model=initialized_model.model,
+                                         best_model=best_model,
+                                         best_parameters=candidates[best_index],
+                                         best_score=float(scores[best_index]))
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
     def execute_grid_search_operation(self, initialized_model: InitializedModelDetail, input_feature,
                                       output_feature) -> GridSearchedBestModel:
         """
@@ -220,6 +417,10 @@ class ModelFactory:
         return: Function will return GridSearchOperation object
         """
         try:
+            if self.trial_cache is not None:
+                return self.execute_cached_grid_search_operation(initialized_model=initialized_model,
+                                                                 input_feature=input_feature,
+                                                                 output_feature=output_feature)
             # instantiating GridSearchCV class
             
            
@@ -227,16 +428,25 @@ class ModelFactory:
                                                              class_name=self.grid_search_class_name
                                                              )
 
-            grid_search_cv = grid_search_cv_ref(estimator=initialized_model.model,
-                                                param_grid=initialized_model.param_grid_search)
-            grid_search_cv = ModelFactory.update_property_of_class(grid_search_cv,
-                                                                   self.grid_search_property_data)
+            # randomized searches sample param_distributions, exhaustive and halving grids take param_grid
+            if self.grid_search_class_name in RANDOMIZED_SEARCH_CLASS_NAMES:
+                param_search = {"param_distributions": ModelFactory.get_param_distributions(
+                    initialized_model.param_grid_search)}
+            else:
+                param_search = {"param_grid": initialized_model.param_grid_search}
+            grid_search_cv = grid_search_cv_ref(estimator=initialized_model.model, **param_search)
+            grid_search_cv = ModelFactory.update_property_of_class(
+                grid_search_cv, self.get_search_property_data(initialized_model))
 
             
             message = f'{">>"* 30} f"Training {type(initialized_model.model).__name__} Started." {"<<"*30}'
             logging.info(message)
             grid_search_cv.fit(input_feature, output_feature)
             message = f'{">>"* 30} f"Training {type(initialized_model.model).__name__}" completed {"<<"*30}'
+            self.search_compute_info[initialized_model.model_serial_number] = \
+                ModelFactory.get_search_compute(grid_search_cv)
+            logging.info(f"Search compute of {initialized_model.model_name}: "
+                         f"{self.search_compute_info[initialized_model.model_serial_number]}")
             grid_searched_best_model = GridSearchedBestModel(model_serial_number=initialized_model.model_serial_number,
                                                              model=initialized_model.model,
                                                              best_model=grid_search_cv.best_estimator_,
@@ -248,16 +458,19 @@ class ModelFactory:
         except Exception as e:
             raise InsuranceException(e, sys) from e
 
-    def get_initialized_model_list(self) -> List[InitializedModelDetail]:
+    def get_initialized_model_list(self, models_initialization_config: dict = None) -> List[InitializedModelDetail]:
         """
         This function will return a list of model details.
+        models_initialization_config: model_selection section of model.yaml by default
         return List[ModelDetail]
         """
         try:
+            if models_initialization_config is None:
+                models_initialization_config = self.models_initialization_config
             initialized_model_list = []
-            for model_serial_number in self.models_initialization_config.keys():
+            for model_serial_number in models_initialization_config.keys():
 
-                model_initialization_config = self.models_initialization_config[model_serial_number]
+                model_initialization_config = models_initialization_config[model_serial_number]
                 model_obj_ref = ModelFactory.class_for_name(module_name=model_initialization_config[MODULE_KEY],
                                                             class_name=model_initialization_config[CLASS_KEY]
                                                             )
@@ -268,7 +481,7 @@ class ModelFactory:
                     model = ModelFactory.update_property_of_class(instance_ref=model,
                                                                   property_data=model_obj_property_data)
 
-                param_grid_search = model_initialization_config[SEARCH_PARAM_GRID_KEY]
+                param_grid_search = model_initialization_config.get(SEARCH_PARAM_GRID_KEY, {})
                 model_name = f"{model_initialization_config[MODULE_KEY]}.{model_initialization_config[CLASS_KEY]}"
 
                 model_initialization_config = InitializedModelDetail(model_serial_number=model_serial_number,
@@ -310,6 +523,13 @@ class ModelFactory:
                                                               output_feature) -> List[GridSearchedBestModel]:
 
         try:
+            if self.is_parallel_search_enabled:
+                if self.grid_search_class_name in PARALLEL_SEARCH_CLASS_NAMES:
+                    return self.execute_parallel_search_operation(initialized_model_list=initialized_model_list,
+                                                                  input_feature=input_feature,
+                                                                  output_feature=output_feature)
+                logging.info(f"Parallel search does not support [{self.grid_search_class_name}], "
+                             f"searching models one at a time.")
             self.grid_searched_best_model_list = []
             for initialized_model_list in initialized_model_list:
                 grid_searched_best_model = self.initiate_best_parameter_search_for_initialized_model(
@@ -322,6 +542,98 @@ class ModelFactory:
         except Exception as e:
             raise InsuranceException(e, sys) from e
 
+    def execute_parallel_search_operation(self, initialized_model_list: List[InitializedModelDetail],
+                                          input_feature, output_feature) -> List[GridSearchedBestModel]:
+        """
+        Searches all initialized models at once, (model, params, fold) fits are
+        spread over one process pool limited to parallel_search n_jobs cores.
+        Per candidate scores and fit timings are kept in search_candidate_timings.
+        return: List[GridSearchedBestModel] in the order of initialized_model_list
+        """
+        try:
+            # every grid_search param is either honored by the parallel search or refused
+            model_search_params = {}
+            for initialized_model in initialized_model_list:
+                search_property_data = self.get_search_property_data(initialized_model)
+                ParallelModelSearch.check_search_params(search_property_data)
+                model_search_params[initialized_model.model_serial_number] = search_property_data
+            parallel_model_search = ParallelModelSearch(n_jobs=self.parallel_search_n_jobs,
+                                                        cv=self.grid_search_property_data.get("cv", 5),
+                                                        scoring=self.grid_search_property_data.get("scoring"),
+                                                        trial_cache=self.trial_cache,
+                                                        model_search_params=model_search_params,
+                                                        error_score=self.grid_search_property_data.get(
+                                                            "error_score", np.nan),
+                                                        verbose=self.grid_search_property_data.get("verbose", 0))
+            search_results, self.search_candidate_timings = parallel_model_search.search(
+                initialized_model_list=initialized_model_list,
+                input_feature=input_feature,
+                output_feature=output_feature)
+
+            self.grid_searched_best_model_list = []
+            for initialized_model in initialized_model_list:
+                best_model, best_parameters, best_score = search_results[initialized_model.model_serial_number]
+                self.grid_searched_best_model_list.append(
+                    GridSearchedBestModel(model_serial_number=initialized_model.model_serial_number,
+                                          model=initialized_model.model,
+                                          best_model=best_model,
+                                          best_parameters=best_parameters,
+                                          best_score=best_score))
+            for initialized_model in initialized_model_list:
+                timings = [timing for timing in self.search_candidate_timings
+                           if timing.model_serial_number == initialized_model.model_serial_number]
+                self.search_compute_info[initialized_model.model_serial_number] = {
+                    "n_candidates": len(timings),
+                    "n_fits": sum(timing.n_folds for timing in timings),
+                    "fit_time": float(sum(timing.total_fit_time for timing in timings)),
+                    "n_cached_candidates": sum(1 for timing in timings if timing.n_folds == 0),
+                }
+            for timing in self.search_candidate_timings:
+                logging.info(f"Candidate {timing.model_name} {timing.params}: score [{timing.mean_test_score}] "
+                             f"mean fit time [{timing.mean_fit_time:.3f}] seconds")
+            return self.grid_searched_best_model_list
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    def train_incremental_models(self, train_file_path: str) -> List[GridSearchedBestModel]:
+        """
+        Trains the models of incremental_model_selection in model.yaml chunk by
+        chunk, see IncrementalTrainer. There is no parameter search, every model
+        is trained once with its params.
+        train_file_path: manifest of the transformed training chunks
+        return: List[GridSearchedBestModel], best_score is nan since no cross validation runs
+        """
+        try:
+            if INCREMENTAL_MODEL_SELECTION_KEY not in self.config:
+                raise Exception(f"[{INCREMENTAL_MODEL_SELECTION_KEY}] is required in model.yaml for streaming mode.")
+            incremental_training_config: dict = dict(self.config.get(INCREMENTAL_TRAINING_KEY) or {})
+            incremental_trainer = IncrementalTrainer(
+                n_epochs=int(incremental_training_config.get(INCREMENTAL_TRAINING_N_EPOCHS_KEY,
+                                                             INCREMENTAL_TRAINING_N_EPOCHS)),
+                random_state=incremental_training_config.get(INCREMENTAL_TRAINING_RANDOM_STATE_KEY, 42))
+
+            self.is_incremental_training = True
+            initialized_model_list = self.get_initialized_model_list(
+                models_initialization_config=dict(self.config[INCREMENTAL_MODEL_SELECTION_KEY]))
+            fitted_models, training_compute = incremental_trainer.fit(
+                models=[initialized_model.model for initialized_model in initialized_model_list],
+                manifest_file_path=train_file_path)
+
+            self.grid_searched_best_model_list = []
+            for initialized_model, fitted_model, model_compute in zip(initialized_model_list, fitted_models,
+                                                                       training_compute):
+                self.search_compute_info[initialized_model.model_serial_number] = {"n_candidates": 1, **model_compute}
+                logging.info(f"Training compute of {initialized_model.model_name}: {model_compute}")
+                self.grid_searched_best_model_list.append(
+                    GridSearchedBestModel(model_serial_number=initialized_model.model_serial_number,
+                                          model=initialized_model.model,
+                                          best_model=fitted_model,
+                                          best_parameters={},
+                                          best_score=float("nan")))
+            return self.grid_searched_best_model_list
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
     @staticmethod
     def get_model_detail(model_details: List[InitializedModelDetail],
                          model_serial_number: str) -> InitializedModelDetail:
@@ -0,0 +1,191 @@
+from insurance.exception import InsuranceException
+from insurance.logger import logging
+
+import os
+import sys
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+TRAIN_DATASET = "train"
+TEST_DATASET = "test"
+REGRESSION_METRIC_NAMES = ["r2", "rmse", "mae", "mape"]
+METRICS_TABLE_MAX_WORKERS = 8
+
+RegressionMetrics = namedtuple("RegressionMetrics", REGRESSION_METRIC_NAMES)
+
+
+class RegressionTarget:
+    """
+    Target vector with everything the metrics need from it computed once, so
+    scoring a prediction vector is a single pass over its residuals whatever
+    the number of candidates.
+    """
+
+    def __init__(self, y_true):
+        self.y_true = np.asarray(y_true, dtype=np.float64).ravel()
+        self.n_samples = len(self.y_true)
+        centered = self.y_true - self.y_true.mean()
+        self.total_sum_of_squares = float(np.dot(centered, centered))
+        # same epsilon as sklearn's mean_absolute_percentage_error
+        self.inverse_abs_true = 1.0 / np.maximum(np.abs(self.y_true), np.finfo(np.float64).eps)
+
+    def get_metrics(self, y_pred) -> RegressionMetrics:
+        residual = np.asarray(y_pred, dtype=np.float64).ravel() - self.y_true
+        sum_of_squares = float(np.dot(residual, residual))
+        abs_residual = np.abs(residual)
+        if self.total_sum_of_squares > 0:
+            r2 = 1.0 - sum_of_squares / self.total_sum_of_squares
+        else:
+            # constant target, sklearn's r2_score convention
+            r2 = 1.0 if sum_of_squares == 0 else 0.0
+        return RegressionMetrics(r2=r2,
+                                 rmse=float(np.sqrt(sum_of_squares / self.n_samples)),
+                                 mae=float(abs_residual.sum() / self.n_samples),
+                                 mape=float(np.dot(abs_residual, self.inverse_abs_true) / self.n_samples))
+
+
+class RegressionMetricsAccumulator:
+    """
+    Same metrics as RegressionTarget for targets and predictions that arrive in
+    chunks. Target moments are merged chunk by chunk so r2 does not suffer from
+    cancellation on long datasets.
+    """
+
+    def __init__(self):
+        self.n_samples = 0
+        self.y_true_mean = 0.0
+        self.y_true_m2 = 0.0
+        self.sum_of_squares = 0.0
+        self.sum_of_abs_residual = 0.0
+        self.sum_of_abs_percentage = 0.0
+
+    def update(self, y_true, y_pred):
+        y_true = np.asarray(y_true, dtype=np.float64).ravel()
+        if len(y_true) == 0:
+            return
+        residual = np.asarray(y_pred, dtype=np.float64).ravel() - y_true
+        abs_residual = np.abs(residual)
+        self.sum_of_squares += float(np.dot(residual, residual))
+        self.sum_of_abs_residual += float(abs_residual.sum())
+        # same epsilon as sklearn's mean_absolute_percentage_error
+        self.sum_of_abs_percentage += float(np.dot(abs_residual,
+                                                   1.0 / np.maximum(np.abs(y_true), np.finfo(np.float64).eps)))
+        chunk_mean = float(y_true.mean())
+        centered = y_true - chunk_mean
+        n_samples = self.n_samples + len(y_true)
+        delta = chunk_mean - self.y_true_mean
+        self.y_true_m2 += float(np.dot(centered, centered)) + delta ** 2 * self.n_samples * len(y_true) / n_samples
+        self.y_true_mean += delta * len(y_true) / n_samples
+        self.n_samples = n_samples
+
+    def get_metrics(self) -> RegressionMetrics:
+        if self.y_true_m2 > 0:
+            r2 = 1.0 - self.sum_of_squares / self.y_true_m2
+        else:
+            # constant target, sklearn's r2_score convention
+            r2 = 1.0 if self.sum_of_squares == 0 else 0.0
+        return RegressionMetrics(r2=r2,
+                                 rmse=float(np.sqrt(self.sum_of_squares / self.n_samples)),
+                                 mae=self.sum_of_abs_residual / self.n_samples,
+                                 mape=self.sum_of_abs_percentage / self.n_samples)
+
+
+def get_model_accuracy(train_accuracy: float, test_accuracy: float) -> float:
+    """
+    return: harmonic mean of train and test r2
+    """
+    return (2 * (train_accuracy * test_accuracy)) / (train_accuracy + test_accuracy)
+
+
+def get_predictions(model_list: list, X_train, X_test, max_workers: int = None) -> list:
+    """
+    Predicts both datasets with every model, predictions run concurrently in a thread pool.
+    return: [{"train": y_pred, "test": y_pred}] in model_list order
+    """
+    try:
+        features = {TRAIN_DATASET: X_train, TEST_DATASET: X_test}
+        tasks = [(index_number, dataset) for index_number in range(len(model_list)) for dataset in features]
+        if max_workers is None:
+            max_workers = min(len(tasks), os.cpu_count() or 1, METRICS_TABLE_MAX_WORKERS)
+        with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="model-metrics") as executor:
+            task_predictions = executor.map(lambda task: model_list[task[0]].predict(features[task[1]]), tasks)
+            predictions = [{} for _ in model_list]
+            for (index_number, dataset), y_pred in zip(tasks, task_predictions):
+                predictions[index_number][dataset] = y_pred
+        return predictions
+    except Exception as e:
+        raise InsuranceException(e, sys) from e
+
+
+def get_metrics_table_from_predictions(model_names: list, predictions: list, y_train, y_test) -> pd.DataFrame:
+    """
+    model_names: name of every model, index_number of a row is its position in this list
+    predictions: [{"train": y_pred, "test": y_pred}] as returned by get_predictions
+    return: one row per model with model_name, index_number, train_/test_ r2, rmse, mae, mape and model_accuracy
+    """
+    try:
+        targets = {TRAIN_DATASET: RegressionTarget(y_train), TEST_DATASET: RegressionTarget(y_test)}
+        return get_metrics_table_from_metrics(model_names=model_names, metrics=[
+            {dataset: target.get_metrics(model_predictions[dataset]) for dataset, target in targets.items()}
+            for model_predictions in predictions])
+    except Exception as e:
+        raise InsuranceException(e, sys) from e
+
+
+def get_metrics_table_from_metrics(model_names: list, metrics: list) -> pd.DataFrame:
+    """
+    metrics: [{"train": RegressionMetrics, "test": RegressionMetrics}] in model_names order
+    """
+    rows = []
+    for index_number, (model_name, model_metrics) in enumerate(zip(model_names, metrics)):
+        row = {"model_name": model_name, "index_number": index_number}
+        for dataset in (TRAIN_DATASET, TEST_DATASET):
+            for metric_name, value in model_metrics[dataset]._asdict().items():
+                row[f"{dataset}_{metric_name}"] = value
+        row["model_accuracy"] = get_model_accuracy(row["train_r2"], row["test_r2"])
+        rows.append(row)
+    metrics_table = pd.DataFrame(rows)
+    logging.info(f"Metrics table:\n{metrics_table.to_string(index=False)}")
+    return metrics_table
+
+
+def get_metrics_table_from_chunks(model_list: list, train_chunks, test_chunks, model_names: list = None) \
+        -> pd.DataFrame:
+    """
+    Scores every model on datasets larger than memory, each chunk is read once
+    and predicted by all models.
+    train_chunks, test_chunks: iterables of (X, y) chunks
+    model_names: defaults to str(model)
+    return: same table as get_metrics_table
+    """
+    try:
+        if model_names is None:
+            model_names = [str(model) for model in model_list]
+        accumulators = [{dataset: RegressionMetricsAccumulator() for dataset in (TRAIN_DATASET, TEST_DATASET)}
+                        for _ in model_list]
+        for dataset, chunks in ((TRAIN_DATASET, train_chunks), (TEST_DATASET, test_chunks)):
+            for X, y in chunks:
+                for model, model_accumulators in zip(model_list, accumulators):
+                    model_accumulators[dataset].update(y, model.predict(X))
+        return get_metrics_table_from_metrics(model_names=model_names, metrics=[
+            {dataset: accumulator.get_metrics() for dataset, accumulator in model_accumulators.items()}
+            for model_accumulators in accumulators])
+    except Exception as e:
+        raise InsuranceException(e, sys) from e
+
+
+def get_metrics_table(model_list: list, X_train, y_train, X_test, y_test, max_workers: int = None) -> pd.DataFrame:
+    """
+    Scores every model on both datasets, see get_predictions and get_metrics_table_from_predictions.
+    model_list: list of fitted models
+    return: one row per model in model_list order
+    """
+    try:
+        predictions = get_predictions(model_list=model_list, X_train=X_train, X_test=X_test, max_workers=max_workers)
+        return get_metrics_table_from_predictions(model_names=[str(model) for model in model_list],
+                                                  predictions=predictions, y_train=y_train, y_test=y_test)
+    except Exception as e:
+        raise InsuranceException(e, sys) from e
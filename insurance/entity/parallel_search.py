@@ -0,0 +1,324 @@
+from insurance.exception import InsuranceException
+from insurance.logger import logging
+
+import os
+import sys
+import time
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from sklearn.base import clone, is_classifier
+from sklearn.metrics import check_scoring
+from sklearn.model_selection import ParameterGrid, check_cv
+from threadpoolctl import threadpool_limits
+
+from insurance.entity.trial_cache import TrialCache
+from insurance.entity.shared_array import SharedArrayStore, attach_shared_array, get_shared_array_file_path
+
+# the search runs next to the dag executor and web worker threads, a forked worker could inherit a lock
+# held by one of them (logging, blas/openmp) and deadlock. Forkserver workers are forked from a single
+# threaded server process instead, the training data is memory mapped so fork's copy on write is not
+# needed. Workers append to the log file of the parent, see insurance.logger.
+PARALLEL_SEARCH_MP_CONTEXT = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def get_search_mp_context():
+    mp_context = multiprocessing.get_context(PARALLEL_SEARCH_MP_CONTEXT)
+    if PARALLEL_SEARCH_MP_CONTEXT == "forkserver":
+        # imported once by the server, workers forked from it start with sklearn already loaded
+        mp_context.set_forkserver_preload([__name__])
+    return mp_context
+
+# GridSearchCV params the parallel search honors, refit only as True, any other param is refused
+PARALLEL_SEARCH_PARAM_KEYS = ["cv", "scoring", "error_score", "verbose", "refit"]
+
+SearchCandidate = namedtuple("SearchCandidate", ["model_serial_number", "model_name", "candidate_index", "params"])
+
+SearchCandidateTiming = namedtuple("SearchCandidateTiming", ["model_serial_number", "model_name", "params",
+                                                             "mean_test_score", "std_test_score", "mean_fit_time",
+                                                             "mean_score_time", "total_fit_time", "n_folds"])
+
+# training data of a search worker, set once per process by init_search_worker
+search_worker_data = {}
+
+
+def get_core_budget(n_jobs: int = -1) -> int:
+    """
+    n_jobs: number of worker processes, -1 uses every core available to this process
+    """
+    if hasattr(os, "sched_getaffinity"):
+        available_cores = len(os.sched_getaffinity(0))
+    else:
+        available_cores = os.cpu_count() or 1
+    if n_jobs is None or n_jobs < 1:
+        return available_cores
+    return min(n_jobs, available_cores)
+
+
+def init_search_worker(input_feature_file_path: str, output_feature_file_path: str):
+    """
+    Runs once in every worker process: attaches to the memory mapped training
+    data shared by all workers and limits blas/openmp to a single thread, the
+    pool itself already uses the whole core budget.
+    """
+    search_worker_data["input_feature"] = attach_shared_array(input_feature_file_path)
+    search_worker_data["output_feature"] = attach_shared_array(output_feature_file_path)
+    search_worker_data["threadpool_limits"] = threadpool_limits(limits=1)
+
+
+def get_single_threaded_estimator(estimator, params: dict):
+    estimator = clone(estimator).set_params(**params)
+    if "n_jobs" in estimator.get_params():
+        estimator.set_params(n_jobs=1)
+    return estimator
+
+
+def fit_search_candidate(estimator, params: dict, train_index: np.ndarray, test_index: np.ndarray,
+                         scoring, error_score=np.nan) -> tuple:
+    """
+    Fits one (candidate, fold) pair in a worker process.
+    error_score: score of a failed fit, "raise" raises the error like GridSearchCV
+    return: test score, fit time and score time
+    """
+    X, y = search_worker_data["input_feature"], search_worker_data["output_feature"]
+    estimator = get_single_threaded_estimator(estimator, params)
+    start = time.perf_counter()
+    try:
+        estimator.fit(X[train_index], y[train_index])
+    except Exception as e:
+        if isinstance(error_score, str) and error_score == "raise":
+            raise
+        logging.info(f"Fitting {type(estimator).__name__} with {params} failed: {e}")
+        return error_score, time.perf_counter() - start, 0.0
+    fit_time = time.perf_counter() - start
+    start = time.perf_counter()
+    score = check_scoring(estimator, scoring=scoring)(estimator, X[test_index], y[test_index])
+    return score, fit_time, time.perf_counter() - start
+
+
+def refit_search_candidate(estimator, params: dict):
+    """
+    Fits the best candidate of a model on the whole training data.
+    return: fitted estimator with its original n_jobs restored for prediction
+    """
+    X, y = search_worker_data["input_feature"], search_worker_data["output_feature"]
+    fitted_estimator = get_single_threaded_estimator(estimator, params).fit(X, y)
+    if "n_jobs" in fitted_estimator.get_params():
+        fitted_estimator.set_params(n_jobs=estimator.get_params()["n_jobs"])
+    return fitted_estimator
+
+
+class ParallelModelSearch:
+    """
+    Exhaustive parameter search of several models over one shared process pool.
+
+    Every (model, parameter combination, fold) triple is a separate task, so
+    all models of model.yaml are searched at once instead of one after the
+    other. Workers map the training data from a shared .npy file in the pool
+    initializer and fit single threaded estimators, so the number of busy
+    cores never exceeds the core budget. Scores follow GridSearchCV: the mean
+    fold score decides, ties go to the first candidate. Candidates found in the
+    optional TrialCache are not fitted again.
+    """
+
+    def __init__(self, n_jobs: int = -1, cv=5, scoring=None, trial_cache=None, model_search_params: dict = None,
+                 error_score=np.nan, verbose: int = 0):
+        """
+        model_search_params: {model_serial_number: GridSearchCV params} overriding cv, scoring,
+        error_score and verbose for single models, see check_search_params
+        verbose: 1 logs the fits of every model, 2 and above every fold as well
+        """
+        self.n_jobs = n_jobs
+        self.cv = cv
+        self.scoring = scoring
+        self.trial_cache = trial_cache
+        self.model_search_params = model_search_params or {}
+        self.error_score = error_score
+        self.verbose = verbose
+
+    @staticmethod
+    def check_search_params(search_params: dict):
+        """
+        Raises for GridSearchCV params which the parallel search cannot honor.
+        """
+        unsupported_keys = [key for key in search_params if key not in PARALLEL_SEARCH_PARAM_KEYS]
+        if len(unsupported_keys) > 0:
+            raise Exception(f"Parallel search does not support the grid search params {unsupported_keys}, "
+                            f"supported params are {PARALLEL_SEARCH_PARAM_KEYS}. Remove them or disable "
+                            f"parallel_search in model.yaml.")
+        if search_params.get("refit", True) is not True:
+            raise Exception(f"Parallel search always refits the best candidate, refit: "
+                            f"[{search_params['refit']}] is not supported.")
+
+    def get_search_param(self, model_serial_number: str, key: str, default):
+        return self.model_search_params.get(model_serial_number, {}).get(key, default)
+
+    def get_cv(self, model_serial_number: str):
+        return self.get_search_param(model_serial_number, "cv", self.cv)
+
+    def get_scoring(self, model_serial_number: str):
+        return self.get_search_param(model_serial_number, "scoring", self.scoring)
+
+    def get_cached_trials(self, models: dict, candidates: list, X: np.ndarray, y: np.ndarray) -> tuple:
+        """
+        return: trial keys of all candidates and {candidate number: cached trial}
+        """
+        if self.trial_cache is None:
+            return [None] * len(candidates), {}
+        data_hash = TrialCache.get_data_hash(X, y)
+        trial_keys = [TrialCache.get_trial_key(models[candidate.model_serial_number], candidate.params,
+                                               self.get_cv(candidate.model_serial_number),
+                                               self.get_scoring(candidate.model_serial_number), data_hash)
+                      for candidate in candidates]
+        cached_trials = {}
+        for candidate_number, trial_key in enumerate(trial_keys):
+            trial = self.trial_cache.get(trial_key)
+            if trial is not None:
+                cached_trials[candidate_number] = trial
+        logging.info(f"[{len(cached_trials)}] of [{len(candidates)}] candidates found in the trial cache.")
+        return trial_keys, cached_trials
+
+    def get_candidates(self, initialized_model_list: list) -> list:
+        candidates = []
+        for initialized_model in initialized_model_list:
+            for candidate_index, params in enumerate(ParameterGrid(initialized_model.param_grid_search)):
+                candidates.append(SearchCandidate(model_serial_number=initialized_model.model_serial_number,
+                                                  model_name=initialized_model.model_name,
+                                                  candidate_index=candidate_index,
+                                                  params=params))
+        return candidates
+
+    @staticmethod
+    def get_candidate_timing(candidate: SearchCandidate, fold_results: list) -> SearchCandidateTiming:
+        """
+        fold_results: (score, fit time, score time) of every fold of the candidate
+        """
+        results = np.array(fold_results)
+        return SearchCandidateTiming(model_serial_number=candidate.model_serial_number,
+                                     model_name=candidate.model_name,
+                                     params=candidate.params,
+                                     mean_test_score=float(np.mean(results[:, 0])),
+                                     std_test_score=float(np.std(results[:, 0])),
+                                     mean_fit_time=float(np.mean(results[:, 1])),
+                                     mean_score_time=float(np.mean(results[:, 2])),
+                                     total_fit_time=float(np.sum(results[:, 1])),
+                                     n_folds=len(results))
+
+    def search(self, initialized_model_list: list, input_feature, output_feature) -> tuple:
+        """
+        initialized_model_list: List[InitializedModelDetail]
+        return: {model_serial_number: (best_model, best_parameters, best_score)} and
+        List[SearchCandidateTiming] of every candidate
+        """
+        shared_array_store = None
+        try:
+            # arrays shared by the caller are attached to as they are, others are shared for this search only
+            input_feature_file_path = get_shared_array_file_path(input_feature)
+            output_feature_file_path = get_shared_array_file_path(output_feature)
+            if input_feature_file_path is None or output_feature_file_path is None:
+                shared_array_store = SharedArrayStore()
+                input_feature = shared_array_store.share("input_feature", np.asarray(input_feature))
+                output_feature = shared_array_store.share("output_feature", np.asarray(output_feature))
+                input_feature_file_path = input_feature.filename
+                output_feature_file_path = output_feature.filename
+            X = input_feature
+            y = output_feature
+            models = {model.model_serial_number: model.model for model in initialized_model_list}
+            candidates = self.get_candidates(initialized_model_list)
+            splits = {}
+            for serial_number, model in models.items():
+                cv = check_cv(self.get_cv(serial_number), y, classifier=is_classifier(model))
+                splits[serial_number] = list(cv.split(X, y))
+            trial_keys, cached_trials = self.get_cached_trials(models, candidates, X, y)
+            for initialized_model in initialized_model_list:
+                serial_number = initialized_model.model_serial_number
+                n_candidates = sum(1 for candidate_number, candidate in enumerate(candidates)
+                                   if candidate.model_serial_number == serial_number
+                                   and candidate_number not in cached_trials)
+                if self.get_search_param(serial_number, "verbose", self.verbose) >= 1:
+                    logging.info(f"Fitting [{len(splits[serial_number])}] folds for each of [{n_candidates}] "
+                                 f"candidates of {initialized_model.model_name}, totalling "
+                                 f"[{n_candidates * len(splits[serial_number])}] fits")
+
+            tasks = [(candidate_number, candidate, fold_index, train_index, test_index)
+                     for candidate_number, candidate in enumerate(candidates) if candidate_number not in cached_trials
+                     for fold_index, (train_index, test_index) in enumerate(splits[candidate.model_serial_number])]
+            max_workers = max(1, min(get_core_budget(self.n_jobs), max(len(tasks), len(models))))
+            logging.info(f"Parallel search of [{len(candidates)}] candidates in [{len(tasks)}] fits "
+                         f"over [{max_workers}] processes.")
+
+            fold_results = {}
+            with ProcessPoolExecutor(max_workers=max_workers,
+                                     mp_context=get_search_mp_context(),
+                                     initializer=init_search_worker,
+                                     initargs=(input_feature_file_path, output_feature_file_path)) as executor:
+                futures = {executor.submit(fit_search_candidate, models[candidate.model_serial_number],
+                                           candidate.params, train_index, test_index,
+                                           self.get_scoring(candidate.model_serial_number),
+                                           self.get_search_param(candidate.model_serial_number, "error_score",
+                                                                 self.error_score)):
+                           (candidate_number, fold_index)
+                           for candidate_number, candidate, fold_index, train_index, test_index in tasks}
+                for future in as_completed(futures):
+                    candidate_number, fold_index = futures[future]
+                    fold_results[(candidate_number, fold_index)] = future.result()
+                    candidate = candidates[candidate_number]
+                    if self.get_search_param(candidate.model_serial_number, "verbose", self.verbose) >= 2:
+                        score, fit_time, _ = fold_results[(candidate_number, fold_index)]
+                        logging.info(f"[CV {fold_index + 1}/{len(splits[candidate.model_serial_number])}] END "
+                                     f"{candidate.model_name} {candidate.params}; score: [{score}] "
+                                     f"fit time: [{fit_time:.3f}] seconds")
+
+                candidate_timings = []
+                best_candidates = {}
+                for candidate_number, candidate in enumerate(candidates):
+                    if candidate_number in cached_trials:
+                        trial = cached_trials[candidate_number]
+                        timing = SearchCandidateTiming(model_serial_number=candidate.model_serial_number,
+                                                       model_name=candidate.model_name,
+                                                       params=candidate.params,
+                                                       mean_test_score=trial["mean_test_score"],
+                                                       std_test_score=trial["std_test_score"],
+                                                       mean_fit_time=trial["mean_fit_time"],
+                                                       mean_score_time=trial["mean_score_time"],
+                                                       total_fit_time=0.0,
+                                                       n_folds=0)
+                    else:
+                        timing = self.get_candidate_timing(candidate, [
+                            fold_results[(candidate_number, fold_index)]
+                            for fold_index in range(len(splits[candidate.model_serial_number]))])
+                        if self.trial_cache is not None:
+                            self.trial_cache.put(trial_keys[candidate_number], {
+                                key: getattr(timing, key) for key in
+                                ["mean_test_score", "std_test_score", "mean_fit_time", "mean_score_time"]})
+                    candidate_timings.append(timing)
+                    best_candidate = best_candidates.get(candidate.model_serial_number)
+                    if not np.isnan(timing.mean_test_score) and (
+                            best_candidate is None or timing.mean_test_score > best_candidate.mean_test_score):
+                        best_candidates[candidate.model_serial_number] = timing
+
+                missing_models = [serial_number for serial_number in models if serial_number not in best_candidates]
+                if len(missing_models) > 0:
+                    raise Exception(f"Every candidate of models {missing_models} failed to fit.")
+
+                refit_futures = {serial_number: executor.submit(refit_search_candidate, models[serial_number],
+                                                                best_candidate.params)
+                                 for serial_number, best_candidate in best_candidates.items()}
+                search_results = {serial_number: (refit_futures[serial_number].result(),
+                                                  best_candidates[serial_number].params,
+                                                  best_candidates[serial_number].mean_test_score)
+                                  for serial_number in models}
+            if self.trial_cache is not None:
+                self.trial_cache.save()
+
+            for serial_number, (_, best_parameters, best_score) in search_results.items():
+                logging.info(f"Parallel search of [{serial_number}] completed, best parameters: "
+                             f"{best_parameters} score: [{best_score}]")
+            return search_results, candidate_timings
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+        finally:
+            if shared_array_store is not None:
+                shared_array_store.cleanup()
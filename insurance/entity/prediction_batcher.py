@@ -0,0 +1,114 @@
+from insurance.exception import InsuranceException
+from insurance.logger import logging
+from insurance.entity.insurance_predictor import InsuranceData, InsurancePredictor
+
+import os
+import sys
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+PREDICTION_BATCH_MAX_SIZE = 64
+PREDICTION_BATCH_MAX_WAIT_MS = 2.0
+
+
+class PredictionBatcher:
+    """
+    Coalesces concurrent single record predictions into one vectorized call.
+
+    Every caller puts its record on a queue and waits on its own future. A
+    background thread takes the first pending record, keeps collecting records
+    until either max_batch_size records are pending or max_wait_ms has passed,
+    scores them with one transform and predict call and hands every caller its
+    own result. The extra latency a request can see is bounded by max_wait_ms.
+
+    It only pays off when a worker serves requests concurrently, e.g. gunicorn
+    with --threads > 1.
+    """
+
+    def __init__(self, insurance_predictor: InsurancePredictor,
+                 max_batch_size: int = PREDICTION_BATCH_MAX_SIZE,
+                 max_wait_ms: float = PREDICTION_BATCH_MAX_WAIT_MS):
+        try:
+            if max_batch_size < 1:
+                raise Exception(f"max_batch_size must be at least 1, got: [{max_batch_size}]")
+            self.insurance_predictor = insurance_predictor
+            self.max_batch_size = max_batch_size
+            self.max_wait = max_wait_ms / 1000.0
+            self.pending_requests = queue.Queue()
+            self.lock = threading.Lock()
+            self.worker = None
+            self.worker_pid = None
+            self.batch_count = 0
+            self.request_count = 0
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    def ensure_worker(self):
+        # threads do not survive fork, so every forked web worker starts its own batching thread
+        if self.worker is not None and self.worker_pid == os.getpid():
+            return
+        with self.lock:
+            if self.worker is not None and self.worker_pid == os.getpid():
+                return
+            self.pending_requests = queue.Queue()
+            self.worker = threading.Thread(target=self.run, name="prediction-batcher", daemon=True)
+            self.worker_pid = os.getpid()
+            self.worker.start()
+
+    def collect_batch(self) -> list:
+        batch = [self.pending_requests.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.pending_requests.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def score_batch(self, batch: list):
+        insurance_data_list = [insurance_data for insurance_data, _ in batch]
+        try:
+            expenses_prediction = self.insurance_predictor.predict_insurance_data(insurance_data_list)
+            for (_, future), expenses in zip(batch, expenses_prediction):
+                future.set_result(float(expenses))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+        self.batch_count += 1
+        self.request_count += len(batch)
+
+    def run(self):
+        while True:
+            batch = self.collect_batch()
+            try:
+                self.score_batch(batch)
+            except Exception as e:
+                logging.exception(e)
+
+    def submit(self, insurance_data: InsuranceData) -> Future:
+        self.ensure_worker()
+        future = Future()
+        self.pending_requests.put((insurance_data, future))
+        return future
+
+    def predict(self, insurance_data: InsuranceData) -> float:
+        """
+        insurance_data: single record to score
+        return: predicted insurance expenses for the record
+        """
+        try:
+            return self.submit(insurance_data).result()
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    def get_batch_info(self) -> dict:
+        return {
+            "batch_count": self.batch_count,
+            "request_count": self.request_count,
+            "average_batch_size": self.request_count / self.batch_count if self.batch_count > 0 else 0.0
+        }
@@ -0,0 +1,105 @@
+from insurance.exception import InsuranceException
+from insurance.logger import logging
+
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+import numpy as np
+
+# tmpfs backed, memory mapped files there are plain shared memory
+SHARED_ARRAY_ROOT_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+SHARED_ARRAY_DIR_PREFIX = "insurance-shared-"
+
+
+def is_process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def attach_shared_array(file_path: str) -> np.ndarray:
+    """
+    Maps an array written by SharedArrayStore read only, every process attaching
+    to the same file shares its pages instead of holding a copy.
+    """
+    return np.load(file_path, mmap_mode="r")
+
+
+def get_shared_array_file_path(array) -> str:
+    """
+    return: path of the .npy file array maps as a whole, None for in memory arrays and
+    for slices of a mapped file
+    """
+    file_path = getattr(array, "filename", None)
+    if not isinstance(array, np.memmap) or file_path is None or not array.flags.c_contiguous:
+        return None
+    mapped_array = attach_shared_array(file_path)
+    if mapped_array.shape != array.shape or mapped_array.dtype != array.dtype or mapped_array.offset != array.offset:
+        return None
+    return file_path
+
+
+class SharedArrayStore:
+    """
+    Run scoped directory of memory mapped .npy arrays shared with worker processes.
+
+    Workers get the file path and attach with attach_shared_array, nothing is
+    pickled or copied per task. The directory is removed by cleanup, which runs
+    from the owner's finally block, at interpreter exit and, for owners that were
+    killed, by the next store created on the machine.
+    """
+
+    def __init__(self, root_dir: str = SHARED_ARRAY_ROOT_DIR):
+        try:
+            self.root_dir = root_dir if root_dir is not None else tempfile.gettempdir()
+            SharedArrayStore.remove_stale_stores(self.root_dir)
+            self.dir_path = tempfile.mkdtemp(prefix=f"{SHARED_ARRAY_DIR_PREFIX}{os.getpid()}-", dir=self.root_dir)
+            atexit.register(self.cleanup)
+            logging.info(f"Shared array store created at [{self.dir_path}]")
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    @staticmethod
+    def remove_stale_stores(root_dir: str):
+        """
+        Removes stores left behind by processes which no longer run.
+        """
+        for dir_name in os.listdir(root_dir):
+            if not dir_name.startswith(SHARED_ARRAY_DIR_PREFIX):
+                continue
+            pid = dir_name[len(SHARED_ARRAY_DIR_PREFIX):].split("-")[0]
+            if pid.isdigit() and not is_process_alive(int(pid)):
+                logging.info(f"Removing stale shared array store [{dir_name}]")
+                shutil.rmtree(os.path.join(root_dir, dir_name), ignore_errors=True)
+
+    def share(self, name: str, array: np.ndarray) -> np.ndarray:
+        """
+        Copies array into the store once.
+        return: read only memory mapped array, its filename attribute is the path to attach to
+        """
+        try:
+            file_path = os.path.join(self.dir_path, f"{name}.npy")
+            shared_array = np.lib.format.open_memmap(file_path, mode="w+", dtype=array.dtype, shape=array.shape)
+            shared_array[...] = array
+            shared_array.flush()
+            del shared_array
+            return attach_shared_array(file_path)
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    def cleanup(self):
+        shutil.rmtree(self.dir_path, ignore_errors=True)
+        atexit.unregister(self.cleanup)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cleanup()
+        return False
@@ -0,0 +1,95 @@
+from insurance.exception import InsuranceException
+from insurance.logger import logging
+from insurance.util.util import read_yaml_file, write_yaml_file_atomic
+
+import os
+import sys
+import json
+import time
+import hashlib
+import numpy as np
+
+TRIAL_CACHE_MAX_ENTRIES = 10000
+TRIAL_LAST_USED_KEY = "last_used"
+
+
+class TrialCache:
+    """
+    Cross validation results of parameter candidates kept across training runs.
+
+    A trial is identified by the estimator class, its parameters including the
+    searched ones, the cv and scoring settings and a hash of the training
+    arrays, so a candidate is only fitted again when one of them changed.
+    The least recently used trials are evicted above max_entries.
+    """
+
+    def __init__(self, cache_file_path: str, max_entries: int = TRIAL_CACHE_MAX_ENTRIES):
+        try:
+            self.cache_file_path = cache_file_path
+            self.max_entries = max_entries
+            self.trials = {}
+            if os.path.exists(cache_file_path):
+                try:
+                    self.trials = read_yaml_file(file_path=cache_file_path) or {}
+                except Exception as e:
+                    logging.info(f"Trial cache [{cache_file_path}] can not be read, starting empty: {e}")
+            self.hit_count = 0
+            self.miss_count = 0
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    @staticmethod
+    def get_data_hash(input_feature, output_feature) -> str:
+        data_hash = hashlib.sha256()
+        for array in (input_feature, output_feature):
+            array = np.ascontiguousarray(array)
+            data_hash.update(str((array.shape, array.dtype.str)).encode())
+            # hashes the buffer in place, memory mapped arrays are not copied
+            data_hash.update(array.data)
+        return data_hash.hexdigest()
+
+    @staticmethod
+    def get_trial_key(estimator, params: dict, cv, scoring, data_hash: str) -> str:
+        """
+        estimator: unfitted estimator holding the parameters from model.yaml
+        params: searched parameters of the candidate
+        """
+        estimator_params = estimator.get_params(deep=False)
+        estimator_params.update(params)
+        trial_info = {
+            "estimator": f"{type(estimator).__module__}.{type(estimator).__name__}",
+            "params": {name: repr(value) for name, value in sorted(estimator_params.items())},
+            "cv": repr(cv),
+            "scoring": repr(scoring),
+            "data_hash": data_hash,
+        }
+        return hashlib.sha256(json.dumps(trial_info, sort_keys=True).encode()).hexdigest()
+
+    def get(self, trial_key: str) -> dict:
+        """
+        return: cached trial {mean_test_score, std_test_score, mean_fit_time, mean_score_time} or None
+        """
+        trial = self.trials.get(trial_key)
+        if trial is None:
+            self.miss_count += 1
+            return None
+        self.hit_count += 1
+        trial[TRIAL_LAST_USED_KEY] = time.time()
+        return trial
+
+    def put(self, trial_key: str, trial: dict):
+        trial = {key: float(value) for key, value in trial.items()}
+        trial[TRIAL_LAST_USED_KEY] = time.time()
+        self.trials[trial_key] = trial
+
+    def save(self):
+        try:
+            if len(self.trials) > self.max_entries:
+                trial_keys = sorted(self.trials, key=lambda key: self.trials[key][TRIAL_LAST_USED_KEY], reverse=True)
+                logging.info(f"Evicting [{len(trial_keys) - self.max_entries}] least recently used trials.")
+                self.trials = {key: self.trials[key] for key in trial_keys[:self.max_entries]}
+            write_yaml_file_atomic(file_path=self.cache_file_path, data=self.trials)
+            logging.info(f"Trial cache saved with [{len(self.trials)}] trials, "
+                         f"hits: [{self.hit_count}] misses: [{self.miss_count}]")
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
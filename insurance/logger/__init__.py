@@ -9,15 +9,23 @@ def get_log_file_name():
 
 LOG_DIR="logs"
 
-LOG_FILE_NAME=get_log_file_name()
-
+# log file to append to instead of starting a new one under LOG_DIR, set for child processes, e.g.
+# spawned search workers, which log into the file of their parent, and by the tests
+LOG_FILE_PATH_ENV_KEY = "INSURANCE_LOG_FILE_PATH"
 
-os.makedirs(LOG_DIR,exist_ok=True)
+LOG_FILE_NAME=get_log_file_name()
 
-LOG_FILE_PATH = os.path.join(LOG_DIR,LOG_FILE_NAME)
+if os.getenv(LOG_FILE_PATH_ENV_KEY):
+    LOG_FILE_PATH = os.environ[LOG_FILE_PATH_ENV_KEY]
+    LOG_FILE_MODE = "a"
+else:
+    os.makedirs(LOG_DIR,exist_ok=True)
+    LOG_FILE_PATH = os.path.join(LOG_DIR,LOG_FILE_NAME)
+    LOG_FILE_MODE = "w"
+    os.environ[LOG_FILE_PATH_ENV_KEY] = os.path.abspath(LOG_FILE_PATH)
 
 logging.basicConfig(filename=LOG_FILE_PATH,
-filemode="w",
+filemode=LOG_FILE_MODE,
 format='[%(asctime)s] %(name)s - %(levelname)s - %(message)s',
 level=logging.INFO
 )
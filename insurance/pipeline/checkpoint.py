@@ -0,0 +1,94 @@
+from insurance.exception import InsuranceException
+from insurance.logger import logging
+from insurance.util.util import save_artifact, load_artifact
+from insurance.pipeline.stage_cache import StageCache
+from insurance.constant import CHECKPOINT_COMPLETED_FILE_NAME
+
+import os
+import sys
+
+
+class PipelineCheckpoint:
+    """
+    Artifacts of the completed stages of one experiment.
+
+    Every stage artifact is saved as <checkpoint_dir>/<time_stamp>/<stage>.yaml
+    as soon as the stage completes. An experiment resumed with the same time
+    stamp reuses those artifacts and only runs the stages without one, so an
+    interrupted run restarts at its first incomplete stage instead of from the
+    download. A completed experiment is marked and never resumed.
+    """
+
+    def __init__(self, checkpoint_dir: str, time_stamp: str):
+        self.checkpoint_dir = checkpoint_dir
+        self.experiment_checkpoint_dir = os.path.join(checkpoint_dir, time_stamp)
+
+    def get_checkpoint_file_path(self, stage_name: str) -> str:
+        return os.path.join(self.experiment_checkpoint_dir, f"{stage_name}.yaml")
+
+    def get(self, stage_name: str):
+        """
+        return: checkpointed artifact of the stage or None
+        """
+        checkpoint_file_path = self.get_checkpoint_file_path(stage_name)
+        if not os.path.exists(checkpoint_file_path):
+            return None
+        try:
+            artifact = load_artifact(file_path=checkpoint_file_path)
+        except Exception as e:
+            logging.info(f"Checkpoint [{checkpoint_file_path}] can not be read: {e}")
+            return None
+        if not StageCache.is_artifact_complete(artifact):
+            logging.info(f"Checkpoint [{checkpoint_file_path}] points at removed files, stage will run.")
+            return None
+        logging.info(f"Stage [{stage_name}] resumed from checkpoint: {artifact}")
+        return artifact
+
+    def put(self, stage_name: str, artifact):
+        if artifact is None:
+            return
+        save_artifact(file_path=self.get_checkpoint_file_path(stage_name), artifact=artifact)
+
+    def run(self, stage_name: str, run_stage):
+        """
+        stage_name: name of the stage
+        run_stage: callable running the stage and returning its artifact
+        return: checkpointed or newly created artifact
+        """
+        try:
+            artifact = self.get(stage_name)
+            if artifact is not None:
+                return artifact
+            artifact = run_stage()
+            self.put(stage_name, artifact)
+            return artifact
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    def mark_completed(self):
+        try:
+            os.makedirs(self.experiment_checkpoint_dir, exist_ok=True)
+            with open(os.path.join(self.experiment_checkpoint_dir, CHECKPOINT_COMPLETED_FILE_NAME), "w"):
+                pass
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    @staticmethod
+    def get_resumable_time_stamp(checkpoint_dir: str) -> str:
+        """
+        return: time stamp of the latest experiment which has checkpoints but
+        did not complete, None if there is nothing to resume
+        """
+        try:
+            if not os.path.isdir(checkpoint_dir):
+                return None
+            for time_stamp in sorted(os.listdir(checkpoint_dir), reverse=True):
+                experiment_checkpoint_dir = os.path.join(checkpoint_dir, time_stamp)
+                if not os.path.isdir(experiment_checkpoint_dir):
+                    continue
+                if os.path.exists(os.path.join(experiment_checkpoint_dir, CHECKPOINT_COMPLETED_FILE_NAME)):
+                    return None
+                return time_stamp
+            return None
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
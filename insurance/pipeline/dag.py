@@ -0,0 +1,150 @@
+from insurance.exception import InsuranceException
+from insurance.logger import logging
+
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+DAG_MAX_WORKERS = 4
+
+DagNode = namedtuple("DagNode", ["name", "inputs", "run"])
+
+DagNodeTiming = namedtuple("DagNodeTiming", ["name", "start", "stop", "duration"])
+
+DagRunReport = namedtuple("DagRunReport", ["wall_time", "total_node_time", "critical_path", "critical_path_time",
+                                           "node_timings"])
+
+
+class DagExecutor:
+    """
+    Runs a set of DagNode as soon as all of their inputs are available.
+
+    Every node names the nodes it depends on in inputs and is called with
+    their outputs as keyword arguments, e.g. DagNode("b", ["a"], run) calls
+    run(a=<output of a>). Nodes whose inputs are ready run concurrently in a
+    thread pool, so a run takes about as long as its critical path, the
+    longest chain of dependent nodes.
+    """
+
+    def __init__(self, nodes: list, max_workers: int = DAG_MAX_WORKERS):
+        try:
+            self.nodes = {node.name: node for node in nodes}
+            if len(self.nodes) != len(nodes):
+                raise Exception("Node names of a dag must be unique.")
+            for node in nodes:
+                unknown_inputs = [name for name in node.inputs if name not in self.nodes]
+                if len(unknown_inputs) > 0:
+                    raise Exception(f"Node [{node.name}] depends on unknown nodes: {unknown_inputs}")
+            self.order = DagExecutor.get_topological_order(self.nodes)
+            self.max_workers = max_workers
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    @staticmethod
+    def get_topological_order(nodes: dict) -> list:
+        order = []
+        visiting = set()
+        visited = set()
+
+        def visit(name: str):
+            if name in visited:
+                return
+            if name in visiting:
+                raise Exception(f"Dag has a cycle through node [{name}].")
+            visiting.add(name)
+            for input_name in nodes[name].inputs:
+                visit(input_name)
+            visiting.remove(name)
+            visited.add(name)
+            order.append(name)
+
+        for name in nodes:
+            visit(name)
+        return order
+
+    def get_critical_path(self, node_timings: dict) -> tuple:
+        """
+        return: names of the longest chain of dependent nodes by measured duration and its duration
+        """
+        finish = {}
+        previous = {}
+        for name in self.order:
+            inputs = self.nodes[name].inputs
+            slowest_input = max(inputs, key=lambda input_name: finish[input_name]) if len(inputs) > 0 else None
+            input_finish = finish[slowest_input] if slowest_input is not None else 0.0
+            finish[name] = input_finish + node_timings[name].duration
+            previous[name] = slowest_input
+        name = max(finish, key=finish.get)
+        critical_path_time = finish[name]
+        critical_path = []
+        while name is not None:
+            critical_path.append(name)
+            name = previous[name]
+        return list(reversed(critical_path)), critical_path_time
+
+    def run_node(self, node: DagNode, outputs: dict, started_at: float) -> tuple:
+        start = time.perf_counter()
+        logging.info(f"Dag node [{node.name}] started.")
+        output = node.run(**{input_name: outputs[input_name] for input_name in node.inputs})
+        stop = time.perf_counter()
+        logging.info(f"Dag node [{node.name}] completed in [{stop - start:.3f}] seconds.")
+        return output, DagNodeTiming(name=node.name, start=start - started_at, stop=stop - started_at,
+                                     duration=stop - start)
+
+    def run(self) -> tuple:
+        """
+        return: dict of node name to node output and DagRunReport.
+        The first failing node stops the run: nodes not started yet are skipped,
+        running ones are waited for and the error is raised.
+        """
+        try:
+            started_at = time.perf_counter()
+            outputs = {}
+            node_timings = {}
+            pending = list(self.order)
+            running = {}
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pipeline-dag") as executor:
+                while len(pending) > 0 or len(running) > 0:
+                    for name in list(pending):
+                        if all(input_name in outputs for input_name in self.nodes[name].inputs):
+                            pending.remove(name)
+                            future = executor.submit(self.run_node, self.nodes[name], dict(outputs), started_at)
+                            running[future] = name
+                    done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name = running.pop(future)
+                        error = future.exception()
+                        if error is not None:
+                            wait(list(running))
+                            raise Exception(f"Dag node [{name}] failed: {error}") from error
+                        outputs[name], node_timings[name] = future.result()
+
+            critical_path, critical_path_time = self.get_critical_path(node_timings)
+            report = DagRunReport(wall_time=time.perf_counter() - started_at,
+                                  total_node_time=sum(timing.duration for timing in node_timings.values()),
+                                  critical_path=critical_path,
+                                  critical_path_time=critical_path_time,
+                                  node_timings=[node_timings[name] for name in self.order])
+            logging.info(f"Dag completed in [{report.wall_time:.3f}] seconds, critical path "
+                         f"{report.critical_path} takes [{report.critical_path_time:.3f}] seconds, "
+                         f"nodes took [{report.total_node_time:.3f}] seconds in total.")
+            return outputs, report
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+
+def get_dag_report_info(report: DagRunReport) -> dict:
+    """
+    return: yaml serializable form of DagRunReport
+    """
+    return {
+        "wall_time": round(report.wall_time, 6),
+        "total_node_time": round(report.total_node_time, 6),
+        "critical_path": list(report.critical_path),
+        "critical_path_time": round(report.critical_path_time, 6),
+        "node_timings": {timing.name: {"start": round(timing.start, 6),
+                                       "stop": round(timing.stop, 6),
+                                       "duration": round(timing.duration, 6)}
+                         for timing in report.node_timings},
+    }
@@ -13,10 +13,29 @@ from insurance.component.data_transformation import DataTransformation
 from insurance.component.model_trainer import ModelTrainer
 from insurance.component.model_evaluation import ModelEvaluation
 from insurance.component.model_pusher import ModelPusher
+from insurance.pipeline.stage_cache import StageCache, StageCacheEntry
+from insurance.pipeline.checkpoint import PipelineCheckpoint
+from insurance.pipeline.dag import DagExecutor, DagNode, DagRunReport, get_dag_report_info
+from insurance.util.util import write_yaml_file
 import os, sys
 from datetime import datetime
 import pandas as pd
 from insurance.constant import EXPERIMENT_DIR_NAME, EXPERIMENT_FILE_NAME,ROOT_DIR
+from insurance.constant import DATA_INGESTION_CONFIG_KEY, DATA_VALIDATION_CONFIG_KEY, DATA_TRANSFORMATION_CONFIG_KEY, \
+    MODEL_TRAINER_CONFIG_KEY, DATA_INGESTION_ARTIFACT_DIR, DATA_VALIDATION_ARTIFACT_DIR_NAME, \
+    DATA_TRANSFORMATION_ARTIFACT_DIR, MODEL_TRAINER_ARTIFACT_DIR, PIPELINE_DAG_ARTIFACT_DIR, \
+    PIPELINE_DAG_REPORT_FILE_NAME
+
+DATA_INGESTION_NODE = "data_ingestion"
+DATA_VALIDATION_CACHE_NODE = "data_validation_cache"
+SCHEMA_VALIDATION_NODE = "schema_validation"
+DATA_DRIFT_REPORT_NODE = "data_drift_report"
+DATA_DRIFT_REPORT_PAGE_NODE = "data_drift_report_page"
+DATA_VALIDATION_NODE = "data_validation"
+DATA_TRANSFORMATION_NODE = "data_transformation"
+MODEL_TRAINER_NODE = "model_trainer"
+MODEL_EVALUATION_NODE = "model_evaluation"
+MODEL_PUSHER_NODE = "model_pusher"
 
 Experiment = namedtuple("Experiment", ["experiment_id", "initialization_timestamp", "artifact_time_stamp",
                                        "running_status", "start_time", "stop_time", "execution_time", "message",
@@ -30,12 +49,28 @@ class Pipeline(Thread):
     experiment: Experiment = Experiment(*([None] * 11))
     experiment_file_path = os.path.join(ROOT_DIR,"insurance","artifact",EXPERIMENT_DIR_NAME,EXPERIMENT_FILE_NAME)
 
-    def __init__(self, config: Configuration ) -> None:
+    def __init__(self, config: Configuration, resume: bool = False) -> None:
+        """
+        resume: continue the latest interrupted experiment from its checkpoints,
+        a new experiment is started when there is nothing to resume
+        """
         try:
+            if resume:
+                resume_time_stamp = PipelineCheckpoint.get_resumable_time_stamp(
+                    checkpoint_dir=config.training_pipeline_config.checkpoint_dir)
+                if resume_time_stamp is not None:
+                    logging.info(f"Resuming experiment [{resume_time_stamp}] from its checkpoints.")
+                    config.time_stamp = resume_time_stamp
+                else:
+                    logging.info("No interrupted experiment to resume, starting a new one.")
             os.makedirs(config.training_pipeline_config.artifact_dir, exist_ok=True)
             Pipeline.experiment_file_path=os.path.join(config.training_pipeline_config.artifact_dir,EXPERIMENT_DIR_NAME, EXPERIMENT_FILE_NAME)
             super().__init__(daemon=False, name="pipeline")
             self.config = config
+            self.stage_cache = StageCache(stage_cache_dir=config.training_pipeline_config.stage_cache_dir,
+                                          is_enabled=config.training_pipeline_config.is_stage_cache_enabled)
+            self.checkpoint = PipelineCheckpoint(checkpoint_dir=config.training_pipeline_config.checkpoint_dir,
+                                                 time_stamp=config.time_stamp)
         except Exception as e:
             raise InsuranceException(e, sys) from e
 
@@ -43,18 +78,96 @@ class Pipeline(Thread):
     def start_data_ingestion(self) -> DataIngestionArtifact:
         try:
             data_ingestion = DataIngestion(data_ingestion_config=self.config.get_data_ingestion_config(),
-                                            database_config=self.config.get_database_config())
-            return data_ingestion.initiate_data_ingestion()
+                                            database_config=self.config.get_database_config(),
+                                            streaming_config=self.config.get_streaming_config())
+            # the download is the input of the stage, so it always happens; database load and split are cached
+            raw_data_file_path = data_ingestion.download_insurance_data()
+            if data_ingestion.data_ingestion_config.is_incremental:
+                # the database table is the input, its new rows are only known by querying it
+                return data_ingestion.ingest_downloaded_data()
+            return self.stage_cache.run(stage_name=DATA_INGESTION_ARTIFACT_DIR,
+                                        input_file_paths=[raw_data_file_path],
+                                        config_info=self.config.get_stage_config_info(DATA_INGESTION_CONFIG_KEY),
+                                        run_stage=data_ingestion.ingest_downloaded_data)
         except Exception as e:
             raise InsuranceException(e, sys) from e
 
     def start_data_validation(self, data_ingestion_artifact: DataIngestionArtifact) \
             -> DataValidationArtifact:
         try:
-            data_validation = DataValidation(data_validation_config=self.config.get_data_validation_config(),
-                                             data_ingestion_artifact=data_ingestion_artifact
+            data_validation_config = self.config.get_data_validation_config()
+            data_validation = DataValidation(data_validation_config=data_validation_config,
+                                             data_ingestion_artifact=data_ingestion_artifact,
+                                             streaming_config=self.config.get_streaming_config()
                                              )
-            return data_validation.initiate_data_validation()
+            return self.stage_cache.run(stage_name=DATA_VALIDATION_ARTIFACT_DIR_NAME,
+                                        input_file_paths=[data_ingestion_artifact.train_file_path,
+                                                          data_ingestion_artifact.test_file_path,
+                                                          data_validation_config.schema_file_path],
+                                        config_info=self.config.get_stage_config_info(DATA_VALIDATION_CONFIG_KEY),
+                                        run_stage=data_validation.initiate_data_validation)
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    def get_data_validation(self, data_ingestion_artifact: DataIngestionArtifact) -> DataValidation:
+        return DataValidation(data_validation_config=self.config.get_data_validation_config(),
+                              data_ingestion_artifact=data_ingestion_artifact,
+                              streaming_config=self.config.get_streaming_config())
+
+    def lookup_data_validation(self, data_ingestion_artifact: DataIngestionArtifact) -> StageCacheEntry:
+        """
+        Validation runs as several dag nodes, so its cache entry is looked up
+        first and only stored once schema checks and drift reports are done.
+        """
+        try:
+            data_validation_artifact = self.checkpoint.get(DATA_VALIDATION_NODE)
+            if data_validation_artifact is not None:
+                return StageCacheEntry(stage_name=DATA_VALIDATION_ARTIFACT_DIR_NAME, fingerprint=None,
+                                       artifact=data_validation_artifact)
+            return self.stage_cache.lookup(stage_name=DATA_VALIDATION_ARTIFACT_DIR_NAME,
+                                           input_file_paths=[data_ingestion_artifact.train_file_path,
+                                                             data_ingestion_artifact.test_file_path,
+                                                             self.config.get_data_validation_config().schema_file_path],
+                                           config_info=self.config.get_stage_config_info(DATA_VALIDATION_CONFIG_KEY))
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    def start_schema_validation(self, data_ingestion_artifact: DataIngestionArtifact,
+                                data_validation_cache_entry: StageCacheEntry) -> DataValidationArtifact:
+        try:
+            if data_validation_cache_entry.artifact is not None:
+                return data_validation_cache_entry.artifact
+            data_validation = self.get_data_validation(data_ingestion_artifact=data_ingestion_artifact)
+            data_validation.is_train_test_file_exists()
+            data_validation.validate_dataset_schema()
+            return data_validation.get_data_validation_artifact()
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    def start_data_drift_report(self, data_ingestion_artifact: DataIngestionArtifact,
+                                data_validation_cache_entry: StageCacheEntry):
+        try:
+            if data_validation_cache_entry.artifact is None:
+                self.get_data_validation(data_ingestion_artifact=data_ingestion_artifact) \
+                    .get_and_save_data_drift_report()
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    def start_data_drift_report_page(self, data_ingestion_artifact: DataIngestionArtifact,
+                                     data_validation_cache_entry: StageCacheEntry):
+        try:
+            if data_validation_cache_entry.artifact is None:
+                self.get_data_validation(data_ingestion_artifact=data_ingestion_artifact) \
+                    .save_data_drift_report_page()
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    def complete_data_validation(self, data_validation_cache_entry: StageCacheEntry,
+                                 data_validation_artifact: DataValidationArtifact) -> DataValidationArtifact:
+        try:
+            self.stage_cache.put_entry(data_validation_cache_entry, data_validation_artifact)
+            logging.info("Data validation completed.")
+            return data_validation_artifact
         except Exception as e:
             raise InsuranceException(e, sys) from e
 
@@ -66,18 +179,32 @@ class Pipeline(Thread):
             data_transformation = DataTransformation(
                 data_transformation_config=self.config.get_data_transformation_config(),
                 data_ingestion_artifact=data_ingestion_artifact,
-                data_validation_artifact=data_validation_artifact
+                data_validation_artifact=data_validation_artifact,
+                streaming_config=self.config.get_streaming_config()
             )
-            return data_transformation.initiate_data_transformation()
+            return self.stage_cache.run(stage_name=DATA_TRANSFORMATION_ARTIFACT_DIR,
+                                        input_file_paths=[data_ingestion_artifact.train_file_path,
+                                                          data_ingestion_artifact.test_file_path,
+                                                          data_validation_artifact.schema_file_path],
+                                        config_info=self.config.get_stage_config_info(DATA_TRANSFORMATION_CONFIG_KEY),
+                                        run_stage=data_transformation.initiate_data_transformation)
         except Exception as e:
             raise InsuranceException(e, sys)
 
     def start_model_trainer(self, data_transformation_artifact: DataTransformationArtifact) -> ModelTrainerArtifact:
         try:
-            model_trainer = ModelTrainer(model_trainer_config=self.config.get_model_trainer_config(),
-                                         data_transformation_artifact=data_transformation_artifact
+            model_trainer_config = self.config.get_model_trainer_config()
+            model_trainer = ModelTrainer(model_trainer_config=model_trainer_config,
+                                         data_transformation_artifact=data_transformation_artifact,
+                                         streaming_config=self.config.get_streaming_config()
                                          )
-            return model_trainer.initiate_model_trainer()
+            return self.stage_cache.run(stage_name=MODEL_TRAINER_ARTIFACT_DIR,
+                                        input_file_paths=[data_transformation_artifact.transformed_train_file_path,
+                                                          data_transformation_artifact.transformed_test_file_path,
+                                                          data_transformation_artifact.preprocessed_object_file_path,
+                                                          model_trainer_config.model_config_file_path],
+                                        config_info=self.config.get_stage_config_info(MODEL_TRAINER_CONFIG_KEY),
+                                        run_stage=model_trainer.initiate_model_trainer)
         except Exception as e:
             raise InsuranceException(e, sys) from e
 
@@ -89,7 +216,8 @@ class Pipeline(Thread):
                 model_evaluation_config=self.config.get_model_evaluation_config(),
                 data_ingestion_artifact=data_ingestion_artifact,
                 data_validation_artifact=data_validation_artifact,
-                model_trainer_artifact=model_trainer_artifact)
+                model_trainer_artifact=model_trainer_artifact,
+                streaming_config=self.config.get_streaming_config())
             return model_eval.initiate_model_evaluation()
         except Exception as e:
             raise InsuranceException(e, sys) from e
@@ -104,6 +232,73 @@ class Pipeline(Thread):
         except Exception as e:
             raise InsuranceException(e, sys) from e
 
+    def start_model_pusher_if_accepted(self, model_eval_artifact: ModelEvaluationArtifact) -> ModelPusherArtifact:
+        if not model_eval_artifact.is_model_accepted:
+            return None
+        return self.start_model_pusher(model_eval_artifact=model_eval_artifact)
+
+    def get_pipeline_dag(self) -> DagExecutor:
+        """
+        Pipeline stages as a dag. Every node is called with the outputs of its
+        inputs as keyword arguments named after the input nodes. The drift
+        report and its html page only feed the final validation artifact, so
+        transformation and training start as soon as the schema is validated.
+        Stages returning an artifact are checkpointed.
+        """
+        def checkpointed(stage_name: str, run_stage):
+            return lambda **inputs: self.checkpoint.run(stage_name, lambda: run_stage(**inputs))
+
+        validation_inputs = [DATA_INGESTION_NODE, DATA_VALIDATION_CACHE_NODE]
+        nodes = [
+            DagNode(DATA_INGESTION_NODE, [], checkpointed(DATA_INGESTION_NODE, self.start_data_ingestion)),
+            DagNode(DATA_VALIDATION_CACHE_NODE, [DATA_INGESTION_NODE],
+                    lambda data_ingestion: self.lookup_data_validation(data_ingestion_artifact=data_ingestion)),
+            DagNode(SCHEMA_VALIDATION_NODE, validation_inputs,
+                    lambda data_ingestion, data_validation_cache: self.start_schema_validation(
+                        data_ingestion_artifact=data_ingestion, data_validation_cache_entry=data_validation_cache)),
+            DagNode(DATA_DRIFT_REPORT_NODE, validation_inputs,
+                    lambda data_ingestion, data_validation_cache: self.start_data_drift_report(
+                        data_ingestion_artifact=data_ingestion, data_validation_cache_entry=data_validation_cache)),
+            DagNode(DATA_DRIFT_REPORT_PAGE_NODE, validation_inputs,
+                    lambda data_ingestion, data_validation_cache: self.start_data_drift_report_page(
+                        data_ingestion_artifact=data_ingestion, data_validation_cache_entry=data_validation_cache)),
+            DagNode(DATA_VALIDATION_NODE, [DATA_VALIDATION_CACHE_NODE, SCHEMA_VALIDATION_NODE, DATA_DRIFT_REPORT_NODE,
+                                           DATA_DRIFT_REPORT_PAGE_NODE],
+                    checkpointed(DATA_VALIDATION_NODE,
+                                 lambda data_validation_cache, schema_validation, **_: self.complete_data_validation(
+                                     data_validation_cache_entry=data_validation_cache,
+                                     data_validation_artifact=schema_validation))),
+            DagNode(DATA_TRANSFORMATION_NODE, [DATA_INGESTION_NODE, SCHEMA_VALIDATION_NODE],
+                    checkpointed(DATA_TRANSFORMATION_NODE,
+                                 lambda data_ingestion, schema_validation: self.start_data_transformation(
+                                     data_ingestion_artifact=data_ingestion,
+                                     data_validation_artifact=schema_validation))),
+            DagNode(MODEL_TRAINER_NODE, [DATA_TRANSFORMATION_NODE],
+                    checkpointed(MODEL_TRAINER_NODE,
+                                 lambda data_transformation: self.start_model_trainer(
+                                     data_transformation_artifact=data_transformation))),
+            DagNode(MODEL_EVALUATION_NODE, [DATA_INGESTION_NODE, DATA_VALIDATION_NODE, MODEL_TRAINER_NODE],
+                    checkpointed(MODEL_EVALUATION_NODE,
+                                 lambda data_ingestion, data_validation, model_trainer: self.start_model_evaluation(
+                                     data_ingestion_artifact=data_ingestion, data_validation_artifact=data_validation,
+                                     model_trainer_artifact=model_trainer))),
+            DagNode(MODEL_PUSHER_NODE, [MODEL_EVALUATION_NODE],
+                    checkpointed(MODEL_PUSHER_NODE,
+                                 lambda model_evaluation: self.start_model_pusher_if_accepted(
+                                     model_eval_artifact=model_evaluation))),
+        ]
+        return DagExecutor(nodes=nodes)
+
+    def save_dag_report(self, dag_report: DagRunReport):
+        try:
+            dag_report_file_path = os.path.join(self.config.training_pipeline_config.artifact_dir,
+                                                PIPELINE_DAG_ARTIFACT_DIR, self.config.time_stamp,
+                                                PIPELINE_DAG_REPORT_FILE_NAME)
+            write_yaml_file(file_path=dag_report_file_path, data=get_dag_report_info(dag_report))
+            logging.info(f"Pipeline dag report saved at: [{dag_report_file_path}]")
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
     def run_pipeline(self):
         try:
             if Pipeline.experiment.running_status:
@@ -130,30 +325,18 @@ class Pipeline(Thread):
 
             self.save_experiment()
 
-            data_ingestion_artifact = self.start_data_ingestion()
-            
-            
-            data_validation_artifact = self.start_data_validation(data_ingestion_artifact=data_ingestion_artifact)
-            
-            data_transformation_artifact = self.start_data_transformation(
-                data_ingestion_artifact=data_ingestion_artifact,
-                data_validation_artifact=data_validation_artifact
-            )
-            
-            model_trainer_artifact = self.start_model_trainer(data_transformation_artifact=data_transformation_artifact)
-
-        
-            model_evaluation_artifact = self.start_model_evaluation(data_ingestion_artifact=data_ingestion_artifact,
-                                                                    data_validation_artifact=data_validation_artifact,
-                                                                    model_trainer_artifact=model_trainer_artifact)
+            outputs, dag_report = self.get_pipeline_dag().run()
+            self.save_dag_report(dag_report)
+            self.checkpoint.mark_completed()
+            model_evaluation_artifact = outputs[MODEL_EVALUATION_NODE]
+            model_trainer_artifact = outputs[MODEL_TRAINER_NODE]
 
             if model_evaluation_artifact.is_model_accepted:
-                model_pusher_artifact = self.start_model_pusher(model_eval_artifact=model_evaluation_artifact)
-                logging.info(f'Model pusher artifact: {model_pusher_artifact}')
+                logging.info(f'Model pusher artifact: {outputs[MODEL_PUSHER_NODE]}')
             else:
                 logging.info("Trained model rejected.")
             logging.info("Pipeline completed.")
-            
+
             stop_time = datetime.now()
             Pipeline.experiment = Experiment(experiment_id=Pipeline.experiment.experiment_id,
                                              initialization_timestamp=self.config.time_stamp,
@@ -0,0 +1,95 @@
+from insurance.exception import InsuranceException
+from insurance.logger import logging
+from insurance.util.util import get_stage_fingerprint, save_artifact, load_artifact
+
+import os
+import sys
+from collections import namedtuple
+
+ARTIFACT_FILE_PATH_SUFFIX = "_file_path"
+
+StageCacheEntry = namedtuple("StageCacheEntry", ["stage_name", "fingerprint", "artifact"])
+
+
+class StageCache:
+    """
+    Content addressed cache of completed pipeline stages.
+
+    A stage is identified by the checksums of the files it reads and its
+    config section. When a stage with the same fingerprint completed before,
+    its artifact is saved under <stage_cache_dir>/<stage>/<fingerprint>.yaml
+    and is returned instead of running the stage again, as long as the files
+    it points at still exist.
+    """
+
+    def __init__(self, stage_cache_dir: str, is_enabled: bool = True):
+        self.stage_cache_dir = stage_cache_dir
+        self.is_enabled = is_enabled
+
+    def get_cache_file_path(self, stage_name: str, fingerprint: str) -> str:
+        return os.path.join(self.stage_cache_dir, stage_name, f"{fingerprint}.yaml")
+
+    @staticmethod
+    def is_artifact_complete(artifact) -> bool:
+        return all(os.path.exists(value) for key, value in artifact._asdict().items()
+                   if key.endswith(ARTIFACT_FILE_PATH_SUFFIX) and value is not None)
+
+    def get(self, stage_name: str, fingerprint: str):
+        """
+        return: cached artifact of the stage or None
+        """
+        cache_file_path = self.get_cache_file_path(stage_name, fingerprint)
+        if not os.path.exists(cache_file_path):
+            return None
+        try:
+            artifact = load_artifact(file_path=cache_file_path)
+        except Exception as e:
+            logging.info(f"Stage cache entry [{cache_file_path}] can not be read: {e}")
+            return None
+        if not StageCache.is_artifact_complete(artifact):
+            logging.info(f"Stage cache entry [{cache_file_path}] points at removed files, stage will run.")
+            return None
+        return artifact
+
+    def put(self, stage_name: str, fingerprint: str, artifact):
+        save_artifact(file_path=self.get_cache_file_path(stage_name, fingerprint), artifact=artifact)
+
+    def lookup(self, stage_name: str, input_file_paths: list, config_info: dict) -> StageCacheEntry:
+        """
+        For stages made of several steps: the artifact of the entry is None on a
+        miss and the entry is passed to put_entry once all steps completed.
+        """
+        try:
+            if not self.is_enabled:
+                return StageCacheEntry(stage_name=stage_name, fingerprint=None, artifact=None)
+            fingerprint = get_stage_fingerprint(input_file_paths=input_file_paths, config_info=config_info)
+            artifact = self.get(stage_name, fingerprint)
+            if artifact is not None:
+                logging.info(f"Stage [{stage_name}] is unchanged [{fingerprint}], reusing artifact: {artifact}")
+            return StageCacheEntry(stage_name=stage_name, fingerprint=fingerprint, artifact=artifact)
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
+
+    def put_entry(self, stage_cache_entry: StageCacheEntry, artifact):
+        if self.is_enabled and stage_cache_entry.artifact is None:
+            self.put(stage_cache_entry.stage_name, stage_cache_entry.fingerprint, artifact)
+            logging.info(f"Stage [{stage_cache_entry.stage_name}] artifact cached as "
+                         f"[{stage_cache_entry.fingerprint}].")
+
+    def run(self, stage_name: str, input_file_paths: list, config_info: dict, run_stage):
+        """
+        stage_name: name of the stage, e.g. its artifact dir name
+        input_file_paths: files read by the stage
+        config_info: config section of the stage
+        run_stage: callable running the stage and returning its artifact
+        return: cached or newly created artifact
+        """
+        try:
+            stage_cache_entry = self.lookup(stage_name, input_file_paths, config_info)
+            if stage_cache_entry.artifact is not None:
+                return stage_cache_entry.artifact
+            artifact = run_stage()
+            self.put_entry(stage_cache_entry, artifact)
+            return artifact
+        except Exception as e:
+            raise InsuranceException(e, sys) from e
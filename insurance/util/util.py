@@ -1,10 +1,12 @@
 import yaml
 from insurance.exception import InsuranceException
 import os,sys
+import hashlib
 import numpy as np
 import dill
 import pandas as pd
 from insurance.constant import *
+from insurance.entity import artifact_entity
 
 
 def write_yaml_file(file_path:str,data:dict=None):
@@ -22,6 +24,87 @@ def write_yaml_file(file_path:str,data:dict=None):
         raise InsuranceException(e,sys)
 
 
+def write_yaml_file_atomic(file_path:str,data:dict):
+    """
+    Create or replace yaml file atomically: readers either see the old
+    content or the new content, never a partially written file.
+    file_path: str
+    data: dict
+    """
+    try:
+        dir_path = os.path.dirname(file_path)
+        os.makedirs(dir_path, exist_ok=True)
+        temp_file_path = os.path.join(dir_path, f".{os.path.basename(file_path)}.{os.getpid()}.tmp")
+        with open(temp_file_path,"w") as yaml_file:
+            yaml.dump(data,yaml_file)
+            yaml_file.flush()
+            os.fsync(yaml_file.fileno())
+        os.replace(temp_file_path, file_path)
+    except Exception as e:
+        raise InsuranceException(e,sys) from e
+
+
+def get_file_checksum(file_path:str, block_size:int=1024 * 1024)->str:
+    """
+    Returns sha256 hex digest of file content
+    file_path: str
+    """
+    try:
+        file_hash = hashlib.sha256()
+        with open(file_path, "rb") as file_obj:
+            for block in iter(lambda: file_obj.read(block_size), b""):
+                file_hash.update(block)
+        return file_hash.hexdigest()
+    except Exception as e:
+        raise InsuranceException(e,sys) from e
+
+
+def get_stage_fingerprint(input_file_paths:list, config_info:dict=None)->str:
+    """
+    Returns sha256 hex digest identifying a pipeline stage run: content
+    checksums of its input files plus its config section.
+    input_file_paths: list of file paths read by the stage
+    config_info: config section of the stage
+    """
+    try:
+        fingerprint = hashlib.sha256()
+        for file_path in input_file_paths:
+            fingerprint.update(get_file_checksum(file_path).encode())
+        fingerprint.update(yaml.safe_dump(config_info, sort_keys=True).encode())
+        return fingerprint.hexdigest()
+    except Exception as e:
+        raise InsuranceException(e,sys) from e
+
+
+def save_artifact(file_path:str, artifact):
+    """
+    Saves an artifact namedtuple as yaml: {artifact_type: <name>, artifact: <fields>}
+    file_path: str
+    artifact: namedtuple from insurance.entity.artifact_entity
+    """
+    try:
+        # numpy scalars (metrics) are not safe_load-able
+        artifact_info = {key: value.item() if hasattr(value, "item") else value
+                         for key, value in artifact._asdict().items()}
+        data = {STAGE_CACHE_ARTIFACT_TYPE_KEY: type(artifact).__name__, STAGE_CACHE_ARTIFACT_KEY: artifact_info}
+        write_yaml_file_atomic(file_path=file_path, data=data)
+    except Exception as e:
+        raise InsuranceException(e,sys) from e
+
+
+def load_artifact(file_path:str):
+    """
+    Loads an artifact namedtuple saved by save_artifact
+    file_path: str
+    """
+    try:
+        data = read_yaml_file(file_path=file_path)
+        artifact_class = getattr(artifact_entity, data[STAGE_CACHE_ARTIFACT_TYPE_KEY])
+        return artifact_class(**data[STAGE_CACHE_ARTIFACT_KEY])
+    except Exception as e:
+        raise InsuranceException(e,sys) from e
+
+
 def read_yaml_file(file_path:str)->dict:
     """
     Reads a YAML file and returns the contents as a dictionary.
@@ -86,6 +169,23 @@ def load_object(file_path:str):
     except Exception as e:
         raise InsuranceException(e,sys) from e
 
+def check_data_frame_schema(dataframe: pd.DataFrame, schema: dict):
+    """
+    Raises an exception listing the columns of dataframe missing from the schema.
+    schema: columns section of schema.yaml
+    """
+    error_messgae = ""
+
+
+    for column in dataframe.columns:
+        if column in list(schema.keys()):
+            dataframe[column].astype(schema[column])
+        else:
+            error_messgae = f"{error_messgae} \nColumn: [{column}] is not in the schema."
+    if len(error_messgae) > 0:
+        raise Exception(error_messgae)
+
+
 def load_data(file_path: str, schema_file_path: str) -> pd.DataFrame:
     try:
         datatset_schema = read_yaml_file(schema_file_path)
@@ -94,17 +194,58 @@ def load_data(file_path: str, schema_file_path: str) -> pd.DataFrame:
 
         dataframe = pd.read_csv(file_path)
 
-        error_messgae = ""
+        check_data_frame_schema(dataframe=dataframe, schema=schema)
+        return dataframe
 
+    except Exception as e:
+        raise InsuranceException(e,sys) from e
 
-        for column in dataframe.columns:
-            if column in list(schema.keys()):
-                dataframe[column].astype(schema[column])
-            else:
-                error_messgae = f"{error_messgae} \nColumn: [{column}] is not in the schema."
-        if len(error_messgae) > 0:
-            raise Exception(error_messgae)
-        return dataframe
 
+def read_csv_chunks(file_path: str, chunk_size: int = None):
+    """
+    Yields the csv file as dataframes of chunk_size rows, the whole file as one
+    dataframe when chunk_size is None.
+    """
+    try:
+        if chunk_size is None:
+            yield pd.read_csv(file_path)
+            return
+        with pd.read_csv(file_path, chunksize=chunk_size) as reader:
+            for chunk in reader:
+                yield chunk
+    except Exception as e:
+        raise InsuranceException(e,sys) from e
+
+
+def load_data_chunks(file_path: str, schema_file_path: str, chunk_size: int):
+    """
+    Chunked counterpart of load_data for files larger than memory.
+    return: generator of dataframes with at most chunk_size rows
+    """
+    try:
+        schema = read_yaml_file(schema_file_path)[DATASET_COLUMNS_KEY]
+        for chunk_number, dataframe in enumerate(read_csv_chunks(file_path=file_path, chunk_size=chunk_size)):
+            if chunk_number == 0:
+                check_data_frame_schema(dataframe=dataframe, schema=schema)
+            yield dataframe
+    except Exception as e:
+        raise InsuranceException(e,sys) from e
+
+
+def load_data_sample(file_path: str, chunk_size: int, sample_size: int, random_state: int = 42) -> pd.DataFrame:
+    """
+    Uniform random sample of sample_size rows of a csv file read chunk by chunk.
+    Every row gets a random key and the rows with the smallest keys are kept, so
+    memory use is bounded by sample_size + chunk_size rows.
+    """
+    try:
+        random_generator = np.random.default_rng(random_state)
+        sample = None
+        for chunk in read_csv_chunks(file_path=file_path, chunk_size=chunk_size):
+            chunk = chunk.assign(__sample_key=random_generator.random(len(chunk)))
+            sample = chunk if sample is None else pd.concat([sample, chunk], ignore_index=True)
+            if len(sample) > sample_size:
+                sample = sample.nsmallest(sample_size, "__sample_key")
+        return sample.sort_index().drop(columns=["__sample_key"]).reset_index(drop=True)
     except Exception as e:
         raise InsuranceException(e,sys) from e
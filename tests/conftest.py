@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+# has to be set before insurance.logger is imported, see LOG_FILE_PATH_ENV_KEY there, so the tests
+# log into a temporary file instead of creating one under ./logs
+os.environ["INSURANCE_LOG_FILE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="insurance-tests-"), "tests.log")
@@ -0,0 +1,107 @@
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from insurance.constant import SQLITE_DATABASE_BACKEND
+from insurance.entity.config_entity import DatabaseConfig, DataIngestionConfig
+from insurance.component.data_ingestion import DataIngestion
+from insurance.entity.database_loader import DatabaseBulkLoader
+
+TABLE_NAME = "dataset01"
+
+
+def get_insurance_data_frame(n_rows: int, first_row: int) -> pd.DataFrame:
+    random_generator = np.random.default_rng(first_row)
+    return pd.DataFrame({
+        "age": random_generator.integers(18, 65, n_rows),
+        "sex": random_generator.choice(["male", "female"], n_rows),
+        # unique per row, identifies the rows in the history
+        "bmi": (np.arange(first_row, first_row + n_rows) / 1000 + 15.0).round(3),
+        "children": random_generator.integers(0, 5, n_rows),
+        "smoker": random_generator.choice(["yes", "no"], n_rows),
+        "region": random_generator.choice(["northeast", "southwest"], n_rows),
+        "expenses": random_generator.uniform(1000, 50000, n_rows).round(2),
+    })
+
+
+def get_data_ingestion(tmp_path) -> DataIngestion:
+    database_config = DatabaseConfig(database_host=None, database_username=None, database_password=None,
+                                     database_name="insurance_dataset", table_name=TABLE_NAME,
+                                     database_backend=SQLITE_DATABASE_BACKEND,
+                                     database_file_path=str(tmp_path / "database" / "insurance.sqlite3"),
+                                     batch_size=100)
+    data_ingestion_config = DataIngestionConfig(dataset_download_url=None, raw_data_dir=str(tmp_path / "raw_data"),
+                                                ingested_train_dir=None, ingested_test_dir=None,
+                                                is_incremental=True, watermark_column="id", fetch_size=70,
+                                                history_dir=str(tmp_path / "ingestion_history"))
+    return DataIngestion(data_ingestion_config=data_ingestion_config, database_config=database_config)
+
+
+def get_history(data_ingestion_artifact) -> pd.DataFrame:
+    return pd.concat([pd.read_csv(data_ingestion_artifact.train_file_path),
+                      pd.read_csv(data_ingestion_artifact.test_file_path)])
+
+
+def test_appended_rows_are_ingested_once(tmp_path):
+    raw_file_path = tmp_path / "raw_data" / "insurance.csv"
+    os.makedirs(raw_file_path.parent)
+    first_rows = get_insurance_data_frame(500, first_row=0)
+    first_rows.to_csv(raw_file_path, index=False)
+
+    data_ingestion = get_data_ingestion(tmp_path)
+    history = get_history(data_ingestion.ingest_downloaded_data())
+    assert sorted(history["bmi"].round(3)) == sorted(first_rows["bmi"])
+
+    new_rows = get_insurance_data_frame(120, first_row=500)
+    new_rows.to_csv(raw_file_path, mode="a", header=False, index=False)
+    history = get_history(data_ingestion.ingest_downloaded_data())
+    assert len(history) == 620
+    assert sorted(history["bmi"].round(3)) == sorted(pd.concat([first_rows, new_rows])["bmi"])
+
+    # nothing appended, nothing loaded or ingested again
+    history = get_history(data_ingestion.ingest_downloaded_data())
+    assert len(history) == 620
+    with sqlite3.connect(tmp_path / "database" / "insurance.sqlite3") as db_connect:
+        assert db_connect.execute(f"SELECT COUNT(*) FROM {TABLE_NAME}").fetchone()[0] == 620
+
+
+def test_partially_written_row_is_left_for_next_run(tmp_path):
+    raw_file_path = tmp_path / "raw_data" / "insurance.csv"
+    os.makedirs(raw_file_path.parent)
+    first_rows = get_insurance_data_frame(200, first_row=0)
+    first_rows.to_csv(raw_file_path, index=False)
+    new_rows = get_insurance_data_frame(2, first_row=200)
+    new_row_lines = new_rows.to_csv(index=False, header=False).encode()
+    last_row_start = new_row_lines.index(b"\n") + 1
+    # the writer is in the middle of the second new row
+    with open(raw_file_path, "ab") as raw_file:
+        raw_file.write(new_row_lines[:last_row_start + 8])
+
+    data_ingestion = get_data_ingestion(tmp_path)
+    history = get_history(data_ingestion.ingest_downloaded_data())
+    assert sorted(history["bmi"].round(3)) == sorted(pd.concat([first_rows, new_rows.iloc[:1]])["bmi"])
+
+    with open(raw_file_path, "ab") as raw_file:
+        raw_file.write(new_row_lines[last_row_start + 8:])
+    history = get_history(data_ingestion.ingest_downloaded_data())
+    assert sorted(history["bmi"].round(3)) == sorted(pd.concat([first_rows, new_rows])["bmi"])
+    assert history.notna().all().all()
+
+
+def test_load_offsets_are_kept_per_source(tmp_path):
+    data_ingestion = get_data_ingestion(tmp_path)
+    database_loader = DatabaseBulkLoader(database_config=data_ingestion.database_config)
+    database_loader.create_tables()
+    first_file_path = tmp_path / "first" / "insurance.csv"
+    second_file_path = tmp_path / "second" / "insurance.csv"
+    os.makedirs(first_file_path.parent)
+    os.makedirs(second_file_path.parent)
+    get_insurance_data_frame(300, first_row=0).to_csv(first_file_path, index=False)
+    get_insurance_data_frame(100, first_row=300).to_csv(second_file_path, index=False)
+
+    assert database_loader.append_file(str(first_file_path), source="https://first/insurance.csv").loaded_rows == 300
+    # same file name, another source: loaded from its start
+    assert database_loader.append_file(str(second_file_path), source="https://second/insurance.csv").loaded_rows \
+        == 100
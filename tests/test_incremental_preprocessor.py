@@ -0,0 +1,50 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from insurance.entity.artifact_entity import DataValidationArtifact
+from insurance.component.data_transformation import DataTransformation
+from insurance.entity.incremental_preprocessor import IncrementalPreprocessingStatistics
+
+SCHEMA_FILE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config",
+                                "schema.yaml")
+NUMERICAL_COLUMNS = ["age", "bmi", "children"]
+CATEGORICAL_COLUMNS = ["sex", "smoker", "region"]
+
+
+def get_data_transformation() -> DataTransformation:
+    data_validation_artifact = DataValidationArtifact(schema_file_path=SCHEMA_FILE_PATH, report_file_path=None,
+                                                      report_page_file_path=None, is_validated=True, message=None)
+    return DataTransformation(data_transformation_config=None, data_ingestion_artifact=None,
+                              data_validation_artifact=data_validation_artifact)
+
+
+def get_insurance_data_frame(n_rows: int, missing_rate: float = 0.1, seed: int = 0) -> pd.DataFrame:
+    random_generator = np.random.default_rng(seed)
+    dataframe = pd.DataFrame({
+        "age": random_generator.integers(18, 65, n_rows).astype(np.float64),
+        "sex": random_generator.choice(["male", "female"], n_rows).astype(object),
+        "bmi": random_generator.normal(30.0, 6.0, n_rows).round(1),
+        "children": random_generator.integers(0, 5, n_rows).astype(np.float64),
+        "smoker": random_generator.choice(["yes", "no"], n_rows, p=[0.2, 0.8]).astype(object),
+        "region": random_generator.choice(["southeast", "southwest", "northwest", "northeast"], n_rows).astype(object),
+    })
+    for column in NUMERICAL_COLUMNS + CATEGORICAL_COLUMNS:
+        dataframe.loc[random_generator.random(n_rows) < missing_rate, column] = np.nan
+    return dataframe
+
+
+def test_chunked_fit_matches_in_memory_pipeline():
+    dataframe = get_insurance_data_frame(1000)
+    preprocessing_statistics = IncrementalPreprocessingStatistics(numerical_columns=NUMERICAL_COLUMNS,
+                                                                  categorical_columns=CATEGORICAL_COLUMNS)
+    # uneven chunks, the last one shorter
+    for start in range(0, len(dataframe), 170):
+        preprocessing_statistics.partial_fit(dataframe.iloc[start:start + 170])
+    compiled_preprocessor = preprocessing_statistics.get_compiled_preprocessor()
+
+    preprocessing_object = get_data_transformation().get_data_transformer_object()
+    assert np.allclose(compiled_preprocessor.transform(dataframe), preprocessing_object.fit_transform(dataframe))
+    assert preprocessing_statistics.is_equivalent(preprocessing_object=preprocessing_object,
+                                                  dataframe=dataframe.iloc[:170])